@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from achievements.models import Achievement, AchievementIcon, UserAchievement
+from achievements.models import UserAchievementScore
 
 class AchievementAdmin(admin.ModelAdmin):
     search_fields = ('name', 'points')
@@ -22,6 +23,14 @@ class UserAchievementAdmin(admin.ModelAdmin):
     list_display = ('achievement', 'user', 'acquired', 'progress',
                     'assigner', 'term')
 
+
+class UserAchievementScoreAdmin(admin.ModelAdmin):
+    search_fields = ('^user__first_name', '^user__last_name',
+                     '^user__username')
+    list_display = ('user', 'points', 'acquired_count')
+    readonly_fields = ('user', 'points', 'acquired_count')
+
 admin.site.register(Achievement, AchievementAdmin)
 admin.site.register(AchievementIcon, AchievementIconAdmin)
 admin.site.register(UserAchievement, UserAchievementAdmin)
+admin.site.register(UserAchievementScore, UserAchievementScoreAdmin)
@@ -8,3 +8,4 @@ class AchievementConfig(AppConfig):
         import achievements.event_achievements
         import achievements.meta_achievements
         import achievements.officership_achievements
+        import achievements.pr_achievements
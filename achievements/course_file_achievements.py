@@ -1,23 +1,26 @@
 from django.db import models
 
+from achievements import rules
 from achievements.models import Achievement
 from exams.models import Exam
-from shortcuts import get_object_or_none
 from syllabi.models import Syllabus
 
 
 def course_file_achievements(sender, instance, created, **kwargs):
     if instance.submitter:
-        assign_lifetime_course_file_achievements(instance)
+        rules.request_evaluation('course_file', [instance.submitter])
 
 
-def assign_lifetime_course_file_achievements(instance):
+def evaluate_course_file_achievements(users):
+    for user in users:
+        assign_lifetime_course_file_achievements(user)
+
+
+def assign_lifetime_course_file_achievements(user):
     # obtain all approved exams submitted by user
-    approved_exams = Exam.objects.get_approved().filter(
-        submitter=instance.submitter)
+    approved_exams = Exam.objects.get_approved().filter(submitter=user)
 
-    approved_syllabi = Syllabus.objects.get_approved().filter(
-        submitter=instance.submitter)
+    approved_syllabi = Syllabus.objects.get_approved().filter(submitter=user)
 
     approved_file_count = approved_exams.count() + approved_syllabi.count()
 
@@ -26,15 +29,21 @@ def assign_lifetime_course_file_achievements(instance):
 
     for benchmark in benchmarks:
         short_name = 'upload_{:02d}_course_files'.format(benchmark)
-        achievement = get_object_or_none(Achievement, short_name=short_name)
+        achievement = Achievement.objects.by_short_name(short_name)
         if achievement:
             if approved_file_count < benchmark:
                 achievement.assign(
-                    instance.submitter, acquired=False,
-                    progress=approved_file_count)
+                    user, acquired=False, progress=approved_file_count)
             else:
-                achievement.assign(instance.submitter)
+                achievement.assign(user)
+
 
+rules.register(
+    'course_file', evaluate_course_file_achievements,
+    lambda user_ids: Exam.objects.filter(
+        submitter__in=user_ids).values_list('submitter', flat=True).union(
+        Syllabus.objects.filter(submitter__in=user_ids).values_list(
+            'submitter', flat=True)))
 
 models.signals.post_save.connect(course_file_achievements, sender=Exam)
 models.signals.post_save.connect(course_file_achievements, sender=Syllabus)
@@ -1,188 +1,282 @@
+import collections
 import re
 import string
 
+from django.contrib.auth import get_user_model
 from django.db import models
+from django.db import transaction
+from django.db.models import Count
 
+from achievements import rules
 from achievements.models import Achievement
+from achievements.models import AchievementEvaluationJob
+from achievements.models import UserAchievement
 from base.models import Term
 from events.models import Event
 from events.models import EventAttendance
-from shortcuts import get_object_or_none
+from events.signals import attendance_recorded
 from datetime import timedelta
 
-def event_achievements(sender, instance, created, **kwargs):
-    # obtain lifetime attendance for the user
-    total_attendance = EventAttendance.objects.select_related(
-        'event__term').filter(
-        user=instance.user, event__cancelled=False).order_by('event__term__pk')
-
-    # obtain the events in the term that the edited event is in
-    term_events = Event.objects.filter(
-        cancelled=False, term=instance.event.term)
-
-    # obtain the events that the user has attended in this term
-    # term_attendance = total_attendance.filter(
-    #     event__term=instance.event.term).select_related(
-    #     'term', 'event__event_type')
-
-    term_attendance = total_attendance.filter(
-        event__term=instance.event.term).select_related(
-        'event__term', 'event__event_type')
-
-    # obtain the events in the term with the same type
-    type_events = term_events.filter(event_type=instance.event.event_type)
-
-    # sets of the event types attended and existing in the term to assign
-    # the achievement for attending 1 event of each type
-    types_attended = term_attendance.values('event__event_type').distinct()
-    types_existing = term_events.values('event_type').distinct()
-
-    # remaining letters to track the achievement for attending events with
-    # the letters a-z in their titles in a term
-    remaining_letters = set(string.ascii_lowercase)
-
-    for event_attendance in term_attendance:
-        remaining_letters.difference_update(
-            event_attendance.event.name.lower())
-        if len(remaining_letters) == 0:
-            break
-
-    assign_alphabet_achievement(instance, remaining_letters)
-    assign_event_type_achievements(instance, type_events)
-    assign_lifetime_achievements(instance, total_attendance)
-    assign_salad_bowl_achievement(instance, types_attended, types_existing)
-    assign_specific_event_achievements(instance)
-    assign_bee_achievement(instance, term_attendance)
-    assign_week_achievement(instance, term_attendance)
-
-
-def assign_alphabet_achievement(instance, remaining_letters):
-    if len(remaining_letters) == 0:
-        achievement = get_object_or_none(Achievement,
-                                         short_name='alphabet_attendance')
-        if achievement:
-            achievement.assign(instance.user, term=instance.event.term)
-
-
-def assign_event_type_achievements(instance, type_events):
-    # obtain the user's attendance for events with the same type as instance
-    type_attendance = EventAttendance.objects.filter(
-        user=instance.user,
-        event__event_type=instance.event.event_type,
-        event__term=instance.event.term,
-        event__cancelled=False)
-
-    event_type = instance.event.event_type
-    # a map from the name of the event_type to the name of the corresponding
-    # achievement, for use in determining what achievement to update
-    event_type_map = {
-        'Meeting': 'meetings',
-        'Big Social': 'big_socials',
-        'Bent Polishing': 'bent_polishings',
-        'Infosession': 'infosessions',
-        'Community Service': 'service',
-        'E Futures': 'efutures',
-        'Fun': 'fun',
-        'Professional Development': 'prodev'
-        }
-
-    if event_type.name in event_type_map:
-        short_name = 'attend_all_{}'.format(
-            event_type_map[instance.event.event_type.name])
-        achievement = get_object_or_none(
-            Achievement, short_name=short_name)
-        if achievement and (type_events.count() == type_attendance.count()):
-            achievement.assign(instance.user, term=instance.event.term)
-
-
-def assign_lifetime_achievements(instance, total_attendance):
-    attendance_count = total_attendance.count()
-
-    # the number of events needed to get achievements
-    benchmarks = [25, 50, 78, 100, 150, 200, 300]
-
-    for benchmark in benchmarks:
-        short_name = 'attend{:03d}events'.format(benchmark)
-        achievement = get_object_or_none(Achievement, short_name=short_name)
+# the number of events needed to get the lifetime attendance achievements
+LIFETIME_BENCHMARKS = [25, 50, 78, 100, 150, 200, 300]
+
+# a map from the name of the event_type to the name of the corresponding
+# achievement for attending all of the term's events of the type
+EVENT_TYPE_ACHIEVEMENTS = {
+    'Meeting': 'attend_all_meetings',
+    'Big Social': 'attend_all_big_socials',
+    'Bent Polishing': 'attend_all_bent_polishings',
+    'Infosession': 'attend_all_infosessions',
+    'Community Service': 'attend_all_service',
+    'E Futures': 'attend_all_efutures',
+    'Fun': 'attend_all_fun',
+    'Professional Development': 'attend_all_prodev',
+}
+
+D15_REGEX = re.compile(r'.*D(istrict)?[\s]?15.*')
+
+# The fields of each attendance that achievements are computed from
+AttendedEvent = collections.namedtuple(
+    'AttendedEvent', ['user_id', 'term_id', 'term', 'year', 'event_type',
+                      'name', 'start_datetime'])
+
+
+def evaluate_event_achievements(user_ids, terms=None):
+    """Compute the event achievements of the users with the given pks and
+    assign them all in bulk.
+
+    Achievements for what users did in a term are computed for the given terms
+    (or term pks) only, or for every term the users attended events in if
+    terms is None. Lifetime achievements are always computed. Regardless of
+    the number of users, this takes a fixed number of queries, plus one for
+    each achievement that is newly acquired.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    achievements = Achievement.objects.get_registry()
+    if not achievements:
+        return
+
+    # All of the users' attendance, ordered by term for lifetime achievements
+    # and by time for the week achievement
+    attendance = collections.defaultdict(list)
+    for values in EventAttendance.objects.filter(
+            user__in=user_ids, event__cancelled=False).order_by(
+            'event__term', 'event__start_datetime', 'pk').values_list(
+            'user', 'event__term', 'event__term__term', 'event__term__year',
+            'event__event_type__name', 'event__name',
+            'event__start_datetime'):
+        attendance[values[0]].append(AttendedEvent(*values))
+
+    if terms is None:
+        term_ids = set(attended.term_id
+                       for user_attendance in attendance.values()
+                       for attended in user_attendance)
+    else:
+        term_ids = set(getattr(term, 'pk', term) for term in terms)
+
+    # The number of events of each type in each term
+    type_counts = collections.defaultdict(dict)
+    for term_id, event_type, count in Event.objects.filter(
+            cancelled=False, term__in=term_ids).order_by().values_list(
+            'term', 'event_type__name').annotate(count=Count('id')):
+        type_counts[term_id][event_type] = count
+
+    assignments = []
+    for user_id in user_ids:
+        user_attendance = attendance.get(user_id, [])
+        assignments.extend(get_lifetime_assignments(
+            achievements, user_id, user_attendance))
+        for term_id in term_ids:
+            term_attendance = [attended for attended in user_attendance
+                               if attended.term_id == term_id]
+            if term_attendance:
+                assignments.extend(get_term_assignments(
+                    achievements, user_id, term_id, term_attendance,
+                    type_counts[term_id]))
+    UserAchievement.objects.assign_many(assignments)
+
+
+def get_lifetime_assignments(achievements, user_id, user_attendance):
+    """Return the assignments of the lifetime attendance achievements, given
+    all of the user's attendance ordered by term.
+    """
+    assignments = []
+    attendance_count = len(user_attendance)
+    for benchmark in LIFETIME_BENCHMARKS:
+        achievement = achievements.get('attend{:03d}events'.format(benchmark))
         if achievement:
             if attendance_count < benchmark:
-                achievement.assign(
-                    instance.user, acquired=False, progress=attendance_count)
+                assignments.append(
+                    (user_id, achievement, False, attendance_count, None))
             else:
-                achievement.assign(
-                    instance.user,
-                    term=total_attendance[benchmark - 1].event.term)
-
-
-def assign_salad_bowl_achievement(instance, types_attended, types_existing):
-    if types_attended.count() == types_existing.count():
-        achievement = get_object_or_none(
-            Achievement, short_name='attend_each_type')
-        if achievement:
-            achievement.assign(instance.user, term=instance.event.term)
-
-
-def assign_specific_event_achievements(instance):
-    d15_regex = re.compile(r'.*D(istrict)?[\s]?15.*')
-    if d15_regex.match(instance.event.name):
-        d15_achievement = get_object_or_none(Achievement,
-                                             short_name='attend_d15')
-        if d15_achievement:
-            d15_achievement.assign(instance.user, term=instance.event.term)
-
-    if 'National Convention' in instance.event.name:
-        natl_achievement = get_object_or_none(Achievement,
-                                              short_name='attend_convention')
-        if natl_achievement:
-            natl_achievement.assign(instance.user, term=instance.event.term)
-
-    if 'Envelope Stuffing' in instance.event.name:
-        envelope_achievement = get_object_or_none(
-            Achievement, short_name='attend_envelope_stuffing')
-        if envelope_achievement:
-            envelope_achievement.assign(instance.user, term=instance.event.term)
-
-    if instance.event.name == 'Candidate Meeting' and (
-            instance.event.term == Term(term=Term.FALL, year=2013)):
-        cm2013_achievement = get_object_or_none(
-            Achievement, short_name='berkeley_explosion')
-        if cm2013_achievement:
-            cm2013_achievement.assign(instance.user, term=instance.event.term)
-
-
-def assign_bee_achievement(instance, term_attendance):
-    counter = 0
-    for event_attendance in term_attendance:
-        counter += 'b' in event_attendance.event.name.lower()
-    if counter >= 10:
-        bee_achievement = get_object_or_none(
-            Achievement, short_name='bee_enthusiast')
-        if bee_achievement:
-            bee_achievement.assign(instance.user, term=instance.event.term)
-
-
-def assign_week_achievement(instance, term_attendance):
+                assignments.append(
+                    (user_id, achievement, True, 0,
+                     user_attendance[benchmark - 1].term_id))
+    return assignments
+
+
+def get_term_assignments(achievements, user_id, term_id, term_attendance,
+                         type_counts):
+    """Return the assignments of the achievements the user acquired in the
+    term, given the user's attendance in the term ordered by time and the
+    number of events of each type in the term.
+    """
+    acquired = []
+
+    # the achievement for attending events with the letters a-z in their
+    # titles in a term
+    remaining_letters = set(string.ascii_lowercase)
+    for attended in term_attendance:
+        remaining_letters.difference_update(attended.name.lower())
+    if not remaining_letters:
+        acquired.append('alphabet_attendance')
+
+    # the achievements for attending all events of a type, and for attending
+    # at least one event of each type
+    types_attended = collections.Counter(
+        attended.event_type for attended in term_attendance)
+    for event_type, count in types_attended.items():
+        if (event_type in EVENT_TYPE_ACHIEVEMENTS and
+                count == type_counts.get(event_type)):
+            acquired.append(EVENT_TYPE_ACHIEVEMENTS[event_type])
+    if len(types_attended) == len(type_counts):
+        acquired.append('attend_each_type')
+
+    for attended in term_attendance:
+        acquired.extend(get_specific_event_achievements(attended))
+
+    if sum('b' in attended.name.lower()
+           for attended in term_attendance) >= 10:
+        acquired.append('bee_enthusiast')
+
+    if has_attended_week(term_attendance):
+        acquired.append('week_of_tbp')
+
+    return [(user_id, achievements[short_name], True, 0, term_id)
+            for short_name in collections.OrderedDict.fromkeys(acquired)
+            if short_name in achievements]
+
+
+def get_specific_event_achievements(attended):
+    """Return the short names of the achievements for attending the event."""
+    short_names = []
+    if D15_REGEX.match(attended.name):
+        short_names.append('attend_d15')
+    if 'National Convention' in attended.name:
+        short_names.append('attend_convention')
+    if 'Envelope Stuffing' in attended.name:
+        short_names.append('attend_envelope_stuffing')
+    if (attended.name == 'Candidate Meeting' and
+            attended.term == Term.FALL and attended.year == 2013):
+        short_names.append('berkeley_explosion')
+    return short_names
+
+
+def has_attended_week(term_attendance):
+    """Return True if the attendance (ordered by time) includes events on
+    seven consecutive days.
+    """
     last = None
     counter = 0
-    for event_attendance in term_attendance.order_by('event__start_datetime'):
+    for attended in term_attendance:
+        cur = attended.start_datetime
         if not last:
-            last = event_attendance.event.start_datetime
             counter = 1
         else:
-            cur = event_attendance.event.start_datetime
             lastdow = int(last.strftime('%u'))
             curdow = int(cur.strftime('%u')) % 7
             delta = cur - last
             if delta < timedelta(days=2) and curdow == (lastdow + 1) % 7:
                 counter += 1
                 if counter == 7:
-                    week_achievement = get_object_or_none(
-                        Achievement, short_name='week_of_tbp')
-                    print(week_achievement)
-                    if week_achievement:
-                        week_achievement.assign(instance.user, term=instance.event.term)
+                    return True
             else:
                 counter = 1
-            last = event_attendance.event.start_datetime
+        last = cur
+    return False
+
+
+class DeferredEventAchievements(object):
+    """The users whose event achievements are evaluated once a transaction
+    commits, and the terms to evaluate for each of them (see
+    defer_event_achievements).
+    """
+    def __init__(self):
+        self.terms = collections.defaultdict(set)
+
+    def add(self, user_ids, term_ids):
+        for user_id in user_ids:
+            self.terms[user_id].update(term_ids)
+
+    def __call__(self):
+        """Evaluate the event achievements of the users, grouping them by the
+        terms to evaluate.
+        """
+        # Users may have been deleted since they were deferred
+        user_ids = get_user_model().objects.filter(
+            pk__in=self.terms).values_list('pk', flat=True)
+        users_by_terms = collections.defaultdict(set)
+        for user_id in user_ids:
+            term_ids = self.terms[user_id]
+            if None in term_ids:
+                term_ids = None
+            else:
+                term_ids = frozenset(term_ids)
+            users_by_terms[term_ids].add(user_id)
+        for term_ids, user_ids in users_by_terms.items():
+            evaluate_event_achievements(user_ids, term_ids)
+
+
+def defer_event_achievements(user_ids, terms=None):
+    """Evaluate the event achievements of the users once the current
+    transaction commits (or right away outside of transactions).
+
+    Users deferred several times before the transaction commits are evaluated
+    only once, for all of the terms they were deferred for. The users are kept
+    by a callback registered with transaction.on_commit, so if the transaction
+    is rolled back, they are discarded along with the callback.
+    """
+    connection = transaction.get_connection()
+    term_ids = (None,) if terms is None else [getattr(term, 'pk', term)
+                                              for term in terms]
+    deferred = getattr(connection, 'deferred_event_achievements', None)
+    if deferred is not None and any(
+            func is deferred for _, func in connection.run_on_commit):
+        # Still waiting for the current transaction to commit
+        deferred.add(user_ids, term_ids)
+        return
+    deferred = DeferredEventAchievements()
+    deferred.add(user_ids, term_ids)
+    connection.deferred_event_achievements = deferred
+    transaction.on_commit(deferred)
+
+
+def event_achievements(sender, instance, created, **kwargs):
+    if rules.is_deferred():
+        AchievementEvaluationJob.objects.enqueue('event', [instance.user_id])
+    else:
+        evaluate_event_achievements(
+            [instance.user_id], [instance.event.term_id])
+
+
+def event_attendance_recorded(sender, event, user_ids, **kwargs):
+    """Evaluate the event achievements of users whose attendance was recorded
+    in bulk (see EventAttendance.objects.record_many) together, after the
+    transaction they were recorded in commits.
+    """
+    if rules.is_deferred():
+        AchievementEvaluationJob.objects.enqueue('event', user_ids)
+    else:
+        defer_event_achievements(user_ids, [event.term_id])
+
+
+rules.register(
+    'event',
+    lambda users: evaluate_event_achievements([user.pk for user in users]),
+    lambda user_ids: EventAttendance.objects.filter(
+        user__in=user_ids).values_list('user', flat=True).distinct())
 
 models.signals.post_save.connect(event_achievements, sender=EventAttendance)
+attendance_recorded.connect(event_attendance_recorded)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from achievements import rules
+
+
+class Command(BaseCommand):
+    help = ('Evaluate the achievements of pending evaluation jobs (see '
+            'settings.ACHIEVEMENTS_DEFERRED).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size', type=int, default=100,
+            help='The number of jobs to evaluate together')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep running and evaluate new jobs as they are enqueued, '
+                 'rather than stopping once no jobs are pending')
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='The number of seconds to wait for new jobs when no jobs '
+                 'are pending (with --loop)')
+
+    def handle(self, *args, **options):
+        verbose = int(options['verbosity']) > 0
+        total = 0
+        while True:
+            if options['loop']:
+                close_old_connections()
+            try:
+                processed = rules.process_jobs(options['batch_size'])
+            except Exception as exception:  # pylint: disable=broad-except
+                if not options['loop']:
+                    raise
+                # The failed jobs were enqueued again, so wait before retrying
+                self.stderr.write(
+                    'Failed to evaluate achievements: {}'.format(exception))
+                processed = 0
+
+            total += processed
+            if processed and verbose:
+                self.stdout.write('Evaluated {} jobs'.format(processed))
+            if not processed:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        if verbose:
+            self.stdout.write('Evaluated {} jobs in total'.format(total))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from achievements.models import UserAchievementScore
+
+
+class Command(BaseCommand):
+    help = ('Recompute the achievement points and achievement counts of '
+            'every user from their acquired achievements, e.g. after user '
+            'achievements were changed in bulk without sending signals.')
+
+    def handle(self, *args, **options):
+        created, updated, deleted = UserAchievementScore.objects.rebuild()
+        if int(options['verbosity']) > 0:
+            self.stdout.write(
+                'Created {} scores, updated {} and deleted {}'.format(
+                    created, updated, deleted))
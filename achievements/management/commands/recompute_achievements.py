@@ -0,0 +1,149 @@
+import multiprocessing
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+
+from achievements import rules
+from achievements.models import UserAchievement
+from base.models import Term
+
+
+class Command(BaseCommand):
+    help = ('Recompute the achievements of every user from scratch, e.g. '
+            'after changing achievement rules or importing data in bulk.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-w', '--workers', type=int, default=1,
+            help='The number of processes that recompute achievements in '
+                 'parallel')
+        parser.add_argument(
+            '-c', '--chunk-size', type=int, default=500,
+            help='The number of users whose achievements are recomputed '
+                 'together (in one transaction)')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how the stored achievements would change, '
+                 'without changing them')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError(
+                'The number of workers and the chunk size must be positive')
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError(
+                'SQLite databases can only be written by one worker at a time')
+        verbosity = int(options['verbosity'])
+        dry_run = options['dry_run']
+
+        user_ids = list(get_user_model().objects.order_by('pk').values_list(
+            'pk', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [(user_ids[i:i + chunk_size], dry_run)
+                  for i in range(0, len(user_ids), chunk_size)]
+
+        if options['workers'] > 1:
+            # Every worker process opens its own database connections, rather
+            # than sharing the ones this process would otherwise pass on
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(
+                options['workers'])
+            results = pool.imap_unordered(recompute_chunk, chunks)
+        else:
+            pool = None
+            results = (recompute_chunk(chunk) for chunk in chunks)
+
+        done = 0
+        changes = []
+        try:
+            for num_users, chunk_changes in results:
+                done += num_users
+                changes.extend(chunk_changes)
+                if verbosity > 0:
+                    self.stdout.write(
+                        'Recomputed the achievements of {}/{} users'.format(
+                            done, len(user_ids)))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if verbosity > 1 or (dry_run and verbosity > 0):
+            self.write_changes(changes)
+        if verbosity > 0:
+            created = sum(1 for _, _, before, _ in changes if before is None)
+            self.stdout.write(
+                '{} {} user achievements and {} {} existing ones'.format(
+                    'Would create' if dry_run else 'Created', created,
+                    'would change' if dry_run else 'changed',
+                    len(changes) - created))
+
+    def write_changes(self, changes):
+        usernames = dict(get_user_model().objects.filter(
+            pk__in=set(user_id for user_id, _, _, _ in changes)).values_list(
+            'pk', 'username'))
+        terms = Term.objects.in_bulk(set(
+            state[2] for _, _, before, after in changes
+            for state in (before, after) if state is not None))
+        for user_id, short_name, before, after in sorted(
+                changes, key=lambda change: change[:2]):
+            self.stdout.write('{}: {}: {} -> {}'.format(
+                usernames.get(user_id, user_id), short_name,
+                format_state(before, terms), format_state(after, terms)))
+
+
+def recompute_chunk(chunk):
+    """Recompute the achievements of a chunk of users in one transaction, and
+    return the number of users and the changes to their stored achievements
+    (see get_achievement_states).
+
+    Changes are rolled back in a dry run.
+    """
+    user_ids, dry_run = chunk
+    with transaction.atomic():
+        before = get_achievement_states(user_ids)
+        rules.recompute(user_ids)
+        after = get_achievement_states(user_ids)
+        if dry_run:
+            transaction.set_rollback(True)
+
+    changes = []
+    for key, state in after.items():
+        if before.get(key) != state:
+            changes.append(key + (before.get(key), state))
+    return len(user_ids), changes
+
+
+def get_achievement_states(user_ids):
+    """Return a map from the (user pk, achievement short name) of the users'
+    achievements to their (acquired, progress, term pk).
+
+    Like Achievement.assign, only the first user achievement of each user for
+    each achievement is considered.
+    """
+    states = {}
+    for user_id, short_name, acquired, progress, term_id in (
+            UserAchievement.objects.filter(user__in=user_ids).order_by(
+                '-created', '-pk').values_list(
+                'user', 'achievement__short_name', 'acquired', 'progress',
+                'term')):
+        states[(user_id, short_name)] = (acquired, progress, term_id)
+    return states
+
+
+def format_state(state, terms):
+    """Return a description of an achievement state, given the terms it may
+    refer to by pk.
+    """
+    if state is None:
+        return 'none'
+    acquired, progress, term_id = state
+    if acquired:
+        term = terms.get(term_id)
+        return 'acquired in {}'.format(
+            term.verbose_name() if term else 'no term')
+    return 'progress {}'.format(progress)
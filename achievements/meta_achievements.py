@@ -1,68 +1,100 @@
 from django.db import models
 
+from achievements import rules
 from achievements.models import Achievement
+from achievements.models import AchievementEvaluationJob
 from achievements.models import AchievementIcon
 from achievements.models import UserAchievement
-from shortcuts import get_object_or_none
+
+# the short names of the awards that are needed for the cots_mots_oots
+# achievement
+AWARD_SHORT_NAMES = frozenset(['cots', 'mots', 'oots'])
 
 
 # achievement-related achievements
-def assign_award_achievements(sender, instance, created, **kwargs):
-    short_name_set = set(['cots', 'mots', 'oots'])
+def meta_achievements(sender, instance, created, **kwargs):
+    short_name = instance.achievement.short_name
+    if rules.is_deferred():
+        if short_name != 'acquire_15_achievements':
+            AchievementEvaluationJob.objects.enqueue(
+                'meta', [instance.user_id])
+        return
 
     # check if this achievement is OOTS, MOTS, or COTS
-    if instance.achievement.short_name in short_name_set:
-        # obtain the user's achievements in a list of short names
-        user_achievements = UserAchievement.objects.select_related(
-            'achievement__short_name').filter(
-            user=instance.user, acquired=True).values_list(
-            'achievement__short_name', flat=True)
-
-        # encode in utf8 to remove unicode characters from strings
-        user_achievements_set = set([short_name.encode('utf8')
-                                    for short_name in user_achievements])
-
-        # check if all short names in list are present in user's achievements
-        if (len(short_name_set & user_achievements_set) ==
-                len(short_name_set)):
-            achievement = get_object_or_none(Achievement,
-                                             short_name='cots_mots_oots')
-            if achievement:
-                achievement.assign(instance.user, term=instance.term)
-
-
-def assign_completion_achievements(sender, instance, created, **kwargs):
-    if instance.achievement.short_name != 'acquire_15_achievements':
-        # count the number of acquired achievements for the user
-        user_achievements = UserAchievement.objects.select_related(
-            'term').filter(user=instance.user, acquired=True).order_by(
-            'term__pk')
-
-        achievement_count = user_achievements.count()
-
-        # the number of acquired achievements to obtain these achievements
-        benchmarks = [15]
-
-        for benchmark in benchmarks:
-            short_name = 'acquire_{:02d}_achievements'.format(benchmark)
-            achievement = get_object_or_none(
-                Achievement, short_name=short_name)
-            if achievement:
-                if achievement_count < benchmark:
-                    achievement.assign(
-                        instance.user,
-                        acquired=False,
-                        progress=achievement_count)
-                else:
-                    achievement.assign(
-                        instance.user,
-                        term=user_achievements[benchmark - 1].term)
-
-
-def assign_icon_achievements(sender, instance, created, **kwargs):
+    if short_name in AWARD_SHORT_NAMES:
+        assign_award_achievements(instance.user, instance.term)
+    if short_name != 'acquire_15_achievements':
+        assign_completion_achievements(instance.user)
+
+
+def evaluate_meta_achievements(users):
+    for user in users:
+        assign_award_achievements(user)
+        assign_completion_achievements(user)
+
+
+def assign_award_achievements(user, term=None):
+    """Assign the cots_mots_oots achievement if the user has all of the
+    awards, in the given term or in the last term the user got one of them.
+    """
+    # obtain the user's awards, by short name
+    awards = dict(
+        (user_achievement.achievement.short_name, user_achievement)
+        for user_achievement in UserAchievement.objects.select_related(
+            'achievement', 'term').filter(
+            user=user, acquired=True,
+            achievement__short_name__in=AWARD_SHORT_NAMES))
+
+    # check if all short names in list are present in user's achievements
+    if len(awards) == len(AWARD_SHORT_NAMES):
+        achievement = Achievement.objects.by_short_name('cots_mots_oots')
+        if achievement:
+            if term is None:
+                award_terms = [award.term for award in awards.values()
+                               if award.term is not None]
+                if award_terms:
+                    term = max(award_terms, key=lambda term: term.pk)
+            achievement.assign(user, term=term)
+
+
+def assign_completion_achievements(user):
+    # count the number of acquired achievements for the user
+    user_achievements = UserAchievement.objects.select_related(
+        'term').filter(user=user, acquired=True).order_by(
+        'term__pk')
+
+    achievement_count = user_achievements.count()
+
+    # the number of acquired achievements to obtain these achievements
+    benchmarks = [15]
+
+    for benchmark in benchmarks:
+        short_name = 'acquire_{:02d}_achievements'.format(benchmark)
+        achievement = Achievement.objects.by_short_name(short_name)
+        if achievement:
+            if achievement_count < benchmark:
+                achievement.assign(
+                    user,
+                    acquired=False,
+                    progress=achievement_count)
+            else:
+                achievement.assign(
+                    user,
+                    term=user_achievements[benchmark - 1].term)
+
+
+def icon_achievements(sender, instance, created, **kwargs):
+    rules.request_evaluation('icon', [instance.creator])
+
+
+def evaluate_icon_achievements(users):
+    for user in users:
+        assign_icon_achievements(user)
+
+
+def assign_icon_achievements(user):
     # count the number of achievements with icons created by the user
-    achievement_icons = AchievementIcon.objects.filter(
-        creator=instance.creator)
+    achievement_icons = AchievementIcon.objects.filter(creator=user)
 
     icon_count = achievement_icons.count()
 
@@ -71,24 +103,27 @@ def assign_icon_achievements(sender, instance, created, **kwargs):
 
     for benchmark in benchmarks:
         short_name = 'create_{:02d}_icons'.format(benchmark)
-        achievement = get_object_or_none(Achievement, short_name=short_name)
+        achievement = Achievement.objects.by_short_name(short_name)
         if achievement:
             if icon_count < benchmark:
                 achievement.assign(
-                    instance.creator,
+                    user,
                     acquired=False,
                     progress=icon_count)
             else:
-                achievement.assign(instance.creator)
-
+                achievement.assign(user)
 
-models.signals.post_save.connect(assign_award_achievements,
-                                 sender=UserAchievement)
 
+rules.register(
+    'meta', evaluate_meta_achievements,
+    lambda user_ids: UserAchievement.objects.filter(
+        user__in=user_ids).values_list('user', flat=True).distinct())
+rules.register(
+    'icon', evaluate_icon_achievements,
+    lambda user_ids: AchievementIcon.objects.filter(
+        creator__in=user_ids).values_list('creator', flat=True).distinct())
 
-models.signals.post_save.connect(assign_completion_achievements,
-                                 sender=UserAchievement)
+models.signals.post_save.connect(meta_achievements, sender=UserAchievement)
 
 
-models.signals.post_save.connect(assign_icon_achievements,
-                                 sender=AchievementIcon)
+models.signals.post_save.connect(icon_achievements, sender=AchievementIcon)
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.8 on 2026-10-18 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('achievements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AchievementEvaluationJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule_group', models.CharField(choices=[('event', 'Event attendance'), ('officership', 'Officerships'), ('course_file', 'Course files'), ('meta', 'Achievements'), ('icon', 'Achievement icons')], max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('created',),
+                'unique_together': {('user', 'rule_group')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_scores(apps, schema_editor):
+    """Create the scores of the users with acquired achievements, as
+    UserAchievementScore.objects.rebuild would (historical models don't have
+    custom managers).
+    """
+    UserAchievement = apps.get_model('achievements', 'UserAchievement')
+    UserAchievementScore = apps.get_model(
+        'achievements', 'UserAchievementScore')
+    totals = list(
+        UserAchievement.objects.filter(acquired=True).order_by().values(
+            'user').annotate(
+            points=models.Sum('achievement__points'),
+            acquired_count=models.Count('pk')).values_list(
+            'user', 'points', 'acquired_count'))
+    ranks = {}
+    for i, points in enumerate(sorted(
+            (points for _, points, _ in totals if points >= 0),
+            reverse=True), start=1):
+        ranks.setdefault(points, i)
+    UserAchievementScore.objects.bulk_create(
+        [UserAchievementScore(user_id=user_id, points=points,
+                              acquired_count=acquired_count,
+                              rank=ranks.get(points))
+         for user_id, points, acquired_count in totals],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('achievements', '0002_achievementevaluationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAchievementScore',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='achievement_score', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('points', models.IntegerField(db_index=True, default=0)),
+                ('acquired_count', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(blank=True, db_index=True, help_text="The rank of the user on the leaderboard (users with the same points share a rank), or null if the user isn't on it.", null=True)),
+            ],
+            options={
+                'ordering': ('rank', 'user'),
+            },
+        ),
+        migrations.RunPython(populate_scores, migrations.RunPython.noop),
+    ]
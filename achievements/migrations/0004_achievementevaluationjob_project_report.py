@@ -0,0 +1,18 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('achievements', '0003_userachievementscore'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='achievementevaluationjob',
+            name='rule_group',
+            field=models.CharField(choices=[('event', 'Event attendance'), ('officership', 'Officerships'), ('course_file', 'Course files'), ('project_report', 'Project reports'), ('meta', 'Achievements'), ('icon', 'Achievement icons')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('achievements', '0004_achievementevaluationjob_project_report'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='userachievementscore',
+            options={'ordering': ('-points', 'user')},
+        ),
+        migrations.RemoveField(
+            model_name='userachievementscore',
+            name='rank',
+        ),
+    ]
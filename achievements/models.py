@@ -1,11 +1,59 @@
 from django.conf import settings
-from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
+from django.db import connection
 from django.db import models
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from base.cache import CacheNamespace
 from base.models import Term
 from notifications.models import Notification
-from shortcuts import get_object_or_none
+
+
+# Maximum number of seconds the achievements are cached for. They're
+# invalidated whenever an achievement is saved or deleted (including by
+# loading fixtures), so this only bounds how long bulk updates go unnoticed.
+ACHIEVEMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+ACHIEVEMENT_CACHE = CacheNamespace('achievements')
+
+
+class AchievementManager(models.Manager):
+    # The achievements by short name that this process last loaded, along
+    # with the version of ACHIEVEMENT_CACHE they're current for
+    _registry = (None, {})
+
+    def by_short_name(self, short_name):
+        """Return the achievement with the given short name, or None if it
+        doesn't exist.
+
+        Unlike get_object_or_none(Achievement, short_name=short_name), this
+        doesn't query the database (see get_registry).
+        """
+        return self.get_registry().get(short_name)
+
+    def get_registry(self):
+        """Return a dictionary of every achievement, keyed by short name.
+
+        All of the achievements are loaded with one query and stored in the
+        shared cache, and each process keeps its own copy for as long as the
+        shared cache doesn't say that they changed, so that a lookup only
+        fetches the version of the cached achievements. The dictionary is
+        shared, so it must not be modified.
+        """
+        version, registry = AchievementManager._registry
+        if version is None or version != ACHIEVEMENT_CACHE.get_version():
+            registry, version = ACHIEVEMENT_CACHE.get_or_set_with_version(
+                'by_short_name',
+                lambda: dict((achievement.short_name, achievement)
+                             for achievement in self.all()),
+                timeout=ACHIEVEMENT_CACHE_TIMEOUT)
+            AchievementManager._registry = (version, registry)
+        return registry
+
 
 class Achievement(models.Model):
     """An achievement shows significant user accomplishment in some way."""
@@ -87,6 +135,8 @@ class Achievement(models.Model):
         help_text=('The rank of the achievement, for the display order. The '
                    'higher the number, the lower down on the page it shows.'))
 
+    objects = AchievementManager()
+
     class Meta(object):
         ordering = ('rank',)
 
@@ -111,19 +161,17 @@ class Achievement(models.Model):
         if term is None:
             term = Term.objects.get_current_term()
 
-        # Get or create a new user achievement for this achievement given to
-        # the specified user. if no previous achievement exists, the default
-        # is to set acquired to false so that it is updated below
-
-        # user_achievement, _ = UserAchievement.objects.get_or_create(
-        #     achievement=self, user=user)
+        # Get the user achievement for this achievement given to the
+        # specified user, or create it with the assigned state if no previous
+        # achievement exists
         user_achievement = UserAchievement.objects.filter(
-             achievement=self, user=user).order_by('created')
-        if not user_achievement.exists():
-            user_achievement = UserAchievement.objects.create(achievement=self, user=user)
-            user_achievement.save()
+             achievement=self, user=user).order_by('created').first()
+        if user_achievement is None:
+            UserAchievement.objects.create(
+                achievement=self, user=user, acquired=acquired,
+                progress=progress, term=term, explanation=explanation,
+                assigner=assigner)
             return True
-        user_achievement = user_achievement[0]
         if user_achievement.acquired is False:
             # If the achievement has not already been acquired by this user, set
             # the user achievement's progress, term, acquisition state, who the
@@ -164,6 +212,88 @@ class AchievementIcon(models.Model):
         return 'Icon for {}'.format(self.achievement.name)
 
 
+class UserAchievementManager(models.Manager):
+    def assign_many(self, assignments):
+        """Assign many achievements at once, the way Achievement.assign
+        assigns one of them.
+
+        The assignments are (user pk, achievement, acquired, progress, term pk)
+        tuples, where a term pk of None means the current term. The existing
+        user achievements are loaded with a single query, and only the ones
+        that actually change are written. Changes that don't affect whether
+        an achievement is acquired (like progress towards a goal) are written
+        in bulk, while user achievements that become acquired (or stop being
+        acquired) are saved one at a time, so that notifications and meta
+        achievements are still handled by their post_save signals.
+        """
+        if not assignments:
+            return
+        current_term = Term.objects.get_current_term()
+        current_term_id = current_term.pk if current_term else None
+
+        # Like Achievement.assign, use the earliest user achievement of each
+        # user for each achievement
+        existing = {}
+        for user_achievement in self.filter(
+                user__in=set(user_id for user_id, _, _, _, _ in assignments),
+                achievement__in=set(
+                    achievement for _, achievement, _, _, _ in assignments)
+                ).order_by('-created', '-pk'):
+            existing[(user_achievement.user_id,
+                      user_achievement.achievement_id)] = user_achievement
+
+        new_user_achievements = []
+        updated_user_achievements = []
+        for user_id, achievement, acquired, progress, term_id in assignments:
+            if term_id is None:
+                term_id = current_term_id
+            user_achievement = existing.get((user_id, achievement.pk))
+            if user_achievement is None:
+                user_achievement = UserAchievement(
+                    user_id=user_id, achievement=achievement,
+                    acquired=acquired, progress=progress, term_id=term_id)
+                if acquired:
+                    user_achievement.save()
+                else:
+                    new_user_achievements.append(user_achievement)
+                existing[(user_id, achievement.pk)] = user_achievement
+                continue
+
+            if not user_achievement.acquired:
+                # Not acquired yet, so the progress, term and acquisition
+                # state are overwritten
+                changes = {'acquired': acquired, 'progress': progress,
+                           'term_id': term_id}
+            elif not acquired and user_achievement.term_id == term_id:
+                # Acquired, but being unacquired in the same term
+                changes = {'acquired': acquired, 'progress': progress}
+            else:
+                continue
+            changes.update(explanation='', assigner_id=None)
+            if all(getattr(user_achievement, field) == value
+                   for field, value in changes.items()):
+                continue
+
+            acquisition_changed = user_achievement.acquired != acquired
+            for field, value in changes.items():
+                setattr(user_achievement, field, value)
+            if acquisition_changed:
+                user_achievement.save()
+            else:
+                updated_user_achievements.append(user_achievement)
+
+        self.bulk_create(new_user_achievements)
+        if updated_user_achievements:
+            # bulk_update doesn't set auto_now fields
+            now = timezone.now()
+            for user_achievement in updated_user_achievements:
+                user_achievement.updated = now
+            self.bulk_update(
+                updated_user_achievements,
+                ['acquired', 'progress', 'term', 'explanation', 'assigner',
+                 'updated'])
+
+
 class UserAchievement(models.Model):
     """UserAchievement instances contain data about an acquired achievement.
 
@@ -204,20 +334,197 @@ class UserAchievement(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = UserAchievementManager()
+
     def __str__(self):
         return '{} - {}'.format(self.user.get_full_name(),
                                 self.achievement.name)
 
 
+class UserAchievementScoreManager(models.Manager):
+    def ranked(self):
+        """Return the scores of the users on the leaderboard: the users with
+        at least one acquired achievement and a non-negative number of points.
+        """
+        return self.filter(acquired_count__gt=0, points__gte=0)
+
+    def update_score(self, user_id):
+        """Recompute the score of the user with the given pk from their
+        acquired achievements.
+
+        Only the user's own score is locked and updated, since ranks aren't
+        stored (see UserAchievementScore.get_rank). The
+        rebuild_achievement_scores command recomputes every score from
+        scratch.
+        """
+        with transaction.atomic():
+            totals = UserAchievement.objects.filter(
+                user=user_id, acquired=True).aggregate(
+                points=Coalesce(Sum('achievement__points'), 0),
+                acquired_count=Count('pk'))
+            if (not totals['acquired_count'] and
+                    not self.filter(user=user_id).exists()):
+                return None
+            score, _ = self.update_or_create(user_id=user_id, defaults=totals)
+            return score
+
+    def rebuild(self):
+        """Recompute the scores of every user from their acquired
+        achievements, and return the numbers of scores created, updated and
+        deleted.
+        """
+        totals = dict(
+            (user_id, (points, acquired_count))
+            for user_id, points, acquired_count in
+            UserAchievement.objects.filter(acquired=True).order_by().values(
+                'user').annotate(
+                points=Sum('achievement__points'),
+                acquired_count=Count('pk')).values_list(
+                'user', 'points', 'acquired_count'))
+
+        with transaction.atomic():
+            deleted, _ = self.exclude(
+                user__in=UserAchievement.objects.filter(
+                    acquired=True).values('user')).delete()
+            existing = self.select_for_update().in_bulk()
+            new_scores = []
+            changed_scores = []
+            for user_id, (points, acquired_count) in totals.items():
+                values = {'points': points, 'acquired_count': acquired_count}
+                score = existing.get(user_id)
+                if score is None:
+                    new_scores.append(
+                        UserAchievementScore(user_id=user_id, **values))
+                elif any(getattr(score, field) != value
+                         for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(score, field, value)
+                    changed_scores.append(score)
+            self.bulk_create(new_scores, batch_size=500)
+            self.bulk_update(changed_scores, ['points', 'acquired_count'],
+                             batch_size=500)
+        return len(new_scores), len(changed_scores), deleted
+
+
+class UserAchievementScore(models.Model):
+    """The total points of a user's acquired achievements, kept up to date as
+    user achievements change so that leaderboards and profiles don't add up
+    achievement points.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, primary_key=True,
+        related_name='achievement_score', on_delete=models.CASCADE)
+    points = models.IntegerField(default=0, db_index=True)
+    acquired_count = models.PositiveIntegerField(default=0)
+
+    objects = UserAchievementScoreManager()
+
+    class Meta(object):
+        ordering = ('-points', 'user')
+
+    def __str__(self):
+        return '{} - {} points'.format(self.user.get_full_name(),
+                                       self.points)
+
+    def is_ranked(self):
+        return self.acquired_count > 0 and self.points >= 0
+
+    def get_rank(self):
+        """Return the rank of the user on the leaderboard (users with the same
+        points share a rank), or None if the user isn't on it.
+
+        The rank is counted from the indexed points when it is read, so
+        changing one user's points doesn't change any other rows.
+        """
+        if not self.is_ranked():
+            return None
+        return UserAchievementScore.objects.ranked().filter(
+            points__gt=self.points).count() + 1
+
+
+class AchievementEvaluationJobManager(models.Manager):
+    def enqueue(self, rule_group, user_ids):
+        """Request that the achievements of the rule group be evaluated for
+        the users with the given pks, with a single query.
+
+        Users that already have a pending job for the rule group are skipped.
+        """
+        self.bulk_create(
+            [AchievementEvaluationJob(user_id=user_id, rule_group=rule_group)
+             for user_id in set(user_ids)],
+            ignore_conflicts=True)
+
+    def claim(self, batch_size):
+        """Remove up to batch_size of the oldest jobs and return them.
+
+        Jobs locked by other workers are skipped where the database supports
+        it (not MariaDB or MySQL before 8.0.1, where workers wait for each
+        other instead), so several workers can claim jobs at the same time.
+        Since claimed jobs are deleted right away, jobs enqueued while they
+        are evaluated are kept for the next batch.
+        """
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        with transaction.atomic():
+            jobs = list(self.select_for_update(
+                skip_locked=skip_locked).order_by('created', 'pk')[:batch_size])
+            self.filter(pk__in=[job.pk for job in jobs]).delete()
+        return jobs
+
+
+class AchievementEvaluationJob(models.Model):
+    """A request to evaluate the achievements of a group of rules for a user,
+    for when achievements are evaluated by the process_achievements command
+    (see settings.ACHIEVEMENTS_DEFERRED).
+    """
+    RULE_GROUPS = (
+        ('event', 'Event attendance'),
+        ('officership', 'Officerships'),
+        ('course_file', 'Course files'),
+        ('project_report', 'Project reports'),
+        ('meta', 'Achievements'),
+        ('icon', 'Achievement icons'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    rule_group = models.CharField(choices=RULE_GROUPS, max_length=16)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = AchievementEvaluationJobManager()
+
+    class Meta(object):
+        ordering = ('created',)
+        unique_together = ('user', 'rule_group')
+
+    def __str__(self):
+        return '{} achievements of {}'.format(self.get_rule_group_display(),
+                                              self.user.get_full_name())
+
+
+def achievement_changed(sender, instance, **kwargs):
+    """Ensure that cached achievements are loaded again once an achievement
+    or its icon changes (cached achievements keep the icons they looked up).
+    """
+    if kwargs.get('raw'):
+        # Fixtures may be loaded in a transaction that is never committed
+        # (like in tests), so don't wait for it
+        ACHIEVEMENT_CACHE.invalidate()
+    transaction.on_commit(ACHIEVEMENT_CACHE.invalidate)
+
+
+models.signals.post_save.connect(achievement_changed, sender=Achievement)
+models.signals.post_delete.connect(achievement_changed, sender=Achievement)
+models.signals.post_save.connect(achievement_changed, sender=AchievementIcon)
+models.signals.post_delete.connect(achievement_changed,
+                                   sender=AchievementIcon)
+
+
 def achievement_notification(sender, instance, created, **kwargs):
     """Create a notification if the user achievement has been acquired."""
     if instance.acquired:
         achievement = instance.achievement
-        Notification.objects.get_or_create(
-            user=instance.user,
+        Notification.objects.fan_out(
+            [instance.user_id], instance,
             status=Notification.POSITIVE,
-            content_type=ContentType.objects.get_for_model(UserAchievement),
-            object_pk=instance.pk,
             title='Achievement Unlocked',
             subtitle=achievement.name,
             description=achievement.description,
@@ -229,16 +536,39 @@ def achievement_notification_delete(sender, instance, **kwargs):
     """Delete the notification if it exists for the user achievement if it is
     deleted.
     """
-    notification = get_object_or_none(
-        Notification,
-        user=instance.user,
-        content_type=ContentType.objects.get_for_model(UserAchievement),
-        object_pk=instance.pk)
-    if notification:
-        notification.delete()
+    Notification.objects.for_object(instance).filter(
+        user=instance.user_id).delete()
 
 
 models.signals.post_save.connect(
     achievement_notification, sender=UserAchievement)
 models.signals.post_delete.connect(
     achievement_notification_delete, sender=UserAchievement)
+
+
+def user_achievement_score(sender, instance, **kwargs):
+    """Update the score of the user of the user achievement.
+
+    New user achievements that aren't acquired don't change any score.
+    Scores aren't updated while loading fixtures, since they may be loaded
+    before the achievements they refer to.
+    """
+    if kwargs.get('raw') or (kwargs.get('created') and not instance.acquired):
+        return
+    UserAchievementScore.objects.update_score(instance.user_id)
+
+
+def achievement_points_changed(sender, instance, **kwargs):
+    """Rebuild every score once an achievement is saved, since its points
+    may have changed.
+    """
+    if not kwargs.get('raw'):
+        transaction.on_commit(UserAchievementScore.objects.rebuild)
+
+
+models.signals.post_save.connect(
+    user_achievement_score, sender=UserAchievement)
+models.signals.post_delete.connect(
+    user_achievement_score, sender=UserAchievement)
+models.signals.post_save.connect(
+    achievement_points_changed, sender=Achievement)
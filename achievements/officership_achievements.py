@@ -2,13 +2,22 @@ import collections
 
 from django.db import models
 
+from achievements import rules
 from achievements.models import Achievement
 from base.models import Officer
-from shortcuts import get_object_or_none
 
 # officership-related achievements
 def officership_achievements(sender, instance, created, **kwargs):
-    officerships = Officer.objects.filter(user=instance.user).exclude(
+    rules.request_evaluation('officership', [instance.user])
+
+
+def evaluate_officership_achievements(users):
+    for user in users:
+        assign_officership_achievements(user)
+
+
+def assign_officership_achievements(user):
+    officerships = Officer.objects.filter(user=user).exclude(
         position__short_name='advisor').exclude(
         position__short_name='faculty').order_by(
         'term__year', '-term__term')
@@ -71,39 +80,37 @@ def officership_achievements(sender, instance, created, **kwargs):
         num_unique_terms = len(unique_terms)
         if ((num_unique_terms <= 2 and position_name == 'vp') or
                 (num_unique_terms <= 3 and position_name == 'president')):
-            assign_straight_to_the_top_achievement(instance, officership.term)
+            assign_straight_to_the_top_achievement(user, officership.term)
 
     repeat_positions.append(sequence)
 
     # assign the achievements and progresses
-    assign_tenure_achievements(instance, unique_terms)
-    assign_chair_achievements(instance, chair_terms)
-    assign_repeat_achievements(instance, repeat_positions)
-    assign_diffposition_achievements(instance, committee_terms)
+    assign_tenure_achievements(user, unique_terms)
+    assign_chair_achievements(user, chair_terms)
+    assign_repeat_achievements(user, repeat_positions)
+    assign_diffposition_achievements(user, committee_terms)
 
 
-def assign_tenure_achievements(instance, unique_terms):
+def assign_tenure_achievements(user, unique_terms):
     num_unique_terms = len(unique_terms)
 
     # 1 to 8 officer semesters
     for i in range(1, 9):
         short_name = 'officersemester{:02d}'.format(i)
-        achievement = get_object_or_none(Achievement, short_name=short_name)
+        achievement = Achievement.objects.by_short_name(short_name)
         if achievement:
             if num_unique_terms < i:
                 achievement.assign(
-                    instance.user, acquired=False, progress=num_unique_terms)
+                    user, acquired=False, progress=num_unique_terms)
             else:
-                achievement.assign(instance.user, term=unique_terms[i-1])
+                achievement.assign(user, term=unique_terms[i-1])
 
 
-def assign_chair_achievements(instance, chair_terms):
+def assign_chair_achievements(user, chair_terms):
     num_committees_chaired = len(chair_terms)
 
-    chair1achievement = get_object_or_none(
-        Achievement, short_name='chair1committee')
-    chair2achievement = get_object_or_none(
-        Achievement, short_name='chair2committees')
+    chair1achievement = Achievement.objects.by_short_name('chair1committee')
+    chair2achievement = Achievement.objects.by_short_name('chair2committees')
     if num_committees_chaired >= 1:
         # terms is a list of lists
         terms = list(chair_terms.values())
@@ -114,7 +121,7 @@ def assign_chair_achievements(instance, chair_terms):
             #chair1_terms = terms[0]
             chair1_terms = next(iter(terms))
             chair1achievement.assign(
-                instance.user, term=chair1_terms[0])
+                user, term=chair1_terms[0])
 
         if chair2achievement:
             if num_committees_chaired >= 2:
@@ -122,19 +129,19 @@ def assign_chair_achievements(instance, chair_terms):
                 # term that they were chair
                 chair2_terms = terms[1]
                 chair2achievement.assign(
-                    instance.user, term=chair2_terms[0])
+                    user, term=chair2_terms[0])
             else:
                 chair2achievement.assign(
-                    instance.user, acquired=False, progress=1)
+                    user, acquired=False, progress=1)
 
 
-def assign_repeat_achievements(instance, repeat_positions):
-    twice_same_position = get_object_or_none(
-        Achievement, short_name='twice_same_position')
-    thrice_same_position = get_object_or_none(
-        Achievement, short_name='thrice_same_position')
-    two_repeated_positions = get_object_or_none(
-        Achievement, short_name='two_repeated_positions')
+def assign_repeat_achievements(user, repeat_positions):
+    twice_same_position = Achievement.objects.by_short_name(
+        'twice_same_position')
+    thrice_same_position = Achievement.objects.by_short_name(
+        'thrice_same_position')
+    two_repeated_positions = Achievement.objects.by_short_name(
+        'two_repeated_positions')
 
     twice_held_positions = set()
     num_unique_twice_held_positions = 0
@@ -143,7 +150,7 @@ def assign_repeat_achievements(instance, repeat_positions):
         if len(sequence['positions']) >= 2:
             if twice_same_position:
                 twice_same_position.assign(
-                    instance.user, term=sequence['terms'][1])
+                    user, term=sequence['terms'][1])
 
             if sequence['positions'][0] not in twice_held_positions:
                 twice_held_positions.add(sequence['positions'][0])
@@ -152,17 +159,17 @@ def assign_repeat_achievements(instance, repeat_positions):
             if num_unique_twice_held_positions == 2:
                 if two_repeated_positions:
                     two_repeated_positions.assign(
-                        instance.user, term=sequence['terms'][1])
+                        user, term=sequence['terms'][1])
 
         if len(sequence['positions']) >= 3:
             if thrice_same_position:
                 thrice_same_position.assign(
-                    instance.user, term=sequence['terms'][2])
+                    user, term=sequence['terms'][2])
 
 
-def assign_diffposition_achievements(instance, committee_terms):
-    three_unique_positions = get_object_or_none(
-        Achievement, short_name='three_unique_positions')
+def assign_diffposition_achievements(user, committee_terms):
+    three_unique_positions = Achievement.objects.by_short_name(
+        'three_unique_positions')
     if len(committee_terms) >= 3:
         # terms is a list of lists
         terms = list(committee_terms.values())
@@ -172,13 +179,18 @@ def assign_diffposition_achievements(instance, committee_terms):
             # different committee
             third_committee_terms = terms[2]
             three_unique_positions.assign(
-                instance.user, term=third_committee_terms[0])
+                user, term=third_committee_terms[0])
 
 
-def assign_straight_to_the_top_achievement(instance, straight_to_the_top_term):
-    straighttothetop = get_object_or_none(
-        Achievement, short_name='straighttothetop')
+def assign_straight_to_the_top_achievement(user, straight_to_the_top_term):
+    straighttothetop = Achievement.objects.by_short_name('straighttothetop')
     if straighttothetop:
-        straighttothetop.assign(instance.user, term=straight_to_the_top_term)
+        straighttothetop.assign(user, term=straight_to_the_top_term)
+
+
+rules.register(
+    'officership', evaluate_officership_achievements,
+    lambda user_ids: Officer.objects.filter(
+        user__in=user_ids).values_list('user', flat=True).distinct())
 
 models.signals.post_save.connect(officership_achievements, sender=Officer)
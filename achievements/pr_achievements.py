@@ -2,77 +2,93 @@ import string
 
 from django.db import models
 
+from achievements import rules
 from achievements.models import Achievement
 from project_reports.models import ProjectReport
-from shortcuts import get_object_or_none
 
 
 def project_report_achievements(sender, instance, created, **kwargs):
     # only check the achievement assignment if the PR is complete
-    if instance.complete:
-        assign_alphabet_pr_achievement(instance)
-        assign_lifetime_pr_achievements(instance)
-        assign_procrastination_achievement(instance)
-
-
-def assign_alphabet_pr_achievement(instance):
-    # see if letters A-Z are in project report text
-    project_report_text = ''.join([instance.title,
-                                   instance.other_group,
-                                   instance.description,
-                                   instance.purpose,
-                                   instance.organization,
-                                   instance.cost,
-                                   instance.problems,
-                                   instance.results])
-    unused_letters = set(string.lowercase)
-    unused_letters.difference_update(project_report_text.lower())
-
-    if len(unused_letters) == 0:
-        achievement = get_object_or_none(Achievement,
-                                         short_name='alphabet_project_report')
-        if achievement:
-            achievement.assign(instance.author, term=instance.term)
-
-
-def assign_lifetime_pr_achievements(instance):
-    # obtain all project reports authored by user
-    project_reports = ProjectReport.objects.select_related(
-        'event__term').filter(
-        author=instance.author, complete=True).order_by('event__term__pk')
-
-    project_report_count = project_reports.count()
+    if instance.complete and instance.author:
+        rules.request_evaluation('project_report', [instance.author])
+
+
+def evaluate_project_report_achievements(users):
+    for user in users:
+        # obtain all project reports authored by user
+        project_reports = list(ProjectReport.objects.select_related(
+            'term').filter(author=user, complete=True).order_by(
+            'term', 'first_completed_at', 'pk'))
+        assign_alphabet_pr_achievement(user, project_reports)
+        assign_lifetime_pr_achievements(user, project_reports)
+        assign_procrastination_achievement(user, project_reports)
+
+
+def assign_alphabet_pr_achievement(user, project_reports):
+    achievement = Achievement.objects.by_short_name('alphabet_project_report')
+    if not achievement:
+        return
+
+    for project_report in project_reports:
+        # see if letters A-Z are in project report text
+        project_report_text = ''.join([project_report.title,
+                                       project_report.other_group,
+                                       project_report.description,
+                                       project_report.purpose,
+                                       project_report.organization,
+                                       project_report.cost,
+                                       project_report.problems,
+                                       project_report.results])
+        unused_letters = set(string.ascii_lowercase)
+        unused_letters.difference_update(project_report_text.lower())
+
+        if len(unused_letters) == 0:
+            achievement.assign(user, term=project_report.term)
+            return
+
+
+def assign_lifetime_pr_achievements(user, project_reports):
+    project_report_count = len(project_reports)
 
     # the number of project reports needed to get achievements
     benchmarks = [1, 5, 15]
 
     for benchmark in benchmarks:
         short_name = 'write_{:02d}_project_reports'.format(benchmark)
-        achievement = get_object_or_none(Achievement, short_name=short_name)
+        achievement = Achievement.objects.by_short_name(short_name)
         if achievement:
             if project_report_count < benchmark:
                 achievement.assign(
-                    instance.author, acquired=False,
-                    progress=project_report_count)
+                    user, acquired=False, progress=project_report_count)
             else:
                 achievement.assign(
-                    instance.author,
-                    term=project_reports[benchmark - 1].term)
+                    user, term=project_reports[benchmark - 1].term)
 
 
-def assign_procrastination_achievement(instance):
-    # obtain the time taken to write the project report (the date between
-    # the event date and the first completed date)
-    event_date = instance.date
-    completion_date = instance.first_completed_at.date()
-    writing_time = completion_date - event_date
+def assign_procrastination_achievement(user, project_reports):
+    achievement = Achievement.objects.by_short_name(
+        'project_report_procrastination')
+    if not achievement:
+        return
+
+    for project_report in project_reports:
+        if project_report.first_completed_at is None:
+            continue
+        # obtain the time taken to write the project report (the date between
+        # the event date and the first completed date)
+        completion_date = project_report.first_completed_at.date()
+        writing_time = completion_date - project_report.date
+
+        if writing_time.days >= 60:
+            achievement.assign(user, term=project_report.term)
+            return
 
-    if writing_time.days >= 60:
-        achievement = get_object_or_none(
-            Achievement, short_name='project_report_procrastination')
-        if achievement:
-            achievement.assign(instance.author, term=instance.term)
 
+rules.register(
+    'project_report', evaluate_project_report_achievements,
+    lambda user_ids: ProjectReport.objects.filter(
+        author__in=user_ids, complete=True).values_list(
+        'author', flat=True).distinct())
 
 models.signals.post_save.connect(project_report_achievements,
                                  sender=ProjectReport)
@@ -0,0 +1,99 @@
+import collections
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from achievements.models import AchievementEvaluationJob
+
+
+# The order in which rule groups are recomputed, since meta achievements
+# depend on the achievements of the other groups
+RECOMPUTE_ORDER = ['event', 'officership', 'course_file', 'project_report',
+                   'icon', 'meta']
+
+# A map from the name of each rule group (see
+# AchievementEvaluationJob.RULE_GROUPS) to the function that evaluates its
+# achievements for a list of users. Each rule module registers its own.
+_evaluators = {}
+
+# A map from the name of each rule group to the function that returns which
+# of a list of user pks the rule group's achievements depend on
+_user_selectors = {}
+
+
+def register(rule_group, evaluator, select_user_ids):
+    """Register the function that evaluates the achievements of the rule group
+    for a list of users, and the function that selects (with one query) which
+    of a list of user pks have anything the achievements depend on.
+    """
+    _evaluators[rule_group] = evaluator
+    _user_selectors[rule_group] = select_user_ids
+
+
+def is_deferred():
+    """Return True if achievements are evaluated by the process_achievements
+    command rather than when the objects they depend on are saved.
+    """
+    return getattr(settings, 'ACHIEVEMENTS_DEFERRED', False)
+
+
+def request_evaluation(rule_group, users):
+    """Evaluate the achievements of the rule group for the given users, or
+    just enqueue a job for each of them if achievements are deferred.
+    """
+    if is_deferred():
+        AchievementEvaluationJob.objects.enqueue(
+            rule_group, [user.pk for user in users])
+    else:
+        _evaluators[rule_group](users)
+
+
+def process_jobs(batch_size=100):
+    """Evaluate a batch of pending jobs and return the number of jobs that
+    were processed.
+
+    The achievements of each rule group are evaluated for all of the batch's
+    users at once, in a transaction. If that fails, the jobs of the rule group
+    are enqueued again, and the error is raised once the other rule groups
+    are evaluated.
+    """
+    jobs = AchievementEvaluationJob.objects.claim(batch_size)
+    users = get_user_model().objects.in_bulk(
+        set(job.user_id for job in jobs))
+    users_by_rule_group = collections.defaultdict(list)
+    for job in jobs:
+        # Users may have been deleted since the job was enqueued
+        if job.user_id in users:
+            users_by_rule_group[job.rule_group].append(users[job.user_id])
+
+    error = None
+    for rule_group, group_users in users_by_rule_group.items():
+        try:
+            with transaction.atomic():
+                _evaluators[rule_group](group_users)
+        except Exception as exception:  # pylint: disable=broad-except
+            AchievementEvaluationJob.objects.enqueue(
+                rule_group, [user.pk for user in group_users])
+            if error is None:
+                error = exception
+    if error is not None:
+        raise error
+    return len(jobs)
+
+
+def recompute(user_ids):
+    """Evaluate the achievements of every rule group for the users with the
+    given pks, as if everything the achievements depend on had just been
+    saved.
+
+    Each rule group is only evaluated for the users that have something its
+    achievements depend on (like event attendance or officerships), and the
+    users are loaded with a single query.
+    """
+    users = get_user_model().objects.in_bulk(user_ids)
+    for rule_group in RECOMPUTE_ORDER:
+        selected_ids = _user_selectors[rule_group](list(users))
+        if selected_ids:
+            _evaluators[rule_group](
+                [users[user_id] for user_id in sorted(set(selected_ids))])
@@ -1,16 +1,28 @@
 import datetime
 import random
 import string
+from io import StringIO
 
 from django.contrib.auth import get_user_model
 from django.core.files import File
+from django.core.management import call_command
+from django.db import transaction
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
 from django.utils import timezone
 from freezegun import freeze_time
+from mock import Mock
+from mock import patch
 
+from achievements.event_achievements import evaluate_event_achievements
 from achievements.models import Achievement
+from achievements.models import AchievementEvaluationJob
 from achievements.models import AchievementIcon
 from achievements.models import UserAchievement
+from achievements.models import UserAchievementScore
+from achievements.views import LeaderboardListView
+from base.cache import get_shared_cache
 from base.models import Officer
 from base.models import OfficerPosition
 from base.models import Term
@@ -117,6 +129,51 @@ class AchievementAssignmentTest(TestCase):
         self.assertEqual(self.achievements.filter(acquired=True).count(), 1)
 
 
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+class AchievementRegistryTest(TransactionTestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        self.achievement = Achievement(
+            short_name='test',
+            name='Test Achievement',
+            description='An achievement for testing.',
+            points=0)
+        self.achievement.save()
+
+    def test_by_short_name(self):
+        self.assertEqual(Achievement.objects.by_short_name('test'),
+                         self.achievement)
+        with self.assertNumQueries(0):
+            self.assertEqual(Achievement.objects.by_short_name('test'),
+                             self.achievement)
+            self.assertIsNone(Achievement.objects.by_short_name('missing'))
+
+    def test_invalidated_on_save_and_delete(self):
+        self.assertEqual(Achievement.objects.by_short_name('test').name,
+                         'Test Achievement')
+        self.achievement.name = 'Renamed Achievement'
+        self.achievement.save()
+        self.assertEqual(Achievement.objects.by_short_name('test').name,
+                         'Renamed Achievement')
+        self.achievement.delete()
+        self.assertIsNone(Achievement.objects.by_short_name('test'))
+
+    def test_invalidated_on_fixture_load(self):
+        self.assertIsNone(
+            Achievement.objects.by_short_name('alphabet_attendance'))
+        with transaction.atomic():
+            call_command('loaddata', 'achievement.yaml', verbosity=0)
+            self.assertIsNotNone(
+                Achievement.objects.by_short_name('alphabet_attendance'))
+
+
 class EventAchievementsTest(TestCase):
     fixtures = ['achievement.yaml',
                 'officer_position.yaml',
@@ -587,6 +644,389 @@ class EventAchievementsTest(TestCase):
             acquired=True).count(), 1)
 
 
+class EventAchievementsEvaluationTest(TransactionTestCase):
+    fixtures = ['achievement.yaml',
+                'officer_position.yaml',
+                'test/term.yaml']
+
+    def setUp(self):
+        self.sample_user = get_user_model().objects.create_user(
+            username='test', password='test', email='test@tbp.berkeley.edu',
+            first_name="Test", last_name="Test")
+        self.other_user = get_user_model().objects.create_user(
+            username='other', password='test', email='other@tbp.berkeley.edu',
+            first_name="Other", last_name="Test")
+        self.sp2013 = Term.objects.get(term=Term.SPRING, year='2013')
+        self.fa2013 = Term.objects.get(term=Term.FALL, year='2013')
+        self.meeting, _ = EventType.objects.get_or_create(name="Meeting")
+
+    def create_event(self, name, term):
+        return Event.objects.create(
+            name=name,
+            contact=self.sample_user,
+            term=term,
+            location="TBD",
+            event_type=self.meeting,
+            start_datetime=timezone.now(),
+            end_datetime=timezone.now(),
+            committee=OfficerPosition.objects.first())
+
+    def test_record_many(self):
+        """Event achievements are assigned to every user whose attendance is
+        recorded in bulk.
+        """
+        event = self.create_event("D15", self.sp2013)
+        EventAttendance.objects.record_many(
+            event, [self.sample_user.pk, self.other_user.pk])
+        self.assertEqual(UserAchievement.objects.filter(
+            achievement__short_name='attend_d15', acquired=True).count(), 2)
+        self.assertEqual(UserAchievement.objects.filter(
+            achievement__short_name='attend025events', acquired=False,
+            progress=1).count(), 2)
+
+    def test_deferred_until_commit(self):
+        """Attendance recorded in bulk within a transaction is evaluated once
+        the transaction commits, for all of the terms it was recorded in.
+        """
+        d15 = self.create_event("D15", self.sp2013)
+        convention = self.create_event("National Convention", self.fa2013)
+        with transaction.atomic():
+            EventAttendance.objects.record_many(d15, [self.sample_user.pk])
+            EventAttendance.objects.record_many(
+                convention, [self.sample_user.pk, self.other_user.pk])
+            self.assertFalse(UserAchievement.objects.exists())
+
+        achievements = UserAchievement.objects.filter(
+            user=self.sample_user, acquired=True)
+        self.assertEqual(
+            achievements.get(achievement__short_name='attend_d15').term,
+            self.sp2013)
+        self.assertEqual(
+            achievements.get(achievement__short_name='attend_convention').term,
+            self.fa2013)
+        self.assertTrue(UserAchievement.objects.filter(
+            user=self.other_user, achievement__short_name='attend_convention',
+            acquired=True).exists())
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.sample_user,
+            achievement__short_name='attend025events').progress, 2)
+
+    def test_rolled_back(self):
+        """Users deferred in a transaction that is rolled back aren't
+        evaluated when a later transaction commits.
+        """
+        d15 = self.create_event("D15", self.sp2013)
+        try:
+            with transaction.atomic():
+                EventAttendance.objects.record_many(d15, [self.other_user.pk])
+                raise ValueError
+        except ValueError:
+            pass
+        EventAttendance.objects.bulk_create(
+            [EventAttendance(event=d15, user=self.other_user)])
+
+        EventAttendance.objects.record_many(d15, [self.sample_user.pk])
+        self.assertEqual(
+            list(UserAchievement.objects.filter(
+                achievement__short_name='attend_d15').values_list(
+                'user', flat=True)),
+            [self.sample_user.pk])
+
+    def test_evaluate_all_terms(self):
+        """Without terms, achievements are computed for every term the users
+        attended events in.
+        """
+        d15 = self.create_event("D15", self.sp2013)
+        convention = self.create_event("National Convention", self.fa2013)
+        EventAttendance.objects.bulk_create([
+            EventAttendance(event=d15, user=self.sample_user),
+            EventAttendance(event=convention, user=self.other_user)])
+        self.assertFalse(UserAchievement.objects.exists())
+
+        evaluate_event_achievements(
+            [self.sample_user.pk, self.other_user.pk])
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.sample_user, achievement__short_name='attend_d15',
+            acquired=True).term, self.sp2013)
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.other_user, achievement__short_name='attend_convention',
+            acquired=True).term, self.fa2013)
+        self.assertFalse(UserAchievement.objects.filter(
+            user=self.sample_user,
+            achievement__short_name='attend_convention').exists())
+
+
+@override_settings(ACHIEVEMENTS_DEFERRED=True)
+class AchievementEvaluationJobTest(TestCase):
+    fixtures = ['achievement.yaml',
+                'officer_position.yaml',
+                'test/term.yaml']
+
+    def setUp(self):
+        self.sample_user = get_user_model().objects.create_user(
+            username='test', password='test', email='test@tbp.berkeley.edu',
+            first_name="Test", last_name="Test")
+        self.other_user = get_user_model().objects.create_user(
+            username='other', password='test', email='other@tbp.berkeley.edu',
+            first_name="Other", last_name="Test")
+        self.sp2013 = Term.objects.get(term=Term.SPRING, year='2013')
+        self.meeting, _ = EventType.objects.get_or_create(name="Meeting")
+        self.event = Event.objects.create(
+            name='D15',
+            contact=self.sample_user,
+            term=self.sp2013,
+            location="TBD",
+            event_type=self.meeting,
+            start_datetime=timezone.now(),
+            end_datetime=timezone.now(),
+            committee=OfficerPosition.objects.first())
+
+    def test_enqueue_on_save(self):
+        """Saving attendance only enqueues a job, which is deduplicated per
+        user and rule group.
+        """
+        EventAttendance(event=self.event, user=self.sample_user).save()
+        EventAttendance.objects.record_many(
+            self.event, [self.sample_user.pk, self.other_user.pk])
+        self.assertFalse(UserAchievement.objects.exists())
+        self.assertEqual(
+            set(AchievementEvaluationJob.objects.values_list(
+                'user', 'rule_group')),
+            set([(self.sample_user.pk, 'event'),
+                 (self.other_user.pk, 'event')]))
+
+    def test_enqueue_project_reports(self):
+        """Completing a project report only enqueues a job for its author."""
+        project_report = ProjectReport.objects.create(
+            term=self.sp2013, date=datetime.date.today(), title='Report',
+            author=self.sample_user, committee=OfficerPosition.objects.first())
+        self.assertFalse(AchievementEvaluationJob.objects.exists())
+
+        project_report.complete = True
+        project_report.save()
+        self.assertFalse(UserAchievement.objects.exists())
+        self.assertEqual(
+            list(AchievementEvaluationJob.objects.values_list(
+                'user', 'rule_group')),
+            [(self.sample_user.pk, 'project_report')])
+
+        call_command('process_achievements', verbosity=0)
+        self.assertTrue(UserAchievement.objects.filter(
+            user=self.sample_user,
+            achievement__short_name='write_01_project_reports',
+            acquired=True).exists())
+
+    def test_process_achievements(self):
+        """The process_achievements command evaluates pending jobs, including
+        the jobs enqueued while evaluating them.
+        """
+        EventAttendance.objects.record_many(
+            self.event, [self.sample_user.pk, self.other_user.pk])
+        call_command('process_achievements', verbosity=0)
+
+        self.assertFalse(AchievementEvaluationJob.objects.exists())
+        self.assertEqual(UserAchievement.objects.filter(
+            achievement__short_name='attend_d15', acquired=True).count(), 2)
+        # Acquiring achievements enqueues the meta achievements, which
+        # records progress towards the achievement for acquiring 15
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.sample_user,
+            achievement__short_name='acquire_15_achievements').progress,
+            UserAchievement.objects.filter(
+                user=self.sample_user, acquired=True).count())
+
+    def test_failed_jobs_are_enqueued_again(self):
+        """Jobs are kept if evaluating their achievements fails."""
+        AchievementEvaluationJob.objects.enqueue('event', [self.sample_user.pk])
+        with patch.dict('achievements.rules._evaluators',
+                        {'event': Mock(side_effect=ValueError)}):
+            with self.assertRaises(ValueError):
+                call_command('process_achievements', verbosity=0)
+        self.assertTrue(AchievementEvaluationJob.objects.filter(
+            user=self.sample_user, rule_group='event').exists())
+
+
+class RecomputeAchievementsTest(TestCase):
+    fixtures = ['achievement.yaml',
+                'officer_position.yaml',
+                'test/term.yaml']
+
+    def setUp(self):
+        self.sample_user = get_user_model().objects.create_user(
+            username='test', password='test', email='test@tbp.berkeley.edu',
+            first_name="Test", last_name="Test")
+        self.other_user = get_user_model().objects.create_user(
+            username='other', password='test', email='other@tbp.berkeley.edu',
+            first_name="Other", last_name="Test")
+        self.sp2013 = Term.objects.get(term=Term.SPRING, year='2013')
+        self.fa2013 = Term.objects.get(term=Term.FALL, year='2013')
+        meeting, _ = EventType.objects.get_or_create(name="Meeting")
+        event = Event.objects.create(
+            name='D15',
+            contact=self.sample_user,
+            term=self.sp2013,
+            location="TBD",
+            event_type=meeting,
+            start_datetime=timezone.now(),
+            end_datetime=timezone.now(),
+            committee=OfficerPosition.objects.first())
+
+        # Create attendance and officers in bulk, like an import would,
+        # without evaluating any achievements
+        EventAttendance.objects.bulk_create(
+            [EventAttendance(event=event, user=self.sample_user)])
+        Officer.objects.bulk_create([
+            Officer(user=self.other_user, term=term,
+                    position=OfficerPosition.objects.get(short_name='it'))
+            for term in (self.sp2013, self.fa2013)])
+        ProjectReport.objects.bulk_create([ProjectReport(
+            term=self.fa2013, date=datetime.date.today(), title='Report',
+            author=self.other_user, committee=OfficerPosition.objects.first(),
+            complete=True, first_completed_at=timezone.now())])
+
+    def recompute(self, *args):
+        output = StringIO()
+        call_command('recompute_achievements', *args, stdout=output)
+        return output.getvalue()
+
+    def test_dry_run(self):
+        output = self.recompute('--dry-run')
+        self.assertFalse(UserAchievement.objects.exists())
+        self.assertIn('Recomputed the achievements of 2/2 users', output)
+        self.assertIn('test: attend_d15: none -> acquired in Spring 2013',
+                      output)
+        self.assertIn('other: officersemester02: none -> acquired in Fall 2013',
+                      output)
+
+    def test_recompute(self):
+        self.recompute('--chunk-size', '1')
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.sample_user, achievement__short_name='attend_d15',
+            acquired=True).term, self.sp2013)
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.other_user, achievement__short_name='officersemester02',
+            acquired=True).term, self.fa2013)
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.other_user,
+            achievement__short_name='write_01_project_reports',
+            acquired=True).term, self.fa2013)
+        self.assertFalse(UserAchievement.objects.filter(
+            user=self.other_user, achievement__category='event').exists())
+        # Meta achievements are computed after the others
+        self.assertEqual(UserAchievement.objects.get(
+            user=self.sample_user,
+            achievement__short_name='acquire_15_achievements').progress,
+            UserAchievement.objects.filter(
+                user=self.sample_user, acquired=True).count())
+
+        # Nothing changes when achievements are recomputed again
+        self.assertIn('Created 0 user achievements and changed 0 existing ones',
+                      self.recompute())
+
+
+class UserAchievementScoreTest(TestCase):
+    fixtures = ['test/term.yaml']
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                username='user{}'.format(i), password='test',
+                email='user{}@tbp.berkeley.edu'.format(i),
+                first_name='User', last_name=str(i))
+            for i in range(4)]
+        self.achievements = dict(
+            (points, Achievement.objects.create(
+                name='{} points'.format(points),
+                short_name='points{}'.format(abs(points)),
+                description='test', points=points, category='feats'))
+            for points in (-20, 5, 10))
+
+    def assertScores(self, expected):
+        """Assert that the (points, acquired count, rank) of each user match
+        the expected ones (None for users without a score), and that
+        rebuilding the scores doesn't change them.
+        """
+        scores = UserAchievementScore.objects.in_bulk()
+        self.assertEqual(
+            [(scores[user.pk].points, scores[user.pk].acquired_count,
+              scores[user.pk].get_rank()) if user.pk in scores else None
+             for user in self.users],
+            expected)
+        created, updated, _ = UserAchievementScore.objects.rebuild()
+        self.assertEqual((created, updated), (0, 0))
+
+    def test_scores(self):
+        self.achievements[10].assign(self.users[0])
+        self.achievements[5].assign(self.users[1])
+        self.achievements[10].assign(self.users[2])
+        self.achievements[-20].assign(self.users[3], acquired=False)
+        self.assertScores(
+            [(10, 1, 1), (5, 1, 3), (10, 1, 1), None])
+
+        # Users move up and down as their points change
+        self.achievements[5].assign(self.users[1], acquired=True)
+        self.achievements[10].assign(self.users[1])
+        self.assertScores(
+            [(10, 1, 2), (15, 2, 1), (10, 1, 2), None])
+        UserAchievement.objects.filter(
+            user=self.users[1], achievement=self.achievements[10]).delete()
+        self.assertScores(
+            [(10, 1, 1), (5, 1, 3), (10, 1, 1), None])
+
+        # Users with negative points aren't on the leaderboard
+        self.achievements[-20].assign(self.users[0])
+        self.assertScores(
+            [(-10, 2, None), (5, 1, 2), (10, 1, 1), None])
+        self.assertEqual(
+            list(UserAchievementScore.objects.ranked().values_list(
+                'user', flat=True)),
+            [self.users[2].pk, self.users[1].pk])
+
+        # Unacquiring an achievement updates the score
+        self.achievements[10].assign(self.users[2], acquired=False)
+        self.assertScores(
+            [(-10, 2, None), (5, 1, 1), (0, 0, None), None])
+
+    def test_update_score(self):
+        """Updating a score only locks and changes the user's own score."""
+        self.achievements[10].assign(self.users[0])
+        self.achievements[5].assign(self.users[1])
+        UserAchievement.objects.filter(user=self.users[1]).update(
+            achievement=self.achievements[10])
+        with self.assertNumQueries(7):
+            # The totals, then update_or_create's locked read of the score
+            # and its update, each in a savepoint
+            UserAchievementScore.objects.update_score(self.users[1].pk)
+        self.assertScores([(10, 1, 1), (10, 1, 1), None, None])
+
+    def test_leaderboard(self):
+        for user, points in zip(self.users, (10, 5, 10, -20)):
+            self.achievements[points].assign(user)
+        leaders = LeaderboardListView().get_queryset()
+        self.assertEqual(
+            [(leader.pk, leader.score, leader.rank) for leader in leaders],
+            [(self.users[0].pk, 10, 1), (self.users[2].pk, 10, 1),
+             (self.users[1].pk, 5, 3)])
+
+    def test_deleted_user(self):
+        for user, points in zip(self.users, (10, 5, 10)):
+            self.achievements[points].assign(user)
+        self.users[0].delete()
+        del self.users[0]
+        self.assertScores([(5, 1, 2), (10, 1, 1), None])
+
+    def test_rebuild(self):
+        for user, points in zip(self.users, (10, 5, 10, -20)):
+            self.achievements[points].assign(user)
+        UserAchievementScore.objects.update(points=0)
+        output = StringIO()
+        call_command('rebuild_achievement_scores', stdout=output)
+        self.assertEqual(output.getvalue(),
+                         'Created 0 scores, updated 4 and deleted 0\n')
+        self.assertScores(
+            [(10, 1, 1), (5, 1, 3), (10, 1, 1), (-20, 1, None)])
+
+
 class CourseFileAchievementsTest(TestCase):
     fixtures = ['achievement.yaml',
                 'test/course_instance.yaml']
@@ -4,7 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
 from django.urls import reverse
 from django.urls import reverse_lazy
-from django.db.models import Sum
+from django.db.models import F
 from django.forms import HiddenInput
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
@@ -14,7 +14,9 @@ from django.views.generic import ListView
 from achievements.forms import UserAchievementForm
 from achievements.models import Achievement
 from achievements.models import UserAchievement
-from shortcuts import create_leaderboard
+from achievements.models import UserAchievementScore
+from shortcuts import create_leaderboard_page
+from shortcuts import rank_leaders
 
 
 class AchievementDetailView(FormView):
@@ -98,14 +100,23 @@ class LeaderboardListView(ListView):
     def dispatch(self, *args, **kwargs):
         return super(LeaderboardListView, self).dispatch(*args, **kwargs)
 
+    def get_leaders(self):
+        # The points are stored (see UserAchievementScore), so they don't need
+        # to be added up for every user
+        # (only the users who are ranked, see UserAchievementScore.ranked)
+        return get_user_model().objects.filter(
+            achievement_score__acquired_count__gt=0,
+            achievement_score__points__gte=0).select_related(
+            'userprofile').annotate(score=F('achievement_score__points'))
+
     def get_queryset(self):
-        leaders = get_user_model().objects.filter(
-            userachievement__acquired=True).select_related(
-            'userprofile').annotate(
-                score=Sum('userachievement__achievement__points')).filter(
-            score__gte=0).order_by('-score')
+        return rank_leaders(self.get_leaders())
 
-        return create_leaderboard(leaders, 70)
+    def get_context_data(self, **kwargs):
+        context = super(LeaderboardListView, self).get_context_data(**kwargs)
+        context['leader_list'] = create_leaderboard_page(
+            self.get_leaders(), context['object_list'], 70)
+        return context
 
 
 class UserAchievementAssignView(FormView):
@@ -142,7 +153,6 @@ class UserAchievementListView(ListView):
     template_name = 'achievements/user.html'
     display_user = None
     user_achievements = None
-    user_points = 0
 
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
@@ -156,10 +166,6 @@ class UserAchievementListView(ListView):
 
     def get_queryset(self):
         queryset = self.user_achievements
-
-        for userachievement in queryset:
-            self.user_points += userachievement.achievement.points
-
         if self.request.user != self.display_user:
             queryset = queryset.exclude(achievement__privacy='private')
 
@@ -169,8 +175,12 @@ class UserAchievementListView(ListView):
         context = super(UserAchievementListView, self).get_context_data(
             **kwargs)
         context['display_user'] = self.display_user
-        context['user_points'] = self.user_points
-        context['user_num_achievements'] = self.user_achievements.count()
+        score = UserAchievementScore.objects.filter(
+            user=self.display_user).first()
+        context['user_points'] = score.points if score else 0
+        context['user_num_achievements'] = (
+            score.acquired_count if score else 0)
+        context['user_rank'] = score.get_rank() if score else None
 
         # Select achievements that have ids not found in the list of obtained
         # user achievements (i.e. they have not been acquired yet or don't
@@ -0,0 +1,99 @@
+import uuid
+
+from django.core.cache import caches
+
+
+# Alias of the cache shared by all worker processes (see settings.CACHES)
+SHARED_CACHE_ALIAS = 'shared'
+
+
+def get_shared_cache():
+    return caches[SHARED_CACHE_ALIAS]
+
+
+class CacheNamespace(object):
+    """A group of keys in the shared cache that are invalidated together.
+
+    Keys are prefixed with the name of the namespace, and values are stored
+    along with the namespace version they were computed for. The version and
+    the value are fetched in the same round trip, so a lookup is a single
+    cache hit. Invalidating the namespace deletes its version, which makes
+    every stored value stale for all processes at once.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.version_key = '{}:version'.format(name)
+
+    def make_key(self, key):
+        return '{}:{}'.format(self.name, key)
+
+    def get(self, key, default=None):
+        """Return the value stored for the key if it is current, or the
+        default otherwise.
+        """
+        return self._get(key, default)[0]
+
+    def get_or_set(self, key, default, timeout=None):
+        """Return the value stored for the key if it is current. Otherwise,
+        compute the value by calling default() and store it.
+
+        The timeout is either a number of seconds or a function that is
+        called with the computed value and returns the number of seconds.
+        """
+        return self.get_or_set_with_version(key, default, timeout)[0]
+
+    def get_or_set_with_version(self, key, default, timeout=None):
+        """Like get_or_set, but return the value along with the version of
+        the namespace it is current for (see get_version).
+        """
+        value, version = self._get(key)
+        if value is not None:
+            return value, version
+
+        cache = get_shared_cache()
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key, version)
+
+        # The version is read before computing the value, so a value computed
+        # while the namespace is invalidated is stored as stale
+        value = default()
+        if value is not None:
+            if callable(timeout):
+                timeout = timeout(value)
+            cache.set(self.make_key(key), (version, value), timeout)
+        return value, version
+
+    def get_version(self):
+        """Return the current version of the namespace, or None if it was
+        invalidated (or the cache doesn't store anything).
+
+        Values kept outside of the cache along with the version they were
+        computed for are current as long as the version doesn't change.
+        """
+        return get_shared_cache().get(self.version_key)
+
+    def _get(self, key, default=None):
+        """Return the value stored for the key (or the default if it is not
+        current) and the current version of the namespace.
+        """
+        full_key = self.make_key(key)
+        values = get_shared_cache().get_many([self.version_key, full_key])
+        version = values.get(self.version_key)
+        if version is not None and full_key in values:
+            value_version, value = values[full_key]
+            if value_version == version:
+                return value, version
+        return default, version
+
+    def invalidate(self):
+        invalidate_namespaces([self])
+
+
+def invalidate_namespaces(namespaces):
+    """Invalidate every key in the given namespaces with a single cache
+    operation.
+    """
+    get_shared_cache().delete_many(
+        [namespace.version_key for namespace in namespaces])
@@ -1,10 +1,12 @@
 from django.conf import settings
 from django.contrib.auth.models import Group
-from django.core.cache import cache
 from django.db import models
 from django.db import transaction
 from django.utils import timezone
 
+from base.cache import CacheNamespace
+from base.roster import invalidate_term_rosters
+
 
 # Mixins
 class IDCodeMixin(models.Model):
@@ -47,19 +49,21 @@ class Major(models.Model):
         unique_together = ('university', 'short_name')
 
 
+# Cached term lookups, which are invalidated whenever a term is saved or deleted
+TERM_CACHE = CacheNamespace('terms')
+
+
 class TermManager(models.Manager):
     def get_current_term(self):
         """Return the term with current set to True, or None if no current term
         exists.
         """
-        term = cache.get('current_term')
-        if not term:
+        def get_term():
             try:
-                term = self.get(current=True)
-                cache.set('current_term', term)
+                return self.get(current=True)
             except Term.DoesNotExist:
-                pass
-        return term
+                return None
+        return TERM_CACHE.get_or_set('current_term', get_term)
 
     def get_terms(self, include_future=False, include_summer=False,
                   include_unknown=False, reverse=False):
@@ -174,8 +178,9 @@ class Term(models.Model):
                     id=self.id).update(current=False)
             super(Term, self).save(*args, **kwargs)
             self.update_term_officer_groups()
-            if self.current:
-                cache.set('current_term', self)  # Update the cache
+            # Every process will look up the current term again once the
+            # changes are committed
+            transaction.on_commit(TERM_CACHE.invalidate)
 
     def verbose_name(self):
         """Returns the verbose name of this object in this form: Fall 2012."""
@@ -408,16 +413,36 @@ class Officer(models.Model):
 
 def officer_post_save(sender, instance, *args, **kwargs):
     """Ensure that the user for a new Officer object is added to the
-    corresponding auth groups.
+    corresponding auth groups, and that term rosters are rebuilt.
     """
     instance._add_user_to_officer_groups()
+    transaction.on_commit(invalidate_term_rosters)
 
 
 def officer_post_delete(sender, instance, *args, **kwargs):
     """Ensure that the user for a new Officer object is removed from the
-    corresponding auth groups.
+    corresponding auth groups, and that term rosters are rebuilt.
     """
     instance._remove_user_from_officer_groups()
+    transaction.on_commit(invalidate_term_rosters)
 
 models.signals.post_save.connect(officer_post_save, sender=Officer)
 models.signals.post_delete.connect(officer_post_delete, sender=Officer)
+
+
+def officer_position_post_save(sender, instance, *args, **kwargs):
+    """Ensure that term rosters are rebuilt, since they depend on whether
+    positions are auxiliary.
+    """
+    transaction.on_commit(invalidate_term_rosters)
+
+models.signals.post_save.connect(officer_position_post_save,
+                                 sender=OfficerPosition)
+
+
+def term_post_delete(sender, instance, *args, **kwargs):
+    """Ensure that cached terms are looked up again once a term is deleted."""
+    transaction.on_commit(TERM_CACHE.invalidate)
+
+
+models.signals.post_delete.connect(term_post_delete, sender=Term)
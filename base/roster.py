@@ -0,0 +1,163 @@
+from django.db.models import Q
+
+from base.cache import CacheNamespace
+from base.cache import invalidate_namespaces
+
+
+# Maximum number of seconds a term roster is cached for. Rosters are
+# invalidated whenever officers, candidates or initiations change, so this
+# only bounds how long bulk updates (which don't send signals) go unnoticed.
+TERM_ROSTER_CACHE_TIMEOUT = 60 * 60
+
+
+def get_term_roster_cache(term_id):
+    return CacheNamespace('term_rosters:{}'.format(term_id))
+
+
+class TermRoster(object):
+    """The sets of ids of the officers, candidates and initiated members of a
+    term, for classifying many users without a query for each of them.
+
+    Use TermRoster.for_term(term) to get the (cached) roster of a term.
+    """
+    def __init__(self, term_id, officer_ids, auxiliary_officer_ids,
+                 candidate_ids, member_ids):
+        self.term_id = term_id
+        # Users with at least one non-auxiliary officer position in the term
+        self.officer_ids = frozenset(officer_ids)
+        # Users whose only officer positions in the term are auxiliary
+        self.auxiliary_officer_ids = frozenset(auxiliary_officer_ids)
+        self.candidate_ids = frozenset(candidate_ids)
+        # Users who initiated in or before the term
+        self.member_ids = frozenset(member_ids)
+
+    @classmethod
+    def for_term(cls, term):
+        """Return the roster of the given term (or term pk), from the shared
+        cache if possible. The roster of no term (None) is empty.
+        """
+        # Avoid circular dependency by importing here:
+        from base.models import Term
+
+        term_id = getattr(term, 'pk', term)
+        if term_id is None:
+            return cls(None, (), (), (), ())
+
+        def build():
+            if isinstance(term, Term):
+                return cls.build(term)
+            return cls.build(Term.objects.get(pk=term_id))
+        return get_term_roster_cache(term_id).get_or_set(
+            'roster', build, timeout=TERM_ROSTER_CACHE_TIMEOUT)
+
+    @classmethod
+    def build(cls, term):
+        """Load the roster of the given term in three queries."""
+        # Avoid circular dependencies by importing here:
+        from base.models import Officer
+        from candidates.models import Candidate
+        from user_profiles.models import StudentOrgUserProfile
+
+        officer_ids = set()
+        auxiliary_officer_ids = set()
+        for user_id, auxiliary in Officer.objects.filter(
+                term=term).order_by().values_list(
+                'user', 'position__auxiliary'):
+            if auxiliary:
+                auxiliary_officer_ids.add(user_id)
+            else:
+                officer_ids.add(user_id)
+        candidate_ids = Candidate.objects.filter(term=term).values_list(
+            'user', flat=True)
+        member_ids = StudentOrgUserProfile.objects.filter(
+            get_terms_until(term, 'initiation_term__')).values_list(
+            'user', flat=True)
+        return cls(term.pk, officer_ids, auxiliary_officer_ids - officer_ids,
+                   candidate_ids, member_ids)
+
+    def is_officer(self, user_id, exclude_aux=False):
+        """Return True if the user was an officer in the term.
+
+        If exclude_aux is True, users with only auxiliary positions are not
+        counted as officers.
+        """
+        return (user_id in self.officer_ids or
+                (not exclude_aux and user_id in self.auxiliary_officer_ids))
+
+    def get_officer_ids(self, exclude_aux=False):
+        """Return the set of ids of the term's officers."""
+        if exclude_aux:
+            return self.officer_ids
+        return self.officer_ids | self.auxiliary_officer_ids
+
+    def is_candidate(self, user_id):
+        return user_id in self.candidate_ids
+
+    def is_member(self, user_id):
+        return user_id in self.member_ids
+
+    def get_position(self, user_id):
+        """Return 'officer', 'candidate' or 'member', the way users are
+        classified on leaderboards: by non-auxiliary officer position first,
+        then by candidacy, with everyone else counted as a member.
+        """
+        if self.is_officer(user_id, exclude_aux=True):
+            return 'officer'
+        elif self.is_candidate(user_id):
+            return 'candidate'
+        return 'member'
+
+
+def get_terms_until(term, prefix=''):
+    """Return a Q object that matches the terms up to and including the given
+    term, by their year and term fields. The prefix is prepended to the field
+    names, for matching terms through a relation (e.g. 'initiation_term__').
+    """
+    # Avoid circular dependency by importing here:
+    from base.models import Term
+
+    term_index = Term.TERM_MAPPING[term.term]
+    earlier_terms = [term_name for term_name, index
+                     in Term.TERM_MAPPING.items() if index <= term_index]
+    return (Q(**{prefix + 'year__lt': term.year}) |
+            Q(**{prefix + 'year': term.year,
+                 prefix + 'term__in': earlier_terms}))
+
+
+def invalidate_term_rosters(term_ids=None):
+    """Invalidate the cached rosters of the terms with the given pks, or of
+    every term if no pks are given.
+    """
+    # Avoid circular dependency by importing here:
+    from base.models import Term
+
+    if term_ids is None:
+        term_ids = Term.objects.values_list('pk', flat=True)
+    namespaces = [get_term_roster_cache(term_id) for term_id in term_ids]
+    if namespaces:
+        invalidate_namespaces(namespaces)
+
+
+def invalidate_initiation_rosters(old_term_id, new_term_id):
+    """Invalidate the cached rosters of the terms whose members change when a
+    user's initiation term changes from the old term to the new one (either
+    of which can be None).
+
+    Users are members of the terms from their initiation term on, so only
+    the rosters of the terms between the two are affected.
+    """
+    # Avoid circular dependency by importing here:
+    from base.models import Term
+
+    if old_term_id == new_term_id:
+        return
+    terms = list(Term.objects.all())
+    bounds = sorted(term for term in terms
+                    if term.pk in (old_term_id, new_term_id))
+    if not bounds:
+        return
+    first = bounds[0]
+    last = bounds[1] if len(bounds) > 1 else None
+    invalidate_term_rosters([
+        term.pk for term in terms
+        if first <= term and (last is None or term < last)])
@@ -1,5 +1,10 @@
-from test.test_support import EnvironmentVarGuard
-from test.test_support import import_fresh_module
+import csv
+import importlib
+import importlib.util
+import io
+import os
+import sys
+from unittest import skipUnless
 
 from django import forms
 from django.contrib.auth.models import AnonymousUser
@@ -9,14 +14,23 @@ from django.contrib.auth.models import Group
 from django.core.exceptions import ValidationError
 from django.template import Context
 from django.template import Template
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.test.utils import override_settings
+from mock import patch
+import openpyxl
 
 from base import fields
+from base.cache import CacheNamespace
+from base.cache import get_shared_cache
+from base.cache import invalidate_namespaces
 from base.models import Major, Officer, OfficerPosition, Term, University
-from settings.dev import DATABASES as DEV_DB
-from settings.production import DATABASES as PROD_DB
-from settings.staging import DATABASES as STAGING_DB
+from base.roster import TermRoster
+from base.templatetags import settings_values
+from base.views import OfficerContactExportView
+from candidates.models import Candidate
+from user_profiles.models import StudentOrgUserProfile
 
 
 class MajorTest(TestCase):
@@ -264,11 +278,11 @@ class TermTest(TestCase):
 
     def test_string(self):
         term = Term(term=Term.FALL, year=2012, current=False)
-        self.assertEqual(term, 'Fall 2012')
+        self.assertEqual(str(term), 'Fall 2012')
 
     def test_string_current(self):
         term = Term(term=Term.FALL, year=2012, current=True)
-        self.assertEqual(term, 'Fall 2012 (Current)')
+        self.assertEqual(str(term), 'Fall 2012 (Current)')
 
     def test_verbose_name(self):
         term = Term(term=Term.FALL, year=2012, current=False)
@@ -344,6 +358,182 @@ class TermTest(TestCase):
         self.assertEqual(term.natural_key(), (Term.SPRING, 2012))
 
 
+SHARED_LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=SHARED_LOCMEM_CACHES)
+class CacheNamespaceTest(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        self.namespace = CacheNamespace('test')
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_get_or_set(self):
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertEqual(self.namespace.get_or_set('key', self.compute), 1)
+        self.assertEqual(self.namespace.get_or_set('key', self.compute), 1)
+        self.assertEqual(self.namespace.get('key'), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidate(self):
+        other_namespace = CacheNamespace('other')
+        self.namespace.get_or_set('key', self.compute)
+        other_namespace.get_or_set('key', self.compute)
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertEqual(self.namespace.get_or_set('key', self.compute), 3)
+        self.assertEqual(other_namespace.get('key'), 2)
+
+    def test_get_version(self):
+        self.assertIsNone(self.namespace.get_version())
+        value, version = self.namespace.get_or_set_with_version(
+            'key', self.compute)
+        self.assertEqual(value, 1)
+        self.assertEqual(self.namespace.get_version(), version)
+        self.assertEqual(
+            self.namespace.get_or_set_with_version('key', self.compute),
+            (1, version))
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get_version())
+        self.assertNotEqual(
+            self.namespace.get_or_set_with_version('key', self.compute)[1],
+            version)
+
+    def test_invalidate_namespaces(self):
+        other_namespace = CacheNamespace('other')
+        self.namespace.get_or_set('key', self.compute)
+        other_namespace.get_or_set('key', self.compute)
+        invalidate_namespaces([self.namespace, other_namespace])
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertIsNone(other_namespace.get('key'))
+
+
+@override_settings(CACHES=SHARED_LOCMEM_CACHES)
+class CurrentTermCacheTest(TransactionTestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+
+    def test_get_current_term(self):
+        Term(term=Term.FALL, year=2012, current=True).save()
+        with self.assertNumQueries(1):
+            self.assertEqual(Term.objects.get_current_term().year, 2012)
+        with self.assertNumQueries(0):
+            self.assertEqual(Term.objects.get_current_term().year, 2012)
+
+        # Saving a term invalidates the cached current term
+        Term(term=Term.SPRING, year=2013, current=True).save()
+        self.assertEqual(Term.objects.get_current_term().year, 2013)
+        Term.objects.get(year=2013).delete()
+        self.assertIsNone(Term.objects.get_current_term())
+
+
+@override_settings(CACHES=SHARED_LOCMEM_CACHES)
+class TermRosterTest(TransactionTestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        Group.objects.create(name='Current Candidate')
+        Group.objects.create(name='Member')
+        self.term_old = Term(term=Term.FALL, year=2012)
+        self.term_old.save()
+        self.term = Term(term=Term.SPRING, year=2013, current=True)
+        self.term.save()
+        self.officer = get_user_model().objects.create_user(
+            'officer', 'officer@tbp.berkeley.edu', 'testpw')
+        self.advisor = get_user_model().objects.create_user(
+            'advisor', 'advisor@tbp.berkeley.edu', 'testpw')
+        self.candidate = get_user_model().objects.create_user(
+            'candidate', 'candidate@tbp.berkeley.edu', 'testpw')
+        position = OfficerPosition(
+            short_name='it', long_name='Information Technology (test)',
+            rank=2, mailing_list='IT')
+        position.save()
+        advisor_position = OfficerPosition(
+            short_name='advisor', long_name='Advisor (test)', rank=3,
+            mailing_list='advisors', auxiliary=True)
+        advisor_position.save()
+        Officer(user=self.officer, position=position, term=self.term).save()
+        Officer(user=self.advisor, position=advisor_position,
+                term=self.term).save()
+        Candidate(user=self.candidate, term=self.term_old,
+                  initiated=True).save()
+
+    def test_for_term(self):
+        with self.assertNumQueries(3):
+            roster = TermRoster.for_term(self.term)
+        with self.assertNumQueries(0):
+            self.assertEqual(TermRoster.for_term(self.term.pk).term_id,
+                             self.term.pk)
+
+        self.assertTrue(roster.is_officer(self.officer.pk))
+        self.assertTrue(roster.is_officer(self.advisor.pk))
+        self.assertFalse(roster.is_officer(self.advisor.pk, exclude_aux=True))
+        self.assertEqual(roster.get_officer_ids(),
+                         set([self.officer.pk, self.advisor.pk]))
+        self.assertFalse(roster.is_candidate(self.candidate.pk))
+        self.assertTrue(roster.is_member(self.candidate.pk))
+        self.assertEqual(roster.get_position(self.officer.pk), 'officer')
+        self.assertEqual(roster.get_position(self.advisor.pk), 'member')
+
+        old_roster = TermRoster.for_term(self.term_old)
+        self.assertFalse(old_roster.is_officer(self.officer.pk))
+        self.assertTrue(old_roster.is_candidate(self.candidate.pk))
+        self.assertEqual(old_roster.get_position(self.candidate.pk),
+                         'candidate')
+
+        self.assertEqual(TermRoster.for_term(None).get_officer_ids(), set())
+
+    def test_invalidation(self):
+        self.assertFalse(TermRoster.for_term(self.term).is_candidate(
+            self.advisor.pk))
+        Candidate(user=self.advisor, term=self.term).save()
+        self.assertTrue(TermRoster.for_term(self.term).is_candidate(
+            self.advisor.pk))
+
+        Officer.objects.filter(user=self.officer).delete()
+        self.assertFalse(TermRoster.for_term(self.term).is_officer(
+            self.officer.pk))
+
+        # Demoting an initiated member to a candidate
+        Candidate.objects.filter(user=self.candidate).get().delete()
+        profile = self.candidate.studentorguserprofile
+        profile.initiation_term = None
+        profile.save()
+        self.assertFalse(TermRoster.for_term(self.term).is_member(
+            self.candidate.pk))
+
+    def test_initiation_invalidation(self):
+        """Changing an initiation term only rebuilds the rosters of the terms
+        whose members change.
+        """
+        term_new = Term(term=Term.FALL, year=2013)
+        term_new.save()
+        for term in (self.term_old, self.term, term_new):
+            self.assertTrue(TermRoster.for_term(term).is_member(
+                self.candidate.pk))
+
+        profile = StudentOrgUserProfile.objects.get(user=self.candidate)
+        profile.initiation_term = self.term
+        profile.save()
+        self.assertFalse(TermRoster.for_term(self.term_old).is_member(
+            self.candidate.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(TermRoster.for_term(self.term).is_member(
+                self.candidate.pk))
+            self.assertTrue(TermRoster.for_term(term_new).is_member(
+                self.candidate.pk))
+
+
 class UniversityTest(TestCase):
     fixtures = ['university.yaml']
 
@@ -426,6 +616,73 @@ class OfficerTest(TestCase):
         self.assertEquals(officers[0].user, self.user)
 
 
+@override_settings(HOSTNAME='tbp.berkeley.edu')
+class OfficerContactExportViewTest(TestCase):
+    fixtures = ['officer_position.yaml']
+
+    def setUp(self):
+        self.term = Term.objects.create(term=Term.SPRING, year=2012,
+                                        current=True)
+        past_term = Term.objects.create(term=Term.FALL, year=2011)
+        self.users = [
+            get_user_model().objects.create_user(
+                username=username, email='{}@example.com'.format(username),
+                password='officerpw', first_name='Off', last_name=last_name)
+            for username, last_name in (('icer', 'Icer'), ('ense', 'Ense'))]
+        for user, position, term in (
+                (self.users[0], 'it', self.term),
+                (self.users[1], 'president', self.term),
+                (self.users[0], 'vp', self.term),
+                (self.users[1], 'vp', past_term)):
+            Officer.objects.create(
+                user=user, term=term,
+                position=OfficerPosition.objects.get(short_name=position))
+        self.superuser = get_user_model().objects.create_superuser(
+            'superuser', 'superuser@example.com', 'password')
+
+    def get_export(self, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.superuser
+        return OfficerContactExportView.as_view()(request)
+
+    def assertRows(self, rows):
+        """Assert that the rows have the header and one row for each
+        current officer, with all of their positions.
+        """
+        columns = OfficerContactExportView.COLUMN_NAMES
+        self.assertEqual(rows[0], columns)
+        self.assertEqual(
+            [(row[columns.index('Name')],
+              row[columns.index('E-mail 1 - Value')],
+              row[columns.index('E-mail 2 - Value')],
+              row[columns.index('Organization 1 - Title')])
+             for row in rows[1:]],
+            [('Off Ense', 'ense@tbp.berkeley.edu', 'ense@example.com',
+              'President'),
+             ('Off Icer', 'icer@tbp.berkeley.edu', 'icer@example.com',
+              'Vice President/Information Technology')])
+
+    def test_csv(self):
+        response = self.get_export()
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="officers.csv"')
+        with self.assertNumQueries(4):
+            # The current term and the officers, then whether each officer
+            # is an officer, for their preferred email address
+            content = b''.join(response.streaming_content).decode()
+        self.assertRows(list(csv.reader(io.StringIO(content))))
+
+    def test_xlsx(self):
+        with self.assertNumQueries(4):
+            response = self.get_export(format='xlsx')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="officers.xlsx"')
+        worksheet = openpyxl.load_workbook(
+            io.BytesIO(response.content)).active
+        self.assertRows([[cell or '' for cell in row]
+                         for row in worksheet.iter_rows(values_only=True)])
+
+
 class OfficerGroupsTest(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(
@@ -494,46 +751,46 @@ class OfficerGroupsTest(TestCase):
         # non-exec) officer position. We should expect the corresponding groups
         # to be Officer and the group specific to the position:
         groups = [self.officer_group, self.pos_reg_group]
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_regular.get_corresponding_groups())
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_regular.get_corresponding_groups(self.term_old))
         # For the current term:
         groups.extend([self.officer_group_curr, self.pos_reg_group_curr])
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_regular.get_corresponding_groups(term=self.term))
 
         # For the executive position, the corresponding groups will also
         # include the "Executive" groups:
         groups = [self.officer_group, self.exec_group, self.pos_exec_group]
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_exec.get_corresponding_groups())
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_exec.get_corresponding_groups(self.term_old))
         # For the current term:
         groups.extend([self.officer_group_curr, self.exec_group_curr,
                        self.pos_exec_group_curr])
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_exec.get_corresponding_groups(term=self.term))
 
         # For the auxiliary position, there should be no "Officer" group or
         # "Executive" group (since the position is non-exec):
         groups = [self.pos_aux_group]
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_auxiliary.get_corresponding_groups())
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_auxiliary.get_corresponding_groups(self.term_old))
         # For the current term:
         groups.append(self.pos_aux_group_curr)
-        self.assertItemsEqual(
+        self.assertCountEqual(
             groups,
             self.position_auxiliary.get_corresponding_groups(term=self.term))
 
@@ -581,7 +838,7 @@ class OfficerGroupsTest(TestCase):
         # should return to the same positions as from before the exec position
         # added any:
         officer_exec._remove_user_from_officer_groups()
-        self.assertItemsEqual(groups, list(self.user.groups.all()))
+        self.assertCountEqual(groups, list(self.user.groups.all()))
 
     def test_officer_post_save(self):
         """Test that a user is added to the appropriate groups on post-save."""
@@ -596,7 +853,7 @@ class OfficerGroupsTest(TestCase):
         self.assertFalse(self.user.groups.exists())
         officer_reg.save()
         # Check that all of the expected groups were added for this user:
-        self.assertItemsEqual(expected_groups, self.user.groups.all())
+        self.assertCountEqual(expected_groups, self.user.groups.all())
 
         # Add another position, and check that the correct groups are added:
         officer_exec = Officer(user=self.user, position=self.position_exec,
@@ -604,7 +861,7 @@ class OfficerGroupsTest(TestCase):
         officer_exec.save()
         expected_groups.update(self.position_exec.get_corresponding_groups(
             term=self.term_old))
-        self.assertItemsEqual(expected_groups, self.user.groups.all())
+        self.assertCountEqual(expected_groups, self.user.groups.all())
 
     def test_officer_post_delete(self):
         """Test that a user is removed from the appropriate groups on
@@ -630,7 +887,7 @@ class OfficerGroupsTest(TestCase):
         # Now delete exec officer, and the user's groups should return to the
         # same positions as from before the exec position added any:
         officer_exec.delete()
-        self.assertItemsEqual(groups, list(self.user.groups.all()))
+        self.assertCountEqual(groups, list(self.user.groups.all()))
 
         # And delete the regular officer, and the user should be part of no
         # more groups:
@@ -652,12 +909,12 @@ class OfficerGroupsTest(TestCase):
             term=self.term))
         groups = list(self.user.groups.all())
         self.assertTrue(len(groups) > 0)
-        self.assertItemsEqual(groups, expected_groups)
+        self.assertCountEqual(groups, expected_groups)
 
         # Make sure saving the current term is a no-op:
         self.term.save()
         groups = list(self.user.groups.all())
-        self.assertItemsEqual(groups, expected_groups)
+        self.assertCountEqual(groups, expected_groups)
 
         # Add a regular officer position for this user in a new term (not
         # "current"), and the user's group count should increase:
@@ -669,7 +926,7 @@ class OfficerGroupsTest(TestCase):
         expected_groups.update(self.position_regular.get_corresponding_groups(
             term=term_new))
         groups = list(self.user.groups.all())
-        self.assertItemsEqual(groups, expected_groups)
+        self.assertCountEqual(groups, expected_groups)
 
         # Now change the "new" term to be the current term:
         term_new.current = True
@@ -686,7 +943,7 @@ class OfficerGroupsTest(TestCase):
             term=self.term))
         expected_groups.update(self.position_regular.get_corresponding_groups(
             term=term_new))
-        self.assertItemsEqual(groups, expected_groups)
+        self.assertCountEqual(groups, expected_groups)
 
         # Double-check some of the "Current" groups:
         self.assertNotIn(self.exec_group_curr, groups)
@@ -695,30 +952,46 @@ class OfficerGroupsTest(TestCase):
         self.assertIn(self.pos_reg_group_curr, groups)
 
 
+def import_fresh_settings():
+    """Import the settings package again, for the instance environment in the
+    TBPWEB_MODE environment variable, without replacing the imported one.
+    """
+    imported = sys.modules.pop('settings')
+    try:
+        return importlib.import_module('settings')
+    finally:
+        sys.modules['settings'] = imported
+
+
 class SettingsTest(TestCase):
-    def setUp(self):
-        self.env = EnvironmentVarGuard()
+    # The settings of each environment are only imported by its own test,
+    # since they may need files (like tbpweb_keys) that only exist there, and
+    # the other tests in this module shouldn't depend on them
 
     def test_unset(self):
-        with self.env:
-            self.env.set('TBPWEB_MODE', 'dev')
-            settings = import_fresh_module('settings')
+        from settings.dev import DATABASES as DEV_DB
+        with patch.dict(os.environ, {'TBPWEB_MODE': 'dev'}):
+            settings = import_fresh_settings()
 
             self.assertTrue(settings.DEBUG)
             self.assertEqual(settings.DATABASES, DEV_DB)
 
+    @skipUnless(importlib.util.find_spec('settings.tbpweb_keys'),
+                'settings/tbpweb_keys.py only exists on the production server')
     def test_production(self):
-        with self.env:
-            self.env.set('TBPWEB_MODE', 'production')
-            settings = import_fresh_module('settings')
+        from settings.production import DATABASES as PROD_DB
+        with patch.dict(os.environ, {'TBPWEB_MODE': 'production'}):
+            settings = import_fresh_settings()
 
             self.assertFalse(settings.DEBUG)
             self.assertEqual(settings.DATABASES, PROD_DB)
 
+    @skipUnless(importlib.util.find_spec('settings.staging'),
+                'settings/staging.py only exists on the staging server')
     def test_staging(self):
-        with self.env:
-            self.env.set('TBPWEB_MODE', 'staging')
-            settings = import_fresh_module('settings')
+        from settings.staging import DATABASES as STAGING_DB
+        with patch.dict(os.environ, {'TBPWEB_MODE': 'staging'}):
+            settings = import_fresh_settings()
 
             self.assertFalse(settings.DEBUG)
             self.assertEqual(settings.DATABASES, STAGING_DB)
@@ -769,6 +1042,12 @@ class SettingsTemplateTagsTest(TestCase):
         self.base_string = 'Hello world '
         self.context = Context({'base_string': self.base_string})
         self.test_setting = 'testing'
+        # The tag reads the settings once, when its module is imported, so
+        # override_settings can't add the test setting
+        patcher = patch.dict(settings_values.safe_settings,
+                             {'TEST_SETTING': self.test_setting})
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_settings(self):
         """Verify that the settings tag works for valid settings variables."""
@@ -1,10 +1,9 @@
 import collections
-import csv
+import itertools
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse
 from django.shortcuts import render
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView
@@ -15,6 +14,8 @@ from .models import Officer, Term
 from events.models import Event
 from newsreel.models import News
 from user_profiles.models import UserProfile
+from utils.export import EXPORT_CHUNK_SIZE
+from utils.export import TableExportMixin
 
 
 class HomePageView(TemplateView):
@@ -118,7 +119,8 @@ class OfficersListView(TermParameterMixin, ListView):
             'user__userprofile', 'user__studentorguserprofile', 'position')
 
 
-class OfficerContactExportView(View):
+class OfficerContactExportView(TableExportMixin, View):
+    filename = 'officers'
 
     # Gmail expects these columns to be present in the CSV
     COLUMN_NAMES = ['Name',
@@ -188,31 +190,32 @@ class OfficerContactExportView(View):
 
         return row_dict.values()
 
-    def get(self, request, *args, **kwargs):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="officers.csv"'
+    def get_header(self):
+        return OfficerContactExportView.COLUMN_NAMES
+
+    def get_rows(self):
         current_term = Term.objects.get_current_term()
+        # A user can hold several positions, which are listed in one row, so
+        # the officers are ordered by user and each user's officers are
+        # grouped as they are streamed
         officers = Officer.objects.filter(term=current_term).order_by(
-            'position', '-is_chair')
-        officers_by_profile_id = collections.OrderedDict()
-        for officer in officers:
-            profile_id = officer.user.userprofile.id
-            if profile_id not in officers_by_profile_id:
-                officers_by_profile_id[profile_id] = [officer]
-            else:
-                officers_by_profile_id[profile_id].append(officer)
-
-        writer = csv.writer(response)
-        writer.writerow(OfficerContactExportView.COLUMN_NAMES)
-        for profile_id, profile_officers in officers_by_profile_id.items():
-            profile = UserProfile.objects.get(id=profile_id)
-            full_gender = dict(UserProfile.GENDER_CHOICES)[profile.gender]
+            'user__last_name', 'user__first_name', 'user', 'position',
+            '-is_chair').select_related(
+            'position', 'user__userprofile', 'user__studentorguserprofile')
+
+        for _, profile_officers in itertools.groupby(
+                officers.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+                key=lambda officer: officer.user_id):
+            profile_officers = list(profile_officers)
+            profile = profile_officers[0].user.userprofile
+            full_gender = dict(UserProfile.GENDER_CHOICES).get(
+                profile.gender, '')
             local_address_summary = profile.local_address1
             position_names = [off.position_name() for off in profile_officers]
             position_summary = '/'.join(position_names)
             if profile.local_address2:
                 local_address_summary += ', {}'.format(profile.local_address2)
-            row = OfficerContactExportView.get_row(
+            yield OfficerContactExportView.get_row(
                 common_name=profile.get_common_name(),
                 first_name=profile.user.first_name,
                 last_name=profile.user.last_name,
@@ -226,6 +229,3 @@ class OfficerContactExportView(View):
                 local_state=profile.local_state,
                 local_zip=profile.local_zip,
                 officer_position=position_summary)
-            writer.writerow(row)
-
-        return response
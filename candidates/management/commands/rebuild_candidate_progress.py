@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from base.models import Term
+from candidates.models import Candidate
+from candidates.models import CandidateProgressSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored progress of candidates from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-t', '--term',
+            help='Only rebuild progress for candidates in this term, given '
+                 'by its URL name (e.g. "fa2012")')
+
+    def handle(self, *args, **options):
+        candidates = Candidate.objects.all()
+        if options['term']:
+            term = Term.objects.get_by_url_name(options['term'])
+            if term is None:
+                raise CommandError(
+                    'Unknown term "{}"'.format(options['term']))
+            candidates = candidates.filter(term=term)
+
+        CandidateProgressSnapshot.objects.refresh(candidates)
+        if int(options['verbosity']) > 0:
+            self.stdout.write('Rebuilt progress for {} candidates'.format(
+                candidates.count()))
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.8 on 2026-10-18 02:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateProgressSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed', models.IntegerField(default=0)),
+                ('required', models.IntegerField(default=0)),
+                ('signed_up', models.IntegerField(default=0)),
+                ('remaining', models.IntegerField(default=0)),
+                ('warning', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='candidates.Candidate')),
+                ('requirement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='candidates.CandidateRequirement')),
+            ],
+            options={
+                'ordering': ('candidate', 'id'),
+                'unique_together': {('candidate', 'requirement')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0002_candidateprogresssnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='progress_refreshed',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the progress snapshots of the candidate were last computed, or null if they never were (candidates in terms without requirements have no snapshots).', null=True),
+        ),
+    ]
@@ -4,12 +4,18 @@ import os
 from django.conf import settings
 from django.contrib.auth.models import Group
 from django.db import models
+from django.db import transaction
+from django.db.models import Count
 from django.db.models import Sum
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 from base.models import Term
+from base.roster import invalidate_term_rosters
 from events.models import Event, EventAttendance, EventSignUp, EventType
+from events.signals import attendance_recorded
 from exams.models import Exam
 from syllabi.models import Syllabus
 from resumes.models import Resume
@@ -46,6 +52,11 @@ class Candidate(models.Model):
 
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    progress_refreshed = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text=('When the progress snapshots of the candidate were last '
+                   'computed, or null if they never were (candidates in '
+                   'terms without requirements have no snapshots).'))
 
     class Meta(object):
         ordering = ('-term', 'user__userprofile')
@@ -65,21 +76,13 @@ class Candidate(models.Model):
 
         Useful for summary info, progress bars, and other visualizations.
         """
-        if requirement_type is None:
-            requirements = CandidateRequirement.objects.filter(term=self.term)
-        else:
-            requirements = CandidateRequirement.objects.filter(
-                term=self.term, requirement_type=requirement_type)
-
         # Select-related to improve performance, fetching data for requirements
         # from multiple tables
-        requirements.select_related(
-            'eventcandidaterequirement',
-            'eventcandidaterequirement__event_type',
-            'challengecandidaterequirement',
-            'challengecandidaterequirement__challenge_type',
-            'examfilecandidaterequirement',
-            'syllabuscandidaterequirement')
+        requirements = CandidateRequirement.objects.select_subclasses().filter(
+            term=self.term)
+        if requirement_type is not None:
+            requirements = requirements.filter(
+                requirement_type=requirement_type)
 
         # TODO(sjdemartini): Figure out a way to optimize fetching the progress
         # for event requirements and fetching CandidateRequirementProgress
@@ -91,180 +94,29 @@ class Candidate(models.Model):
         return {'completed': completed, 'required': required}
 
     @staticmethod
-    # pylint: disable=R0912
-    # pylint: disable=R0914
     def get_progress_by_candidate(candidates, term):
         """
         Get the progress of a set of candidates. Returns a dictionary where
         the keys are candidates and the values are lists of dictionaries, one
         for each requirement. The dictionaries have the following keys:
 
+            requirement: The CandidateRequirement object
             required: Number of items needed to satisfy the requirement
             completed: Number of items completed
             signed_up (event requirements only): Number of event sign ups that
                 satisfy the requirement
+            remaining (event requirements only): Number of upcoming events
+                that would satisfy the requirement
             warning (event requirements only): True if there are not enough
                 events remaining for the requirement to be satisfied
+
+        The number of queries is constant, regardless of the number of
+        candidates and requirements (see CandidateProgressEngine).
         """
-        candidate_users = candidates.values_list('user', flat=True)
-        candidate_ids_by_user_id = dict(candidates.values_list('user', 'id'))
-        candidates_by_id = Candidate.objects.in_bulk(candidates.values_list(
-            'id', flat=True))
-
-        upcoming_events = Event.objects.get_upcoming().filter(
-            term=term).select_related('event_type')
-        requirements = CandidateRequirement.objects.filter(term=term)
-        attendances = EventAttendance.objects.select_related(
-            'event__event_type', 'user').filter(
-            event__term=term, user__in=candidate_users)
-        signups = EventSignUp.objects.select_related(
-            'event__event_type', 'user').filter(
-            event__term=term, user__in=candidate_users, unsignup=False).exclude(
-            event__in=attendances.values_list('event', flat=True))
-
-        attendances_by_candidate = {candidate: [] for candidate in candidates}
-        signup_counters_by_candidate = {candidate: collections.Counter()
-                                        for candidate in candidates}
-        for attendance in attendances:
-            candidate_id = candidate_ids_by_user_id[attendance.user.id]
-            candidate = candidates_by_id[candidate_id]
-            attendances_by_candidate[candidate].append(attendance)
-        for signup in signups:
-            candidate_id = candidate_ids_by_user_id[signup.user.id]
-            candidate = candidates_by_id[candidate_id]
-            signup_counter = signup_counters_by_candidate[candidate]
-            signup_counter[signup.event.event_type.name] += 1
-
-        # Get CandidateRequirementProgress objects for each candidate
-        crp_objects = CandidateRequirementProgress.objects.filter(
-            candidate__term=term, candidate__in=candidates).select_related(
-            'candidate')
-
-        elective_req = None
-        elective_event_types = EventType.objects.none()
-
-        # Get Elective requirement or otherwise have it as None
-        try:
-            elective_req = requirements.get(
-                eventcandidaterequirement__event_type__name='Elective')
-        except CandidateRequirement.DoesNotExist:
-            elective_req = None
-
-        if elective_req:
-            required_event_types = requirements.filter(
-                requirement_type=CandidateRequirement.EVENT).values_list(
-                'eventcandidaterequirement__event_type', flat=True)
-            elective_event_types = EventType.objects.filter(
-                eligible_elective=True).exclude(id__in=required_event_types)
-            requirements = requirements.exclude(id=elective_req.id)
-
-        progress_by_candidate = {candidate: [] for candidate in candidates}
-
-        # Dictionary of elective progresses
-        elective_progress_by_candidate = {}
-
-        # Set up Elective requirement (via elective_req) progress,
-        #   if Elective requirement is set
-        if elective_req:
-            # Calculate elective requirements satisfied by elective events (doesn't
-            # include extra required events that count for electives).
-            remaining_elective_events = len(upcoming_events.filter(
-                event_type__in=elective_event_types))
-            for candidate in candidates:
-                elective_progress = {
-                    'requirement': elective_req,
-                    'completed': 0,
-                    'signed_up': 0,
-                    'warning': False,
-                    'remaining': remaining_elective_events,
-                    'required': elective_req.credits_needed if elective_req else 0
-                }
-                elective_progress_by_candidate[candidate] = elective_progress
-                for attendance in attendances_by_candidate[candidate]:
-                    if attendance.event.event_type in elective_event_types:
-                        elective_progress['completed'] += 1
-                for event_type in elective_event_types:
-                    signup_counter = signup_counters_by_candidate[candidate]
-                    elective_progress['signed_up'] += signup_counter[
-                        event_type.name]
-
-            # Handle per-candidate elective requirements
-            elective_crp_objects = crp_objects.filter(requirement=elective_req)
-            for crp in elective_crp_objects:
-                elective_progress = elective_progress_by_candidate[crp.candidate]
-                elective_progress['completed'] += crp.manually_recorded_credits
-                elective_progress['required'] = crp.alternate_credits_needed
-
-        remaining = collections.Counter()
-        for event in upcoming_events:
-            remaining[event.event_type.name] += 1
-
-        # Get all the information we need from the database
-        for req in requirements:
-            # Get the "completed" and "required" fields for each requirement
-            req_progress_by_candidate = req.get_progress_by_candidate(
-                candidates)
-
-            if req.requirement_type == CandidateRequirement.EVENT:
-                # Calculate event requirement statistics (electives, signups,
-                # warnings, etc.) for each candidate
-                for candidate, req_progress \
-                        in req_progress_by_candidate.items():
-                    req_progress['requirement'] = req
-                    completed = 0 # If not filled later, means candidate didn't even complete anything
-                    num_signup = 0 # If not filled later, means no one signed up
-                    required = req_progress['required']
-                    req_progress['warning'] = False
-                    if required > 0:
-                        completed = req_progress['completed']
-                        total_possible = completed + remaining[req.get_name()]
-                        if total_possible < required:
-                            req_progress['warning'] = True
-                        signup_counter = signup_counters_by_candidate[candidate]
-                        num_signup = signup_counter[req.get_name()]
-                        req_progress['signed_up'] = num_signup
-                        req_progress['remaining'] = remaining[req.get_name()]
-                        progress_by_candidate[candidate].append(req_progress)
-                    event_type = req.eventcandidaterequirement.event_type
-                    
-                    # Elective progress on eligible event types are only counted
-                    #   when an Elective requirement is set
-                    if elective_req and event_type.eligible_elective:
-                        elective_progress = elective_progress_by_candidate[
-                            candidate]
-                        elective_progress['remaining'] += remaining[
-                            req.get_name()]
-
-                        # Only count completed and signed-up non-elective events
-                        # if they exceed the requirement.
-                        extra_completed = max(0, completed - required)
-                        not_completed = max(0, required - completed)
-                        extra_signups = max(0, num_signup - not_completed)
-                        elective_progress['completed'] += extra_completed
-                        elective_progress['signed_up'] += extra_signups
-
-            else:  # req is not an event requirement
-                for candidate, req_progress \
-                        in req_progress_by_candidate.items():
-                    req_progress['requirement'] = req
-                    progress_by_candidate[candidate].append(req_progress)
-
-        # Final processing of Elective Events (if Elective requirement is set)
-        if elective_req:
-            # Trigger warnings for elective events
-            for elective_progress in elective_progress_by_candidate.values():
-                completed = elective_progress['completed']
-                remaining = elective_progress['remaining']
-                required = elective_progress['required']
-                if completed + remaining < required:
-                    elective_progress['warning'] = True
-
-            # Merge elective progresses with the others (only if an Elective Requirement is set)
-            for candidate in candidates:
-                elective_progress = elective_progress_by_candidate[candidate]
-                progress_by_candidate[candidate].append(elective_progress)
-
-        return progress_by_candidate
+        # Avoid circular dependency by importing here:
+        from candidates.progress import CandidateProgressEngine
+        return CandidateProgressEngine(
+            candidates, term).get_progress_by_candidate()
 
     def are_electives_required(self):
         """Return true if elective events are required; false otherwise."""
@@ -330,6 +182,14 @@ def candidate_post_save(sender, instance, created, **kwargs):
         else:
             instance.user.groups.remove(candidate_group)
 
+    transaction.on_commit(invalidate_term_rosters)
+
+
+@receiver(post_delete, sender=Candidate)
+def candidate_post_delete(sender, instance, **kwargs):
+    """Ensure that term rosters are rebuilt without the deleted candidate."""
+    transaction.on_commit(invalidate_term_rosters)
+
 
 class ChallengeTypeManager(models.Manager):
     def get_by_natural_key(self, name):
@@ -386,6 +246,44 @@ class Challenge(models.Model):
         ordering = ('candidate', 'created')
 
 
+# Map of requirement types to the CandidateRequirement subclass for each type,
+# filled in by the register_requirement_type decorator
+REQUIREMENT_TYPES = collections.OrderedDict()
+
+
+def register_requirement_type(requirement_type):
+    """Class decorator that registers a CandidateRequirement subclass as the
+    model for requirements of the given type.
+
+    Registered subclasses implement get_name() and the
+    get_completed_by_candidate() classmethod, and list the foreign keys needed
+    by get_name() in related_fields, so that requirements of every type can
+    be loaded with CandidateRequirement.objects.select_subclasses() and their
+    progress computed without any per-candidate queries.
+    """
+    def register(model):
+        REQUIREMENT_TYPES[requirement_type] = model
+        return model
+    return register
+
+
+class CandidateRequirementQuerySet(models.query.QuerySet):
+    def select_subclasses(self):
+        """Return requirements along with the rows of their registered
+        subclasses, all in a single query.
+        """
+        return self.select_related(
+            *CandidateRequirement.get_subclass_related_fields())
+
+
+class CandidateRequirementManager(models.Manager):
+    def get_queryset(self):
+        return CandidateRequirementQuerySet(self.model, using=self._db)
+
+    def select_subclasses(self):
+        return self.get_queryset().select_subclasses()
+
+
 class CandidateRequirement(models.Model):
     """A base for other requirements."""
     # Requirement Type constants
@@ -405,6 +303,9 @@ class CandidateRequirement(models.Model):
         (MANUAL, 'Other (manually verified)')
     )
 
+    # Foreign keys of the subclass that are needed to display the requirement
+    related_fields = ()
+
     requirement_type = models.CharField(
         max_length=9, choices=REQUIREMENT_TYPE_CHOICES, db_index=True)
     credits_needed = models.IntegerField(
@@ -414,32 +315,63 @@ class CandidateRequirement(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = CandidateRequirementManager()
+
+    @staticmethod
+    def get_subclass_related_fields(prefix=''):
+        """Return the select_related() lookups for loading the registered
+        subclasses (and their related_fields) of requirements reached through
+        the given lookup prefix, such as "requirement__".
+        """
+        lookups = []
+        for model in REQUIREMENT_TYPES.values():
+            subclass = prefix + model._meta.model_name
+            lookups.append(subclass)
+            lookups.extend('{}__{}'.format(subclass, field)
+                           for field in model.related_fields)
+        return lookups
+
+    def get_typed_requirement(self):
+        """Return this requirement as an instance of the subclass registered
+        for its requirement type.
+
+        No query is made if the subclass was loaded with select_subclasses().
+        """
+        model = REQUIREMENT_TYPES.get(self.requirement_type)
+        if model is None:
+            raise NotImplementedError(
+                'Unknown type {}'.format(self.requirement_type))
+        if isinstance(self, model):
+            return self
+        return getattr(self, model._meta.model_name)
+
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Return a Counter mapping (candidate pk, requirement pk) pairs to
+        the number of credits the candidate has completed for the requirement,
+        not including manually recorded credits.
+
+        The requirements are all instances of this subclass, and the credits
+        are counted with a constant number of queries.
+        """
+        raise NotImplementedError(
+            'Unknown type {}'.format(cls._meta.model_name))
+
+    def get_completed(self, candidate):
+        """Return the number of credits completed by candidate, not including
+        manually recorded credits.
+        """
+        requirement = self.get_typed_requirement()
+        return requirement.get_completed_by_candidate(
+            [requirement], [candidate])[(candidate.pk, self.pk)]
+
     def get_progress(self, candidate):
         """Return a dictionary with keys "completed" and "required", which
         map to the number of completed requirements and the number that were
         required, respectively, for the given candidate.
         """
         required = self.credits_needed
-
-        if self.requirement_type == CandidateRequirement.EVENT:
-            completed = self.eventcandidaterequirement.get_completed(candidate)
-        elif self.requirement_type == CandidateRequirement.CHALLENGE:
-            completed = self.challengecandidaterequirement.get_completed(
-                candidate)
-        elif self.requirement_type == CandidateRequirement.EXAM_FILE:
-            completed = self.examfilecandidaterequirement.get_completed(
-                candidate)
-        elif self.requirement_type == CandidateRequirement.SYLLABUS:
-            completed = self.syllabuscandidaterequirement.get_completed(
-                candidate)
-        elif self.requirement_type == CandidateRequirement.RESUME:
-            completed = self.resumecandidaterequirement.get_completed(candidate)
-        elif self.requirement_type == CandidateRequirement.MANUAL:
-            # Actual credits earned is read from CandidateProgress below
-            completed = 0
-        else:
-            raise NotImplementedError(
-                'Unknown type {}'.format(self.requirement_type))
+        completed = self.get_completed(candidate)
 
         # Check per-candidate overrides and exemptions
         try:
@@ -452,60 +384,13 @@ class CandidateRequirement(models.Model):
 
         return {'completed': completed, 'required': required}
 
-    def get_progress_by_candidate(self, candidates):
-        required = {candidate: self.credits_needed for candidate in candidates}
-
-        if self.requirement_type == CandidateRequirement.EVENT:
-            completed = self.eventcandidaterequirement \
-                .get_completed_by_candidate(candidates)
-        elif self.requirement_type == CandidateRequirement.CHALLENGE:
-            completed = self.challengecandidaterequirement \
-                .get_completed_by_candidate(candidates)
-        elif self.requirement_type == CandidateRequirement.EXAM_FILE:
-            completed = self.examfilecandidaterequirement \
-                .get_completed_by_candidate(candidates)
-        elif self.requirement_type == CandidateRequirement.RESUME:
-            completed = self.resumecandidaterequirement \
-                .get_completed_by_candidate(candidates)
-        elif self.requirement_type == CandidateRequirement.SYLLABUS:
-            completed = self.syllabuscandidaterequirement \
-                .get_completed_by_candidate(candidates)
-        elif self.requirement_type == CandidateRequirement.MANUAL:
-            # Actual credits earned is read from CandidateProgress below
-            completed = {candidate: 0 for candidate in candidates}
-        else:
-            raise NotImplementedError(
-                'Unknown type {}'.format(self.requirement_type))
-
-        # Check per-candidate overrides and exemptions
-        crp_objects = CandidateRequirementProgress.objects.filter(
-            candidate__in=candidates, requirement=self)
-        for crp in crp_objects:
-            completed[crp.candidate] += crp.manually_recorded_credits
-            required[crp.candidate] = crp.alternate_credits_needed
-
-        return {candidate: {'completed': completed[candidate],
-                            'required': required[candidate]}
-                for candidate in candidates}
-
     def get_name(self):
         """Return a name for the requirement based on the requirement type."""
-        if self.requirement_type == CandidateRequirement.EVENT:
-            return self.eventcandidaterequirement.event_type.name
-        elif self.requirement_type == CandidateRequirement.CHALLENGE:
-            return '{} Challenges'.format(
-                self.challengecandidaterequirement.challenge_type.name)
-        elif self.requirement_type == CandidateRequirement.EXAM_FILE:
-            return 'Exam Files'
-        elif self.requirement_type == CandidateRequirement.SYLLABUS:
-            return 'Syllabus'
-        elif self.requirement_type == CandidateRequirement.RESUME:
-            return 'Resume'
-        elif self.requirement_type == CandidateRequirement.MANUAL:
-            return self.manualcandidaterequirement.name
-        else:
+        requirement = self.get_typed_requirement()
+        if requirement is self:
             raise NotImplementedError(
                 'Unknown type {}'.format(self.requirement_type))
+        return requirement.get_name()
 
     def __str__(self):
         return '{name}, {credits} required ({term})'.format(
@@ -516,85 +401,104 @@ class CandidateRequirement(models.Model):
         ordering = ('-term', 'requirement_type')
 
 
+def count_course_files_by_candidate(course_files, requirements, candidates):
+    """Return a Counter mapping (candidate pk, requirement pk) pairs to the
+    number of the given course files submitted by the candidate, for
+    requirements where every course file is worth one credit.
+    """
+    num_submitted = dict(course_files.filter(
+        submitter__in=[candidate.user_id for candidate in candidates]
+    ).order_by().values_list('submitter').annotate(num=Count('id')))
+    completed = collections.Counter()
+    for candidate in candidates:
+        for requirement in requirements:
+            completed[(candidate.pk, requirement.pk)] = num_submitted.get(
+                candidate.user_id, 0)
+    return completed
+
+
+@register_requirement_type(CandidateRequirement.EVENT)
 class EventCandidateRequirement(CandidateRequirement):
     """Requirement for attending events of a certain type."""
     event_type = models.ForeignKey(EventType, on_delete=models.CASCADE)
 
+    related_fields = ('event_type',)
+
     def save(self, *args, **kwargs):
         """Override save handler to ensure that requirement_type is correct."""
         self.requirement_type = CandidateRequirement.EVENT
         super(EventCandidateRequirement, self).save(*args, **kwargs)
 
-    def get_completed(self, candidate):
-        """Return the number of credits completed by candidate."""
-        events_attended = Event.objects.filter(
-            eventattendance__user=candidate.user,
-            term=candidate.term,
-            event_type=self.event_type)
-        return events_attended.aggregate(
-            total=Sum('requirements_credit'))['total'] or 0
-
-    def get_completed_by_candidate(self, candidates):
-        """
-        Return a dictionary where the keys are candidates and the values are
-        the number of credits completed by each candidate.
+    def get_name(self):
+        return self.event_type.name
+
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Count the requirements credit of events of each requirement's type
+        attended by each candidate during the candidate's term.
         """
-        candidates_by_id = Candidate.objects.in_bulk(candidates.values_list(
-            'id', flat=True))
-        attendances = EventAttendance.objects.filter(
-            user__candidate__in=candidates, event__term=self.term,
-            event__event_type=self.event_type)
-        credits_by_candidate = attendances.values_list(
-            'user__candidate', 'event__requirements_credit')
-
-        completed_by_candidate = {candidate: 0 for candidate in candidates}
-        for candidate_id, credit in credits_by_candidate:
-            candidate = candidates_by_id.get(candidate_id)
-            # Some users are candidates in multiple terms, so exclude the ones
-            # that aren't in this term.
-            if candidate:
-                completed_by_candidate[candidate] += credit
-
-        return completed_by_candidate
+        credits = EventAttendance.objects.filter(
+            user__in=[candidate.user_id for candidate in candidates],
+            event__term__in=set(candidate.term_id for candidate in candidates),
+            event__event_type__in=set(
+                requirement.event_type_id for requirement in requirements)
+        ).order_by().values_list(
+            'user', 'event__term', 'event__event_type').annotate(
+            credits=Sum('event__requirements_credit'))
+        credits = {(user_id, term_id, event_type_id): total or 0
+                   for user_id, term_id, event_type_id, total in credits}
+        completed = collections.Counter()
+        for candidate in candidates:
+            for requirement in requirements:
+                completed[(candidate.pk, requirement.pk)] = credits.get(
+                    (candidate.user_id, candidate.term_id,
+                     requirement.event_type_id), 0)
+        return completed
 
     class Meta(object):
         ordering = ('-term', 'requirement_type', 'event_type')
 
 
+@register_requirement_type(CandidateRequirement.CHALLENGE)
 class ChallengeCandidateRequirement(CandidateRequirement):
     """Requirement for completing challenges issued by officers."""
     challenge_type = models.ForeignKey(ChallengeType, on_delete=models.CASCADE)
 
+    related_fields = ('challenge_type',)
+
     def save(self, *args, **kwargs):
         """Override save handler to ensure that requirement_type is correct."""
         self.requirement_type = CandidateRequirement.CHALLENGE
         super(ChallengeCandidateRequirement, self).save(*args, **kwargs)
 
-    def get_completed(self, candidate):
-        """Return the number of credits completed by candidate."""
-        return Challenge.objects.filter(
-            candidate=candidate,
-            challenge_type=self.challenge_type,
-            verified=True).count()
-
-    def get_completed_by_candidate(self, candidates):
-        """
-        Return a dictionary of the number of credits completed by each
-        candidate.
-        """
-        challenges = Challenge.objects.filter(
-            candidate__in=candidates,
-            challenge_type=self.challenge_type,
-            verified=True).select_related('candidate')
-        completed_by_candidate = {candidate: 0 for candidate in candidates}
-        for challenge in challenges:
-            completed_by_candidate[challenge.candidate] += 1
-        return completed_by_candidate
+    def get_name(self):
+        return '{} Challenges'.format(self.challenge_type.name)
+
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Count the verified challenges of each requirement's type."""
+        challenges = dict(((candidate_id, challenge_type_id), num)
+                          for candidate_id, challenge_type_id, num
+                          in Challenge.objects.filter(
+                              candidate__in=candidates,
+                              challenge_type__in=set(
+                                  requirement.challenge_type_id
+                                  for requirement in requirements),
+                              verified=True).order_by().values_list(
+                              'candidate', 'challenge_type').annotate(
+                              num=Count('id')))
+        completed = collections.Counter()
+        for candidate in candidates:
+            for requirement in requirements:
+                completed[(candidate.pk, requirement.pk)] = challenges.get(
+                    (candidate.pk, requirement.challenge_type_id), 0)
+        return completed
 
     class Meta(object):
         ordering = ('-term', 'requirement_type', 'challenge_type')
 
 
+@register_requirement_type(CandidateRequirement.EXAM_FILE)
 class ExamFileCandidateRequirement(CandidateRequirement):
     """Requirement for uploading exam files to the site."""
     def save(self, *args, **kwargs):
@@ -602,27 +506,17 @@ class ExamFileCandidateRequirement(CandidateRequirement):
         self.requirement_type = CandidateRequirement.EXAM_FILE
         super(ExamFileCandidateRequirement, self).save(*args, **kwargs)
 
-    def get_completed(self, candidate):
-        """Returns the number of credits completed by candidate"""
-        return Exam.objects.get_approved().filter(
-            submitter=candidate.user).count()
-
-    def get_completed_by_candidate(self, candidates):
-        candidates_by_id = Candidate.objects.in_bulk(candidates.values_list(
-            'id', flat=True))
-        exams = Exam.objects.get_approved().filter(
-            submitter__candidate__in=candidates)
-        exam_candidates = exams.values_list(
-            'submitter__candidate', flat=True)
-        completed_by_candidate = {candidate: 0 for candidate in candidates}
-        for candidate_id in exam_candidates:
-            candidate = candidates_by_id.get(candidate_id)
-            if candidate:
-                completed_by_candidate[candidate] += 1
-
-        return completed_by_candidate
+    def get_name(self):
+        return 'Exam Files'
 
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Count the approved exams uploaded by each candidate."""
+        return count_course_files_by_candidate(
+            Exam.objects.get_approved(), requirements, candidates)
 
+
+@register_requirement_type(CandidateRequirement.SYLLABUS)
 class SyllabusCandidateRequirement(CandidateRequirement):
     """Requirement for uploading syllabi to the site."""
     def save(self, *args, **kwargs):
@@ -630,27 +524,17 @@ class SyllabusCandidateRequirement(CandidateRequirement):
         self.requirement_type = CandidateRequirement.SYLLABUS
         super(SyllabusCandidateRequirement, self).save(*args, **kwargs)
 
-    def get_completed(self, candidate):
-        """Returns the number of credits completed by candidate"""
-        return Syllabus.objects.get_approved().filter(
-            submitter=candidate.user).count()
-
-    def get_completed_by_candidate(self, candidates):
-        candidates_by_id = Candidate.objects.in_bulk(
-            candidates.values_list('id', flat=True))
-        syllabi = Syllabus.objects.get_approved().filter(
-            submitter__candidate__in=candidates)
-        syllabi_candidates = syllabi.values_list(
-            'submitter__candidate', flat=True)
-        completed_by_candidate = {candidate: 0 for candidate in candidates}
-        for candidate_id in syllabi_candidates:
-            candidate = candidates_by_id[candidate_id]
-            if candidate in candidates:
-                completed_by_candidate[candidate] = 1
-
-        return completed_by_candidate
+    def get_name(self):
+        return 'Syllabus'
+
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Count the approved syllabi uploaded by each candidate."""
+        return count_course_files_by_candidate(
+            Syllabus.objects.get_approved(), requirements, candidates)
 
 
+@register_requirement_type(CandidateRequirement.RESUME)
 class ResumeCandidateRequirement(CandidateRequirement):
     """Requirement for uploading a resume to the site."""
     def save(self, *args, **kwargs):
@@ -658,24 +542,24 @@ class ResumeCandidateRequirement(CandidateRequirement):
         self.requirement_type = CandidateRequirement.RESUME
         super(ResumeCandidateRequirement, self).save(*args, **kwargs)
 
-    def get_completed(self, candidate):
-        return Resume.objects.filter(user=candidate.user, verified=True).count()
-
-    def get_completed_by_candidate(self, candidates):
-        candidates_by_id = Candidate.objects.in_bulk(
-            candidates.values_list('id', flat=True))
-        resumes = Resume.objects.filter(
-            user__candidate__in=candidates, verified=True)
-        resume_candidates = resumes.values_list('user__candidate', flat=True)
-        completed_by_candidate = {candidate: 0 for candidate in candidates}
-        for candidate_id in resume_candidates:
-            candidate = candidates_by_id[candidate_id]
-            if candidate in candidates:
-                completed_by_candidate[candidate] = 1
-
-        return completed_by_candidate
-
-
+    def get_name(self):
+        return 'Resume'
+
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Count one credit for each candidate with a verified resume."""
+        verified_users = set(Resume.objects.filter(
+            user__in=[candidate.user_id for candidate in candidates],
+            verified=True).values_list('user', flat=True))
+        completed = collections.Counter()
+        for candidate in candidates:
+            for requirement in requirements:
+                completed[(candidate.pk, requirement.pk)] = int(
+                    candidate.user_id in verified_users)
+        return completed
+
+
+@register_requirement_type(CandidateRequirement.MANUAL)
 class ManualCandidateRequirement(CandidateRequirement):
     name = models.CharField(max_length=60, db_index=True)
 
@@ -684,6 +568,16 @@ class ManualCandidateRequirement(CandidateRequirement):
         self.requirement_type = CandidateRequirement.MANUAL
         super(ManualCandidateRequirement, self).save(*args, **kwargs)
 
+    def get_name(self):
+        return self.name
+
+    @classmethod
+    def get_completed_by_candidate(cls, requirements, candidates):
+        """Actual credits earned are read from CandidateRequirementProgress,
+        so no credits are counted here.
+        """
+        return collections.Counter()
+
     class Meta(object):
         ordering = ('-term', 'requirement_type', 'name')
 
@@ -716,3 +610,210 @@ class CandidateRequirementProgress(models.Model):
     class Meta(object):
         ordering = ('requirement', 'candidate')
         verbose_name_plural = 'candidate requirement progresses'
+
+
+class CandidateProgressSnapshotManager(models.Manager):
+    def refresh(self, candidates):
+        """Recompute the progress snapshots for the given queryset of
+        candidates, and mark them as computed.
+
+        The candidates are locked first, so that concurrent refreshes of the
+        same candidates replace their snapshots one at a time rather than
+        inserting the same snapshots twice.
+        """
+        with transaction.atomic():
+            candidate_pks = list(candidates.select_for_update().order_by(
+                'pk').values_list('pk', flat=True))
+            candidates = Candidate.objects.filter(pk__in=candidate_pks)
+            terms = Term.objects.filter(candidate__in=candidate_pks).distinct()
+            for term in terms:
+                progress_by_candidate = Candidate.get_progress_by_candidate(
+                    candidates.filter(term=term), term)
+                self.filter(candidate__in=[
+                    candidate.pk for candidate in progress_by_candidate
+                ]).delete()
+                self.bulk_create([
+                    self.model(
+                        candidate=candidate,
+                        requirement=req_progress['requirement'],
+                        completed=req_progress['completed'],
+                        required=req_progress['required'],
+                        signed_up=req_progress.get('signed_up', 0),
+                        remaining=req_progress.get('remaining', 0),
+                        warning=req_progress.get('warning', False))
+                    for candidate, progress in progress_by_candidate.items()
+                    for req_progress in progress])
+            candidates.update(progress_refreshed=timezone.now())
+
+    def get_progress_by_candidate(self, candidates):
+        """Return the progress of a set of candidates in the same format as
+        Candidate.get_progress_by_candidate, read from the stored snapshots.
+
+        The progress of candidates whose snapshots were never computed is
+        computed in memory instead, since reading progress shouldn't write
+        it. Their snapshots are stored by the next refresh (see the
+        rebuild_candidate_progress management command).
+        """
+        candidates = list(candidates.select_related('user', 'term'))
+        snapshots = self.filter(candidate__in=candidates).select_related(
+            *CandidateRequirement.get_subclass_related_fields('requirement__'))
+        progress_by_candidate = {candidate.pk: [] for candidate in candidates}
+        for snapshot in snapshots:
+            progress_by_candidate[snapshot.candidate_id].append(
+                snapshot.as_progress())
+
+        missing_by_term = collections.defaultdict(list)
+        for candidate in candidates:
+            if candidate.progress_refreshed is None:
+                missing_by_term[candidate.term].append(candidate.pk)
+        for term, candidate_pks in missing_by_term.items():
+            computed = Candidate.get_progress_by_candidate(
+                Candidate.objects.filter(pk__in=candidate_pks), term)
+            for candidate, progress in computed.items():
+                progress_by_candidate[candidate.pk] = progress
+
+        return {candidate: progress_by_candidate[candidate.pk]
+                for candidate in candidates}
+
+
+class CandidateProgressSnapshot(models.Model):
+    """One candidate's progress towards one requirement, as computed by
+    Candidate.get_progress_by_candidate.
+
+    Snapshots are kept current by signal handlers on every model that
+    contributes to candidate progress (see below), so the candidate progress
+    pages only need to read this table. The rebuild_candidate_progress
+    management command recomputes all snapshots from scratch, and is run
+    hourly by the tbpweb-candidate-progress systemd timer, since the number
+    of remaining events changes as events end.
+    """
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE)
+    requirement = models.ForeignKey(
+        CandidateRequirement, on_delete=models.CASCADE)
+    completed = models.IntegerField(default=0)
+    required = models.IntegerField(default=0)
+    # The following fields are only used for event requirements
+    signed_up = models.IntegerField(default=0)
+    remaining = models.IntegerField(default=0)
+    warning = models.BooleanField(default=False)
+
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = CandidateProgressSnapshotManager()
+
+    class Meta(object):
+        # Snapshots are created in the same order as requirements are listed
+        # by Candidate.get_progress_by_candidate
+        ordering = ('candidate', 'id')
+        unique_together = ('candidate', 'requirement')
+
+    def __str__(self):
+        return '{candidate}: {completed}/{required} {req}'.format(
+            candidate=self.candidate, completed=self.completed,
+            required=self.required, req=self.requirement.get_name())
+
+    def as_progress(self):
+        """Return the snapshot as a requirement progress dictionary (see
+        Candidate.get_progress_by_candidate).
+        """
+        progress = {
+            'requirement': self.requirement,
+            'completed': self.completed,
+            'required': self.required
+        }
+        if self.requirement.requirement_type == CandidateRequirement.EVENT:
+            progress['signed_up'] = self.signed_up
+            progress['remaining'] = self.remaining
+            progress['warning'] = self.warning
+        return progress
+
+
+# Functions that return the candidates whose progress depends on an instance
+# of each model that contributes to candidate progress
+PROGRESS_DEPENDENCIES = {
+    Candidate: lambda instance: Candidate.objects.filter(pk=instance.pk),
+    CandidateRequirement: lambda instance: Candidate.objects.filter(
+        term=instance.term_id),
+    CandidateRequirementProgress: lambda instance: Candidate.objects.filter(
+        pk=instance.candidate_id),
+    Challenge: lambda instance: Candidate.objects.filter(
+        pk=instance.candidate_id),
+    Event: lambda instance: Candidate.objects.filter(term=instance.term_id),
+    EventAttendance: lambda instance: Candidate.objects.filter(
+        user=instance.user_id, term__event=instance.event_id),
+    EventSignUp: lambda instance: Candidate.objects.filter(
+        user=instance.user_id, term__event=instance.event_id),
+    Exam: lambda instance: Candidate.objects.filter(
+        user=instance.submitter_id),
+    Resume: lambda instance: Candidate.objects.filter(user=instance.user_id),
+    Syllabus: lambda instance: Candidate.objects.filter(
+        user=instance.submitter_id),
+}
+# Saving a requirement only sends post_save for its subclass
+for requirement_model in (EventCandidateRequirement,
+                          ChallengeCandidateRequirement,
+                          ExamFileCandidateRequirement,
+                          SyllabusCandidateRequirement,
+                          ResumeCandidateRequirement,
+                          ManualCandidateRequirement):
+    PROGRESS_DEPENDENCIES[requirement_model] = PROGRESS_DEPENDENCIES[
+        CandidateRequirement]
+
+
+def refresh_candidate_progress(candidates):
+    """Refresh the progress snapshots and invalidate the cached portal
+    contexts of the given queryset of candidates.
+    """
+    # Avoid circular dependency by importing here
+    from candidates.portal import invalidate_portal_context
+    CandidateProgressSnapshot.objects.refresh(candidates)
+    invalidate_portal_context(candidates)
+
+
+def progress_post_save(sender, instance, **kwargs):
+    """Refresh the progress of the candidates affected by a saved
+    instance.
+    """
+    if kwargs.get('raw'):
+        return
+    candidates = PROGRESS_DEPENDENCIES[sender](instance)
+    if sender is Event:
+        # Every candidate of the event's term is refreshed, so this waits
+        # until the transaction commits rather than running while the
+        # event's transaction (and its locks) is still open
+        transaction.on_commit(lambda: refresh_candidate_progress(candidates))
+    else:
+        refresh_candidate_progress(candidates)
+
+
+def progress_post_delete(sender, instance, **kwargs):
+    """Refresh the progress of the candidates affected by a deleted
+    instance.
+
+    The refresh is deferred until the transaction commits, since the deletion
+    may be part of a cascade that also deletes the candidates or requirements
+    the snapshots would refer to.
+    """
+    candidates = PROGRESS_DEPENDENCIES[sender](instance)
+    transaction.on_commit(lambda: refresh_candidate_progress(candidates))
+
+
+for progress_model in PROGRESS_DEPENDENCIES:
+    post_save.connect(progress_post_save, sender=progress_model)
+    # Deleting a requirement subclass also sends post_delete for the
+    # CandidateRequirement parent, after both rows have been deleted
+    if progress_model._meta.parents:
+        continue
+    post_delete.connect(progress_post_delete, sender=progress_model)
+
+
+def progress_attendance_recorded(sender, event, user_ids, **kwargs):
+    """Refresh the progress of the candidates whose attendance was recorded
+    in bulk (see EventAttendance.objects.record_many).
+    """
+    refresh_candidate_progress(Candidate.objects.filter(
+        user__in=user_ids, term=event.term_id))
+
+
+attendance_recorded.connect(progress_attendance_recorded)
+
@@ -0,0 +1,225 @@
+import collections
+
+from django.utils import timezone
+
+from base.cache import CacheNamespace
+from base.cache import invalidate_namespaces
+from candidates.models import CandidateRequirement
+from candidates.models import CandidateRequirementProgress
+from candidates.models import Challenge
+from candidates.models import ChallengeType
+from candidates.models import REQUIREMENT_TYPES
+from events.models import Event
+from exams.models import Exam
+from resumes.models import Resume
+from shortcuts import get_object_or_none
+from syllabi.models import Syllabus
+
+
+# Maximum number of seconds a candidate's portal context is cached for
+PORTAL_CACHE_TIMEOUT = 60 * 60
+
+
+def get_portal_cache(candidate_pk):
+    return CacheNamespace('candidate_portal:{}'.format(candidate_pk))
+
+
+def get_portal_context(candidate):
+    """Return the candidate portal context for the candidate, from the shared
+    cache if possible.
+    """
+    return get_portal_cache(candidate.pk).get_or_set(
+        'context', lambda: build_portal_context(candidate),
+        timeout=get_portal_cache_timeout)
+
+
+def get_portal_cache_timeout(context):
+    """Return the number of seconds the portal context can be cached for.
+
+    Future sign ups become past sign ups once the events end, so the context
+    expires when the first of them ends.
+    """
+    timeout = PORTAL_CACHE_TIMEOUT
+    now = timezone.now()
+    for events in context['future_signup_events'].values():
+        for event in events:
+            seconds_left = (event.end_datetime - now).total_seconds()
+            timeout = min(timeout, int(seconds_left) + 1)
+    return timeout
+
+
+def invalidate_portal_context(candidates):
+    """Invalidate the cached portal contexts of the given queryset of
+    candidates.
+    """
+    invalidate_namespaces([get_portal_cache(candidate_pk)
+                           for candidate_pk in candidates.values_list(
+                               'pk', flat=True)])
+
+
+# pylint: disable=R0914
+def build_portal_context(candidate):
+    """Return a dictionary with the candidate's requirement progress, events,
+    challenges, exams, syllabi and resume status, as shown in the candidate
+    portal and candidate management pages.
+
+    Everything is loaded in a fixed number of queries: one for each kind of
+    object listed, and one for each requirement type to count credits (see
+    register_requirement_type).
+    """
+    requirements = list(CandidateRequirement.objects.select_subclasses(
+        ).filter(term=candidate.term))
+    overrides = {
+        req_id: (manual, alternate)
+        for req_id, manual, alternate
+        in CandidateRequirementProgress.objects.filter(
+            candidate=candidate).values_list(
+            'requirement', 'manually_recorded_credits',
+            'alternate_credits_needed')}
+
+    # Cancelled events still count for credit, but aren't listed
+    attended_events = list(Event.objects.select_related('event_type').filter(
+        eventattendance__user=candidate.user_id, term=candidate.term_id))
+    attended_event_pks = set(event.pk for event in attended_events)
+    signup_events = [
+        event for event in Event.objects.select_related('event_type').filter(
+            eventsignup__user=candidate.user_id,
+            eventsignup__unsignup=False,
+            term=candidate.term_id,
+            cancelled=False)
+        if event.pk not in attended_event_pks]
+
+    challenges = list(Challenge.objects.select_related(
+        'challenge_type', 'verifying_user__userprofile').filter(
+        candidate=candidate))
+    exams = list(Exam.objects.filter(submitter=candidate.user_id).select_related(
+        'course_instance__term',
+        'course_instance__course__department').prefetch_related(
+        'course_instance__instructors'))
+    syllabi = list(Syllabus.objects.filter(
+        submitter=candidate.user_id).select_related(
+        'course_instance__term',
+        'course_instance__course__department').prefetch_related(
+        'course_instance__instructors'))
+    resume = get_object_or_none(Resume, user=candidate.user_id)
+
+    approved_exams = [exam for exam in exams if exam.is_approved()]
+    approved_syllabi = [syllabus for syllabus in syllabi
+                        if syllabus.is_approved()]
+
+    # Progress for each requirement, as returned by
+    # CandidateRequirement.get_progress
+    completed = collections.Counter()
+    requirements_by_type = collections.defaultdict(list)
+    for req in requirements:
+        requirements_by_type[req.requirement_type].append(
+            req.get_typed_requirement())
+    for requirement_type, typed_requirements in requirements_by_type.items():
+        completed.update(REQUIREMENT_TYPES[
+            requirement_type].get_completed_by_candidate(
+            typed_requirements, [candidate]))
+    progress_by_req = {}
+    for req in requirements:
+        req_progress = {'completed': completed[(candidate.pk, req.pk)],
+                        'required': req.credits_needed}
+        if req.pk in overrides:
+            req_progress['completed'] += overrides[req.pk][0]
+            req_progress['required'] = overrides[req.pk][1]
+        progress_by_req[req.pk] = req_progress
+
+    req_types = {req_type: [] for req_type, _
+                 in CandidateRequirement.REQUIREMENT_TYPE_CHOICES}
+    for req in requirements:
+        req_types[req.requirement_type].append({
+            'completed': progress_by_req[req.pk]['completed'],
+            'credits_needed': progress_by_req[req.pk]['required'],
+            'requirement': req
+        })
+
+    attended_events_by_type = collections.defaultdict(list)
+    past_signup_events_by_type = collections.defaultdict(list)
+    future_signup_events_by_type = collections.defaultdict(list)
+    attended_elective_events = []
+    future_signup_elective_events = []
+
+    for event in attended_events:
+        if not event.cancelled:
+            attended_events_by_type[event.event_type.name].append(event)
+
+    current_time = timezone.now()
+    for event in signup_events:
+        if event.end_datetime <= current_time:
+            past_signup_events_by_type[event.event_type.name].append(event)
+        else:
+            future_signup_events_by_type[event.event_type.name].append(event)
+
+    event_reqs = [req for req in requirements
+                  if req.requirement_type == CandidateRequirement.EVENT]
+    elective_req = None
+    for req in event_reqs:
+        if req.get_name() == 'Elective':
+            elective_req = req
+
+    # If at least 1 elective event is required and the candidate has
+    # attended at least the required amount of events for an event type,
+    # extra events will count as elective events. Any future sign ups will
+    # also be displayed under elective events instead of that event type.
+    if elective_req and progress_by_req[elective_req.pk]['required'] > 0:
+        for event_req in event_reqs:
+            req_progress = progress_by_req[event_req.pk]
+            event_type = event_req.get_typed_requirement().event_type
+            extra = req_progress['completed'] - req_progress['required']
+            if extra >= 0 and event_type.eligible_elective:
+                attended_elective_events += attended_events_by_type[
+                    event_type.name][req_progress['required']:]
+                attended_events_by_type[
+                    event_type.name] = attended_events_by_type[
+                    event_type.name][:req_progress['required']]
+                future_signup_elective_events += (
+                    future_signup_events_by_type[event_type.name])
+                future_signup_events_by_type[event_type.name] = []
+
+    # Count events that are eligible as electives that don't have any
+    # requirements
+    required_event_types = set(
+        req.get_typed_requirement().event_type_id for req in event_reqs)
+    for event in attended_events:
+        if (not event.cancelled and event.event_type.eligible_elective and
+                event.event_type_id not in required_event_types):
+            attended_elective_events.append(event)
+    for event in signup_events:
+        if (event.end_datetime > current_time and
+                event.event_type.eligible_elective and
+                event.event_type_id not in required_event_types):
+            future_signup_elective_events.append(event)
+
+    requested_challenges = {
+        name: [] for name in ChallengeType.objects.values_list(
+            'name', flat=True)}
+    for challenge in challenges:
+        requested_challenges[challenge.challenge_type.name].append(challenge)
+
+    return {
+        'requirement_progress': progress_by_req,
+        'req_types': req_types,
+        'attended_events': dict(attended_events_by_type),
+        'past_signup_events': dict(past_signup_events_by_type),
+        'future_signup_events': dict(future_signup_events_by_type),
+        'attended_elective_events': attended_elective_events,
+        'future_signup_elective_events': future_signup_elective_events,
+        'challenges': requested_challenges,
+        'approved_exams': approved_exams,
+        'unverified_exams': [exam for exam in exams if not exam.is_approved()
+                             and not exam.verified and not exam.blacklisted],
+        'blacklisted_exams': [exam for exam in exams if not exam.is_approved()
+                              and exam.blacklisted],
+        'approved_syllabi': approved_syllabi,
+        'unverified_syllabi': [
+            syllabus for syllabus in syllabi if not syllabus.is_approved()
+            and not syllabus.verified and not syllabus.blacklisted],
+        'blacklisted_syllabi': [
+            syllabus for syllabus in syllabi if not syllabus.is_approved()
+            and syllabus.blacklisted],
+        'resume_status': (resume.get_verified_display() if resume
+                          else 'Not uploaded'),
+    }
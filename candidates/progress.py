@@ -0,0 +1,229 @@
+import collections
+
+from django.db.models import Count
+from django.db.models import Exists
+from django.db.models import OuterRef
+
+from candidates.models import CandidateRequirement
+from candidates.models import CandidateRequirementProgress
+from candidates.models import REQUIREMENT_TYPES
+from events.models import Event
+from events.models import EventAttendance
+from events.models import EventSignUp
+from events.models import EventType
+
+
+class CandidateProgressEngine(object):
+    """Compute requirement progress for a set of candidates in a single term.
+
+    All of the data needed for every candidate x requirement cell is loaded
+    up front in a fixed number of grouped queries, independent of the number
+    of candidates and requirements: credits are counted with one query per
+    requirement type (see register_requirement_type), followed by event sign
+    ups and upcoming events for electives and per-candidate overrides.
+    Progress, including the elective roll-over, is then computed in a single
+    pass without touching the database again.
+    """
+    # Name of the event type whose requirement collects elective credits
+    ELECTIVE = 'Elective'
+
+    def __init__(self, candidates, term):
+        self.term = term
+        self.candidates = list(candidates.select_related('user'))
+        self.candidate_ids = [candidate.pk for candidate in self.candidates]
+        self.user_ids = [candidate.user_id for candidate in self.candidates]
+
+        self.requirements = list(
+            CandidateRequirement.objects.select_subclasses().filter(term=term))
+
+        # Credits completed, keyed by (candidate, requirement), counted by the
+        # registered requirement types with one query per type
+        self.completed = collections.Counter()
+        requirements_by_type = collections.defaultdict(list)
+        for req in self.requirements:
+            requirements_by_type[req.requirement_type].append(
+                req.get_typed_requirement())
+        for requirement_type, requirements in requirements_by_type.items():
+            self.completed.update(REQUIREMENT_TYPES[
+                requirement_type].get_completed_by_candidate(
+                requirements, self.candidates))
+
+        # Number of events attended, keyed by (user, event type)
+        self.attended_events = collections.Counter()
+        # Sign ups for events not (yet) attended, keyed by (user, event type)
+        self.signups = collections.Counter()
+        # Upcoming events in the term, keyed by event type
+        self.remaining = collections.Counter()
+        self.elective_event_types = set()
+        if CandidateRequirement.EVENT in requirements_by_type:
+            self._load_events()
+
+        # Per-candidate overrides and exemptions, keyed by
+        # (candidate, requirement)
+        self.overrides = {}
+        if self.requirements:
+            overrides = CandidateRequirementProgress.objects.filter(
+                candidate__in=self.candidate_ids,
+                requirement__term=term).order_by().values_list(
+                'candidate', 'requirement', 'manually_recorded_credits',
+                'alternate_credits_needed')
+            for candidate_id, req_id, manual, alternate in overrides:
+                self.overrides[(candidate_id, req_id)] = (manual, alternate)
+
+    def _load_events(self):
+        """Load attendance, sign up and upcoming event counts for the term,
+        which are used for elective progress.
+        """
+        attendances = EventAttendance.objects.filter(
+            event__term=self.term, user__in=self.user_ids).order_by(
+            ).values_list('user', 'event__event_type').annotate(
+            num=Count('id'))
+        for user_id, event_type_id, num in attendances:
+            self.attended_events[(user_id, event_type_id)] = num
+
+        # Only count sign ups for events that the user has not already
+        # attended
+        attended = EventAttendance.objects.filter(
+            event=OuterRef('event'), user=OuterRef('user'))
+        signups = EventSignUp.objects.filter(
+            event__term=self.term, user__in=self.user_ids,
+            unsignup=False).annotate(attended=Exists(attended)).filter(
+            attended=False).order_by().values_list(
+            'user', 'event__event_type').annotate(num=Count('id'))
+        for user_id, event_type_id, num in signups:
+            self.signups[(user_id, event_type_id)] = num
+
+        upcoming_events = Event.objects.get_upcoming().filter(
+            term=self.term).order_by().values_list('event_type').annotate(
+            num=Count('id'))
+        self.remaining.update(dict(upcoming_events))
+
+        self.elective_event_types = set(EventType.objects.filter(
+            eligible_elective=True).values_list('id', flat=True))
+
+    def get_completed(self, candidate, req):
+        """Return the number of credits the candidate has completed for the
+        requirement, not including manually recorded credits.
+        """
+        return self.completed[(candidate.pk, req.pk)]
+
+    def get_progress(self, candidate, req):
+        """Return a dictionary with the "requirement", "completed" and
+        "required" keys for one candidate and requirement, taking
+        per-candidate overrides and exemptions into account.
+        """
+        progress = {'requirement': req,
+                    'completed': self.get_completed(candidate, req),
+                    'required': req.credits_needed}
+        self._apply_override(candidate, progress)
+        return progress
+
+    def _apply_override(self, candidate, progress):
+        """Add manually recorded credits and the alternate number of credits
+        needed (if the candidate has any) to the progress dictionary.
+        """
+        override = self.overrides.get(
+            (candidate.pk, progress['requirement'].pk))
+        if override:
+            progress['completed'] += override[0]
+            progress['required'] = override[1]
+
+    def get_elective_requirement(self):
+        """Return the Elective event requirement for the term, or None if
+        electives are not required.
+        """
+        for req in self.requirements:
+            if (req.requirement_type == CandidateRequirement.EVENT and
+                    req.get_name() == self.ELECTIVE):
+                return req
+        return None
+
+    # pylint: disable=R0914
+    def get_progress_by_candidate(self):
+        """Return a dictionary mapping candidates to lists of requirement
+        progress dictionaries. See Candidate.get_progress_by_candidate for the
+        format of the dictionaries.
+        """
+        requirements = self.requirements
+        elective_req = self.get_elective_requirement()
+        elective_event_types = set()
+        remaining_elective_events = 0
+        if elective_req:
+            required_event_types = set(
+                req.get_typed_requirement().event_type_id
+                for req in requirements
+                if req.requirement_type == CandidateRequirement.EVENT)
+            elective_event_types = (
+                self.elective_event_types - required_event_types)
+            remaining_elective_events = sum(
+                self.remaining[event_type_id]
+                for event_type_id in elective_event_types)
+            requirements = [req for req in requirements if req != elective_req]
+
+        progress_by_candidate = {}
+        for candidate in self.candidates:
+            progress_list = []
+            progress_by_candidate[candidate] = progress_list
+
+            elective_progress = None
+            if elective_req:
+                # Elective credit from events that are eligible as electives
+                # but don't have a requirement of their own. Extra credit from
+                # required events is added below.
+                elective_progress = {
+                    'requirement': elective_req,
+                    'completed': sum(
+                        self.attended_events[(candidate.user_id, type_id)]
+                        for type_id in elective_event_types),
+                    'signed_up': sum(
+                        self.signups[(candidate.user_id, type_id)]
+                        for type_id in elective_event_types),
+                    'warning': False,
+                    'remaining': remaining_elective_events,
+                    'required': elective_req.credits_needed
+                }
+                self._apply_override(candidate, elective_progress)
+
+            for req in requirements:
+                req_progress = self.get_progress(candidate, req)
+                if req.requirement_type != CandidateRequirement.EVENT:
+                    progress_list.append(req_progress)
+                    continue
+
+                event_type = req.get_typed_requirement().event_type
+                remaining = self.remaining[event_type.pk]
+                required = req_progress['required']
+                # If not filled below, the requirement is not counted
+                completed = 0
+                num_signup = 0
+                req_progress['warning'] = False
+                if required > 0:
+                    completed = req_progress['completed']
+                    if completed + remaining < required:
+                        req_progress['warning'] = True
+                    num_signup = self.signups[
+                        (candidate.user_id, event_type.pk)]
+                    req_progress['signed_up'] = num_signup
+                    req_progress['remaining'] = remaining
+                    progress_list.append(req_progress)
+
+                # Elective progress on eligible event types is only counted
+                # when an Elective requirement is set
+                if elective_progress and event_type.eligible_elective:
+                    elective_progress['remaining'] += remaining
+                    # Only count completed and signed-up non-elective events
+                    # if they exceed the requirement.
+                    not_completed = max(0, required - completed)
+                    elective_progress['completed'] += max(
+                        0, completed - required)
+                    elective_progress['signed_up'] += max(
+                        0, num_signup - not_completed)
+
+            if elective_progress:
+                if (elective_progress['completed'] +
+                        elective_progress['remaining'] <
+                        elective_progress['required']):
+                    elective_progress['warning'] = True
+                progress_list.append(elective_progress)
+
+        return progress_by_candidate
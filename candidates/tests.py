@@ -1,3 +1,5 @@
+import csv
+import io
 import os
 import shutil
 
@@ -5,15 +7,22 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.conf import settings
 from django.core.files import File
+from django.core.management import call_command
 from django.urls import reverse
+from django.test import RequestFactory
 from django.test import TestCase
 from django.test.utils import override_settings
 from django.utils import timezone
+import openpyxl
 
+from base.cache import get_shared_cache
+from base.models import Major
 from base.models import Officer
 from base.models import OfficerPosition
 from base.models import Term
+from base.models import University
 from candidates.models import Candidate
+from candidates.models import CandidateProgressSnapshot
 from candidates.models import CandidateRequirement
 from candidates.models import CandidateRequirementProgress
 from candidates.models import Challenge
@@ -22,12 +31,16 @@ from candidates.models import ChallengeType
 from candidates.models import EventCandidateRequirement
 from candidates.models import ExamFileCandidateRequirement
 from candidates.models import ManualCandidateRequirement
+from candidates.models import REQUIREMENT_TYPES
+from candidates.portal import get_portal_context
+from candidates.views import CandidateExportView
 from courses.models import CourseInstance
 from events.models import Event
 from events.models import EventAttendance
 from events.models import EventType
 from exams.models import Exam
 from shortcuts import get_object_or_none
+from user_profiles.models import CollegeStudentInfo
 from user_profiles.models import StudentOrgUserProfile
 
 
@@ -159,6 +172,7 @@ class CandidateTest(TestCase):
         os.remove('test.txt')
         shutil.rmtree(os.path.join(settings.WORKSPACE_DJANGO_ROOT, 'media', 'tests'),
                       ignore_errors=True)
+        super(CandidateTest, cls).tearDownClass()
 
     def test_candidate_post_save(self):
         student_org_profile = get_object_or_none(
@@ -286,6 +300,23 @@ class CandidateTest(TestCase):
         progress = self.candidate.get_progress(CandidateRequirement.EXAM_FILE)
         self.assertEqual(progress['completed'], 1)
 
+    def test_requirement_types(self):
+        """Test that every requirement type is registered and that
+        requirements of every type can be displayed with a single query.
+        """
+        self.assertEqual(
+            set(REQUIREMENT_TYPES),
+            set(req_type for req_type, _
+                in CandidateRequirement.REQUIREMENT_TYPE_CHOICES))
+        with self.assertNumQueries(1):
+            names = [req.get_name() for req
+                     in CandidateRequirement.objects.select_subclasses(
+                     ).filter(term=self.term)]
+        self.assertEqual(
+            sorted(names),
+            ['Exam Files', 'Fun', 'Individual Challenges', 'Manual 1',
+             'Manual 2'])
+
     def test_get_total_progress(self):
         """Test get_progress where requirement_type is not specified and
         total progress for all requirements is returned.
@@ -328,6 +359,273 @@ class CandidateTest(TestCase):
         self.assertEqual(progress['required'], num_required)
         self.assertEqual(progress['completed'], total_completed)
 
+    def test_get_progress_by_candidate(self):
+        """Test that bulk progress matches the progress of each candidate and
+        that extra required events roll over into electives.
+        """
+        elective_type = EventType.objects.create(name='Elective')
+        elective_req = EventCandidateRequirement.objects.create(
+            event_type=elective_type, credits_needed=2, term=self.term)
+        other_user = get_user_model().objects.create_user(
+            username='other', email='other@tbp.berkeley.edu',
+            password='password', first_name='Other', last_name='Candidate')
+        other_candidate = Candidate.objects.create(
+            user=other_user, term=self.term)
+
+        # 5 credits of Fun events (1 extra for electives) and 1 Not Fun event
+        # (an elective event, since Not Fun events aren't required)
+        EventAttendance(event=self.fun_event1, user=self.user).save()
+        EventAttendance(event=self.fun_event2, user=self.user).save()
+        EventAttendance(event=self.notfun_event, user=self.user).save()
+        big_fun_event = Event.objects.create(
+            name='Bigger Fun Event', event_type=self.event_type1,
+            start_datetime=timezone.now(), end_datetime=timezone.now(),
+            requirements_credit=2, term=self.term, location='A location',
+            contact=self.officer.user, committee=self.officer.position)
+        EventAttendance(event=big_fun_event, user=self.user).save()
+        Challenge.objects.create(
+            candidate=self.candidate, description='Hello kitty',
+            verifying_user=self.officer.user, verified=True,
+            challenge_type=self.individual_challenge_type)
+        CandidateRequirementProgress.objects.create(
+            candidate=other_candidate, requirement=self.manual_req1,
+            manually_recorded_credits=1, alternate_credits_needed=3)
+
+        candidates = Candidate.objects.filter(term=self.term)
+        progress_by_candidate = Candidate.get_progress_by_candidate(
+            candidates, self.term)
+        self.assertEqual(len(progress_by_candidate), 2)
+
+        for candidate, progress in progress_by_candidate.items():
+            # Elective progress is last
+            self.assertEqual(progress[-1]['requirement'].pk, elective_req.pk)
+            for req_progress in progress[:-1]:
+                req = req_progress['requirement']
+                expected = req.get_progress(candidate)
+                self.assertEqual(req_progress['completed'],
+                                 expected['completed'])
+                self.assertEqual(req_progress['required'],
+                                 expected['required'])
+
+        elective_progress = progress_by_candidate[self.candidate][-1]
+        self.assertEqual(elective_progress['completed'], 2)
+        self.assertEqual(elective_progress['required'], 2)
+        self.assertFalse(elective_progress['warning'])
+        elective_progress = progress_by_candidate[other_candidate][-1]
+        self.assertEqual(elective_progress['completed'], 0)
+        self.assertTrue(elective_progress['warning'])
+
+    def test_get_progress_by_candidate_num_queries(self):
+        """Test that the number of queries needed for bulk progress doesn't
+        depend on the number of candidates or requirements.
+        """
+        user_model = get_user_model()
+        for i in range(10):
+            user = user_model.objects.create_user(
+                username='luser{}'.format(i),
+                email='luser{}@tbp.berkeley.edu'.format(i),
+                password='password')
+            Candidate.objects.create(user=user, term=self.term)
+            EventAttendance(event=self.fun_event1, user=user).save()
+            ManualCandidateRequirement.objects.create(
+                name='Manual {}'.format(i + 3), credits_needed=1,
+                term=self.term)
+        candidates = Candidate.objects.filter(term=self.term)
+
+        # The 11 queries are, in order:
+        #  1. the candidates
+        #  2. the requirements
+        #  3-5. the completed credits of each requirement type present
+        #       (challenges, events and exams)
+        #  6. the attendance by event type
+        #  7. the sign ups by event type
+        #  8. the current term
+        #  9. the upcoming events by event type
+        #  10. the elective event types
+        #  11. the requirement progress overrides
+        with self.assertNumQueries(11):
+            progress_by_candidate = Candidate.get_progress_by_candidate(
+                candidates, self.term)
+            for candidate, progress in progress_by_candidate.items():
+                str(candidate.user)
+                for req_progress in progress:
+                    req_progress['requirement'].get_name()
+        self.assertEqual(len(progress_by_candidate), 11)
+
+    def assertSnapshotsCurrent(self):
+        """Assert that the stored progress snapshots match the progress
+        computed from scratch.
+        """
+        candidates = Candidate.objects.filter(term=self.term)
+        expected = Candidate.get_progress_by_candidate(candidates, self.term)
+        snapshots = CandidateProgressSnapshot.objects.get_progress_by_candidate(
+            candidates)
+        self.assertEqual(
+            {candidate: [(p['requirement'].pk, p['completed'], p['required'])
+                         for p in progress]
+             for candidate, progress in expected.items()},
+            {candidate: [(p['requirement'].pk, p['completed'], p['required'])
+                         for p in progress]
+             for candidate, progress in snapshots.items()})
+
+    def test_progress_snapshots(self):
+        """Test that progress snapshots are updated as candidates make
+        progress.
+        """
+        self.assertSnapshotsCurrent()
+        snapshot = CandidateProgressSnapshot.objects.get(
+            candidate=self.candidate, requirement=self.event_req)
+        self.assertEqual(snapshot.completed, 0)
+
+        EventAttendance(event=self.fun_event2, user=self.user).save()
+        snapshot = CandidateProgressSnapshot.objects.get(
+            candidate=self.candidate, requirement=self.event_req)
+        self.assertEqual(snapshot.completed, 2)
+        self.assertSnapshotsCurrent()
+
+        Challenge.objects.create(
+            candidate=self.candidate, description='Hello kitty',
+            verifying_user=self.officer.user, verified=True,
+            challenge_type=self.individual_challenge_type)
+        self.assertSnapshotsCurrent()
+
+        progress = CandidateRequirementProgress.objects.create(
+            candidate=self.candidate, requirement=self.manual_req2,
+            manually_recorded_credits=3, alternate_credits_needed=4)
+        snapshot = CandidateProgressSnapshot.objects.get(
+            candidate=self.candidate, requirement=self.manual_req2)
+        self.assertEqual(snapshot.completed, 3)
+        self.assertEqual(snapshot.required, 4)
+
+        self.event_req.credits_needed = 1
+        self.event_req.save()
+        snapshot = CandidateProgressSnapshot.objects.get(
+            candidate=self.candidate, requirement=self.event_req)
+        self.assertEqual(snapshot.required, 1)
+        self.assertSnapshotsCurrent()
+
+    def test_progress_not_refreshed(self):
+        """Test that the progress of candidates whose snapshots were never
+        computed is computed without storing it.
+        """
+        EventAttendance(event=self.fun_event1, user=self.user).save()
+        CandidateProgressSnapshot.objects.all().delete()
+        Candidate.objects.filter(pk=self.candidate.pk).update(
+            progress_refreshed=None)
+        self.assertSnapshotsCurrent()
+        self.assertFalse(CandidateProgressSnapshot.objects.exists())
+        self.assertIsNone(
+            Candidate.objects.get(pk=self.candidate.pk).progress_refreshed)
+
+    def test_rebuild_candidate_progress(self):
+        """Test that the rebuild_candidate_progress command recreates missing
+        snapshots.
+        """
+        EventAttendance(event=self.fun_event1, user=self.user).save()
+        CandidateProgressSnapshot.objects.all().delete()
+        call_command('rebuild_candidate_progress', verbosity=0)
+        self.assertEqual(
+            CandidateProgressSnapshot.objects.filter(
+                candidate=self.candidate).count(),
+            CandidateRequirement.objects.filter(term=self.term).count())
+        self.assertSnapshotsCurrent()
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_portal_context(self):
+        """Test that the cached portal context matches the candidate's
+        progress and is invalidated when the candidate makes progress.
+        """
+        get_shared_cache().clear()
+        context = get_portal_context(self.candidate)
+        for req in CandidateRequirement.objects.filter(term=self.term):
+            self.assertEqual(context['requirement_progress'][req.pk],
+                             req.get_progress(self.candidate))
+        self.assertEqual(len(context['approved_exams']), 0)
+        self.assertEqual(context['attended_events'], {})
+        self.assertEqual(context['resume_status'], 'Not uploaded')
+
+        with self.assertNumQueries(0):
+            get_portal_context(self.candidate)
+
+        EventAttendance(event=self.fun_event2, user=self.user).save()
+        context = get_portal_context(self.candidate)
+        self.assertEqual(
+            context['requirement_progress'][self.event_req.pk]['completed'], 2)
+        self.assertEqual(context['attended_events'],
+                         {self.event_type1.name: [self.fun_event2]})
+
+
+class CandidateExportViewTest(TestCase):
+    def setUp(self):
+        Group.objects.create(name='Current Candidate')
+        Group.objects.create(name='Member')
+        self.term = Term.objects.create(term=Term.FALL, year=2014,
+                                        current=True)
+        start_term = Term.objects.create(term=Term.FALL, year=2011)
+        grad_term = Term.objects.create(term=Term.SPRING, year=2015)
+        university = University.objects.create(
+            short_name='BERK', long_name='UC Berkeley',
+            website='http://www.berkeley.edu')
+        majors = [
+            Major.objects.create(short_name=short_name, long_name=long_name,
+                                 university=university,
+                                 website='http://www.berkeley.edu')
+            for short_name, long_name in (('ME', 'Mechanical Engineering'),
+                                          ('BIOE', 'Bioengineering'))]
+        for i in range(3):
+            user = get_user_model().objects.create_user(
+                username='candidate{}'.format(i),
+                email='candidate{}@example.com'.format(i),
+                password='password', first_name='Random',
+                last_name='Candidate{}'.format(i))
+            Candidate.objects.create(user=user, term=self.term)
+            CollegeStudentInfo.objects.filter(user=user).update(
+                start_term=start_term, grad_term=grad_term)
+            user.collegestudentinfo.major.add(*majors[:i + 1])
+        self.superuser = get_user_model().objects.create_superuser(
+            'superuser', 'superuser@example.com', 'password')
+
+    def get_export(self, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.superuser
+        return CandidateExportView.as_view()(request, term_pk=self.term.pk)
+
+    def test_csv(self):
+        """Candidates are streamed with a constant number of queries."""
+        response = self.get_export()
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="candidates.csv"')
+        with self.assertNumQueries(2):
+            # The majors and the candidates
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(list(csv.reader(io.StringIO(content))), [
+            ['Last name', 'First name', 'Middle name', 'Email', 'Standing',
+             'Graduation date', 'Major'],
+            ['Candidate0', 'Random', '', 'candidate0@example.com', 'Senior',
+             'Spring 2015', 'Mechanical Engineering'],
+            ['Candidate1', 'Random', '', 'candidate1@example.com', 'Senior',
+             'Spring 2015', 'Bioengineering/Mechanical Engineering'],
+            ['Candidate2', 'Random', '', 'candidate2@example.com', 'Senior',
+             'Spring 2015', 'Bioengineering/Mechanical Engineering'],
+        ])
+
+    def test_xlsx(self):
+        with self.assertNumQueries(3):
+            # The term, the majors and the candidates
+            response = self.get_export(format='xlsx')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="candidates.xlsx"')
+        worksheet = openpyxl.load_workbook(
+            io.BytesIO(response.content)).active
+        rows = [[cell or '' for cell in row]
+                for row in worksheet.iter_rows(values_only=True)]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1], [
+            'Candidate0', 'Random', '', 'candidate0@example.com', 'Senior',
+            'Spring 2015', 'Mechanical Engineering'])
+
 
 class CandidateViewsTest(TestCase):
     fixtures = ['major.yaml', 'groups.yaml', 'university.yaml',
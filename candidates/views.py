@@ -1,18 +1,16 @@
 import collections
-import csv
 import json
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.models import Group
-from django.contrib.contenttypes.models import ContentType
 from django.core.mail import EmailMessage
+from django.db.models import Count
 from django.urls import reverse, reverse_lazy
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
 from django.template.loader import render_to_string
-from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, ListView, TemplateView, UpdateView
@@ -21,156 +19,36 @@ from django.views.generic.edit import FormView
 
 from base.models import Term
 from base.views import TermParameterMixin
-from candidates.models import Candidate, CandidateRequirement, CandidateRequirementProgress, Challenge, \
-                              ChallengeType, ChallengeCandidateRequirement, EventCandidateRequirement, \
+from candidates.models import Candidate, CandidateProgressSnapshot, CandidateRequirement, \
+                              CandidateRequirementProgress, Challenge, ChallengeType, \
+                              ChallengeCandidateRequirement, EventCandidateRequirement, \
                               ExamFileCandidateRequirement, ManualCandidateRequirement, \
                               ResumeCandidateRequirement, SyllabusCandidateRequirement
 from candidates.forms import CandidateCreationForm, CandidateUserProfileForm, CandidatePhotoForm, \
                              CandidateRequirementProgressFormSet, CandidateRequirementFormSet, \
                              ChallengeForm, ChallengeVerifyFormSet, ManualCandidateRequirementForm
+from candidates.portal import get_portal_context
 from events.models import Event
 from events.models import EventType
-from exams.models import Exam
 from houses.models import House
 from notifications.models import Notification
-from resumes.models import Resume
-from syllabi.models import Syllabus
 from shortcuts import get_object_or_none
+from user_profiles.models import CollegeStudentInfo
 from user_profiles.models import UserProfile
 from utils.ajax import json_response
+from utils.export import EXPORT_CHUNK_SIZE
+from utils.export import TableExportMixin
 
 
 class CandidateContextMixin(ContextMixin):
     """Mixin for getting the candidate, events, challenges, and exams for
     the context dictionary. Used in candidate management and candidate portal.
     """
-    # pylint: disable=R0914
     def get_context_data(self, **kwargs):
         context = super(CandidateContextMixin, self).get_context_data(**kwargs)
         candidate = kwargs.get('candidate')
         context['candidate'] = candidate
-
-        attended_events_by_type = collections.defaultdict(list)
-        past_signup_events_by_type = collections.defaultdict(list)
-        future_signup_events_by_type = collections.defaultdict(list)
-        attended_elective_events = []
-        future_signup_elective_events = []
-
-        attended_events = Event.objects.select_related(
-            'event_type').filter(
-            eventattendance__user=candidate.user,
-            term=candidate.term,
-            cancelled=False)
-        for event in attended_events:
-            attended_events_by_type[event.event_type.name].append(event)
-
-        signup_events = Event.objects.select_related(
-            'event_type').filter(
-            eventsignup__user=candidate.user,
-            eventsignup__unsignup=False,
-            term=candidate.term,
-            cancelled=False).exclude(
-            pk__in=attended_events.values_list('pk', flat=True))
-
-        current_time = timezone.now()
-        past_signup_events = signup_events.filter(
-            end_datetime__lte=current_time)
-        future_signup_events = signup_events.filter(
-            end_datetime__gt=current_time)
-
-        for event in past_signup_events:
-            past_signup_events_by_type[event.event_type.name].append(event)
-
-        for event in future_signup_events:
-            future_signup_events_by_type[event.event_type.name].append(event)
-
-        event_reqs = CandidateRequirement.objects.filter(
-            term=candidate.term,
-            requirement_type=CandidateRequirement.EVENT)
-        elective_req = None
-        try:
-            elective_req = event_reqs.get(
-                eventcandidaterequirement__event_type__name='Elective')
-        except CandidateRequirement.DoesNotExist:
-            elective_req = None
-
-        # If at least 1 elective event is required and the candidate has
-        # attended at least the required amount of events for an event type,
-        # extra events will count as elective events. Any future sign ups will
-        # also be displayed under elective events instead of that event type.
-        if (elective_req and
-                elective_req.get_progress(candidate)['required'] > 0):
-            for event_req in event_reqs:
-                req_progress = event_req.get_progress(candidate)
-                event_type = event_req.eventcandidaterequirement.event_type
-                extra = req_progress['completed'] - req_progress['required']
-                if extra >= 0 and event_type.eligible_elective:
-                    attended_elective_events += attended_events_by_type[
-                        event_type.name][req_progress['required']:]
-                    attended_events_by_type[
-                        event_type.name] = attended_events_by_type[
-                        event_type.name][:req_progress['required']]
-                    future_signup_elective_events += (
-                        future_signup_events_by_type[event_type.name])
-                    future_signup_events_by_type[event_type.name] = []
-
-        # Count events that are eligible as electives that don't have any
-        # requirements
-        non_required_event_types = EventType.objects.filter(
-            eligible_elective=True).exclude(
-            eventcandidaterequirement__pk__in=event_reqs.values_list(
-                'pk', flat=True))
-        attended_elective_events += list(attended_events.filter(
-            event_type__in=non_required_event_types))
-        future_signup_elective_events += list(future_signup_events.filter(
-            event_type__in=non_required_event_types))
-
-        context['attended_events'] = attended_events_by_type
-        context['past_signup_events'] = past_signup_events_by_type
-        context['future_signup_events'] = future_signup_events_by_type
-        context['attended_elective_events'] = attended_elective_events
-        context['future_signup_elective_events'] = future_signup_elective_events
-
-        requested_challenges = {}
-        challenge_types = ChallengeType.objects.values_list('name', flat=True)
-        for challenge_type in challenge_types:
-            requested_challenges[challenge_type] = []
-        challenges = Challenge.objects.select_related(
-            'challenge_type', 'verifying_user__userprofile').filter(
-            candidate=candidate)
-        for challenge in challenges:
-            requested_challenges[challenge.challenge_type.name].append(
-                challenge)
-        context['challenges'] = requested_challenges
-
-        approved_exams = Exam.objects.get_approved().filter(
-            submitter=candidate.user)
-        context['approved_exams'] = approved_exams
-        approved_exam_pks = [exam.pk for exam in approved_exams]
-        unapproved_exams = Exam.objects.filter(
-            submitter=candidate.user).exclude(pk__in=approved_exam_pks)
-        context['unverified_exams'] = unapproved_exams.filter(verified=False,
-                                                              blacklisted=False)
-        context['blacklisted_exams'] = unapproved_exams.filter(
-            blacklisted=True)
-
-        approved_syllabi = Syllabus.objects.get_approved().filter(
-            submitter=candidate.user)
-        context['approved_syllabi'] = approved_syllabi
-        approved_syllabus_pks = [syllabus.pk for syllabus in approved_syllabi]
-        unapproved_syllabi = Syllabus.objects.filter(
-            submitter=candidate.user).exclude(pk__in=approved_syllabus_pks)
-        context['unverified_syllabi'] = unapproved_syllabi.filter(
-            verified=False, blacklisted=False)
-        context['blacklisted_syllabi'] = unapproved_syllabi.filter(
-            blacklisted=True)
-
-        try:
-            context['resume_status'] = Resume.objects.get(
-                user=candidate.user).get_verified_display()
-        except Resume.DoesNotExist:
-            context['resume_status'] = 'Not uploaded'
-
+        context.update(get_portal_context(candidate))
         return context
 
 
@@ -302,13 +180,8 @@ class CandidateEditView(FormView, CandidateContextMixin):
     def dispatch(self, *args, **kwargs):
         self.candidate = get_object_or_404(
             Candidate, pk=self.kwargs['candidate_pk'])
-        self.requirements = CandidateRequirement.objects.filter(
-            term=self.candidate.term).select_related(
-            'eventcandidaterequirement',
-            'eventcandidaterequirement__event_type',
-            'challengecandidaterequirement',
-            'challengecandidaterequirement__challenge_type',
-            'examfilecandidaterequirement')
+        self.requirements = CandidateRequirement.objects.select_subclasses(
+            ).filter(term=self.candidate.term)
 
         # Create a list of progresses that at each index contains either a
         # progress corresponding to a requirement or None if there is no
@@ -344,11 +217,9 @@ class CandidateEditView(FormView, CandidateContextMixin):
         context = super(CandidateEditView, self).get_context_data(**kwargs)
         formset = self.get_form(self.form_class)
 
-        upcoming_events = Event.objects.get_upcoming()
-
-        remaining = collections.Counter()
-        for event in upcoming_events:
-            remaining[event.event_type.name] += 1
+        remaining = collections.Counter(dict(
+            Event.objects.get_upcoming().order_by().values_list(
+                'event_type__name').annotate(num=Count('id'))))
 
         # Initialize req_types to contain lists for every requirement type
         req_types = {}
@@ -358,7 +229,7 @@ class CandidateEditView(FormView, CandidateContextMixin):
         for i, req in enumerate(self.requirements):
             progress = self.progress_list[i]
             form = formset[i]
-            req_progress = req.get_progress(self.candidate)
+            req_progress = context['requirement_progress'][req.pk]
             completed = req_progress['completed']
             credits_needed = req_progress['required']
 
@@ -771,33 +642,7 @@ class CandidatePortalView(CreateView, CandidateContextMixin):
 
     def get_context_data(self, **kwargs):
         kwargs['candidate'] = self.candidate
-        context = super(CandidatePortalView, self).get_context_data(**kwargs)
-        requirements = CandidateRequirement.objects.filter(
-            term=self.current_term).select_related(
-            'eventcandidaterequirement',
-            'eventcandidaterequirement__event_type',
-            'challengecandidaterequirement',
-            'challengecandidaterequirement__challenge_type',
-            'examfilecandidaterequirement')
-
-        # Initialize req_types to contain lists for every requirement type
-        req_types = {}
-        for req in CandidateRequirement.REQUIREMENT_TYPE_CHOICES:
-            req_types[req[0]] = []
-
-        for req in requirements:
-            req_progress = req.get_progress(self.candidate)
-
-            entry = {
-                'completed': req_progress['completed'],
-                'credits_needed': req_progress['required'],
-                'requirement': req
-            }
-            req_type = req.requirement_type
-            req_types[req_type].append(entry)
-
-        context['req_types'] = req_types
-        return context
+        return super(CandidatePortalView, self).get_context_data(**kwargs)
 
     def form_valid(self, form):
         """Set the candidate of the challenge to the requester.
@@ -809,11 +654,9 @@ class CandidatePortalView(CreateView, CandidateContextMixin):
         challenge = form.save()
         candidate_name = self.candidate.user.userprofile.get_common_name()
 
-        Notification.objects.create(
-            user=challenge.verifying_user,
+        Notification.objects.fan_out(
+            [challenge.verifying_user_id], challenge,
             status=Notification.NEUTRAL,
-            content_type=ContentType.objects.get_for_model(Challenge),
-            object_pk=challenge.pk,
             title='Challenge Verification Request',
             subtitle='{} challenge by {}'.format(
                 challenge.challenge_type, candidate_name),
@@ -878,18 +721,15 @@ class CandidateProgressMixin(TermParameterMixin, ContextMixin):
         context['display_house'] = self.display_house
 
         candidates = Candidate.objects.filter(term=self.display_term)
+        # Only include candidates in the selected house
+        if self.display_house:
+            candidates = candidates.filter(
+                user__housemember__house=self.display_house,
+                user__housemember__term=self.display_term)
 
-        progress_by_candidate = Candidate.get_progress_by_candidate(
-            candidates, self.display_term)
-
-        # Exclude candidates not in the selected house
-        for candidate in progress_by_candidate.keys():
-            if self.display_house and \
-                    self.display_house.id not in \
-                    candidate.user.housemember.filter(
-                        term=self.display_term).values_list(
-                            'house', flat=True):
-                del progress_by_candidate[candidate]
+        progress_by_candidate = \
+            CandidateProgressSnapshot.objects.get_progress_by_candidate(
+                candidates)
 
         context['progress'] = {}
         for candidate, progress in progress_by_candidate.items():
@@ -1006,41 +846,53 @@ class CandidateProgressStatsView(TemplateView, CandidateProgressMixin):
                     progress_by_req[req_name] = {'unfinished': 0}
                 progress_by_req[req_name]['unfinished'] += unfinished
                 total_unfinished += unfinished
+        # The selected house may not have any candidates
+        num_candidates = float(len(progress) or 1)
         for req_name in progress_by_req:
-            progress_by_req[req_name]['unfinished'] /= float(len(progress))
-        total_unfinished /= float(len(progress))
+            progress_by_req[req_name]['unfinished'] /= num_candidates
+        total_unfinished /= num_candidates
         context['progress_by_req'] = progress_by_req
         context['total_unfinished'] = total_unfinished
 
         return context
 
 
-class CandidateExportView(View):
-    """View for exporting the list of candidates as a CSV file."""
+class CandidateExportView(TableExportMixin, View):
+    """View for exporting the list of candidates as a CSV or Excel file."""
+    filename = 'candidates'
+    term = None
 
     @method_decorator(login_required)
     @method_decorator(permission_required(
         'candidates.change_candidate', raise_exception=True))
     def dispatch(self, *args, **kwargs):
+        self.term = get_object_or_404(Term, pk=kwargs['term_pk'])
         return super(CandidateExportView, self).dispatch(*args, **kwargs)
 
-    def get(self, request, *args, **kwargs):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = \
-            'attachment; filename="candidates.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Last name', 'First name', 'Middle name', 'Email',
-                         'Standing', 'Graduation date', 'Major'])
-
-        current_term = Term.objects.get(id=kwargs['term_pk'])
+    def get_header(self):
+        return ['Last name', 'First name', 'Middle name', 'Email',
+                'Standing', 'Graduation date', 'Major']
+
+    def get_rows(self):
+        current_term = self.term
+
+        # Load all majors at once, since prefetches are ignored when iterating
+        # over the candidates in chunks
+        majors_by_user = collections.defaultdict(list)
+        candidate_majors = CollegeStudentInfo.major.through.objects.filter(
+            collegestudentinfo__user__candidate__term=current_term).order_by(
+            'major__long_name').values_list(
+            'collegestudentinfo__user', 'major__long_name')
+        for user_id, major_name in candidate_majors:
+            majors_by_user[user_id].append(major_name)
+
         candidates = Candidate.objects.filter(
-            term=current_term).prefetch_related(
-            'user__collegestudentinfo__major').select_related(
+            term=current_term).select_related(
             'user', 'user__userprofile',
             'user__collegestudentinfo__start_term',
-            'user__collegestudentinfo').order_by(
+            'user__collegestudentinfo__grad_term').order_by(
             'user__last_name')
-        for candidate in candidates:
+        for candidate in candidates.iterator(chunk_size=EXPORT_CHUNK_SIZE):
             start_term = candidate.user.collegestudentinfo.start_term
             candidate_year = current_term.year - start_term.year + 1
             if Term(year=start_term.year, term=current_term.term) < start_term:
@@ -1050,20 +902,13 @@ class CandidateExportView(View):
             # information we have.
             candidate_standing = 'Junior' if candidate_year <= 2 else 'Senior'
 
-            candidate_majors = candidate.user.collegestudentinfo.major
-            candidate_major_list = candidate_majors.values_list(
-                'long_name', flat=True)
-
-            writer.writerow(
-                [candidate.user.last_name,
-                 candidate.user.first_name,
-                 candidate.user.userprofile.middle_name,
-                 candidate.user.email,
-                 candidate_standing,
-                 candidate.user.collegestudentinfo.grad_term.verbose_name(),
-                 '/'.join(candidate_major_list)])
-
-        return response
+            yield [candidate.user.last_name,
+                   candidate.user.first_name,
+                   candidate.user.userprofile.middle_name,
+                   candidate.user.email,
+                   candidate_standing,
+                   candidate.user.collegestudentinfo.grad_term.verbose_name(),
+                   '/'.join(majors_by_user[candidate.user_id])]
 
 
 @require_POST
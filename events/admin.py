@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from events.models import Event, EventAttendance, EventSignUp, EventType
+from events.models import EventWaitlistEntry
 
 
 class EventAdmin(admin.ModelAdmin):
@@ -31,7 +32,17 @@ class EventSignupAdmin(admin.ModelAdmin):
                      'user__first_name', 'user__last_name', 'name')
 
 
+class EventWaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('event', 'user', 'name', 'email', get_term, 'num_guests',
+                    'timestamp')
+    list_filter = ('event__term',)
+    search_fields = ('event__name', 'user__username',
+                     'user__userprofile__preferred_name',
+                     'user__first_name', 'user__last_name', 'name')
+
+
 admin.site.register(Event, EventAdmin)
 admin.site.register(EventAttendance, EventAttendanceAdmin)
 admin.site.register(EventSignUp, EventSignupAdmin)
 admin.site.register(EventType)
+admin.site.register(EventWaitlistEntry, EventWaitlistEntryAdmin)
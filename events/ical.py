@@ -0,0 +1,121 @@
+from datetime import datetime
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models import Max
+from pytz import timezone as tz
+import vobject
+
+from base.cache import CacheNamespace
+from events.models import Event
+
+
+# Cached serialized ICS files. Keys are derived from the events in the files
+# and the last time any of them was updated (see get_ical_stamp), so entries
+# for events that changed are simply no longer looked up.
+ICAL_CACHE = CacheNamespace('ical')
+
+# Maximum number of seconds an ICS file is cached for
+ICAL_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def build_vtimezone():
+    """Return the VTIMEZONE component for the timezone of all events."""
+    vtimezone = vobject.newFromBehavior('vtimezone')
+    vtimezone.add('tzid').value = 'America/Los_Angeles'
+    vtimezone.add('X-LIC-LOCATION').value = 'America/Los_Angeles'
+    dst = vtimezone.add('daylight')
+    dst.add('tzoffsetfrom').value = '-0800'
+    dst.add('tzoffsetto').value = '-0700'
+    dst.add('tzname').value = 'PDT'
+    dst.add('dtstart').value = datetime(
+        1970, 3, 8, 2, 0, 0, 0, tz('US/Pacific'))  # '19700308T020000'
+    dst.add('rrule').value = 'FREQ=YEARLY;BYMONTH=3;BYDAY=2SU'
+    std = vtimezone.add('standard')
+    std.add('tzoffsetfrom').value = '-0700'
+    std.add('tzoffsetto').value = '-0800'
+    std.add('tzname').value = 'PST'
+    std.add('dtstart').value = datetime(
+        1970, 11, 1, 2, 0, 0, 0, tz('US/Pacific'))  # '19701101T020000'
+    std.add('rrule').value = 'FREQ=YEARLY;BYMONTH=11;BYDAY=1SU'
+    return vtimezone
+
+
+# The VTIMEZONE component never changes, so it is built once and copied into
+# every calendar (vobject changes components in place while serializing them)
+VTIMEZONE = build_vtimezone()
+
+
+def get_ical_stamp(events):
+    """Return the last time any of the given events was updated (or None if
+    there are no events) and the number of events, with a single query.
+
+    The stamp changes whenever one of the events changes, or events are
+    added to or removed from the queryset.
+    """
+    stamp = events.order_by().aggregate(
+        last_updated=Max('updated'), count=Count('pk'))
+    return stamp['last_updated'], stamp['count']
+
+
+def get_ical_etag(key, stamp):
+    """Return the ETag of the ICS file identified by the key (which describes
+    the events in the file) with the given stamp (see get_ical_stamp).
+    """
+    last_updated, count = stamp
+    return hashlib.md5('{}:{}:{}'.format(
+        key, last_updated.isoformat() if last_updated else '',
+        count).encode('utf-8')).hexdigest()
+
+
+def get_ical(etag, events):
+    """Return the serialized ICS file of the given events with the given ETag
+    (see get_ical_etag), from the shared cache if possible.
+    """
+    return ICAL_CACHE.get_or_set(
+        etag, lambda: build_ical(events), timeout=ICAL_CACHE_TIMEOUT)
+
+
+def build_ical(events):
+    """Return the serialized ICS file of the given events."""
+    cal = vobject.iCalendar()
+
+    cal.add('calscale').value = 'Gregorian'
+    cal.add('X-WR-TIMEZONE').value = 'America/Los_Angeles'
+    calendar_name = '{} Events'.format(settings.SITE_TAG)
+    cal.add('X-WR-CALNAME').value = calendar_name
+    cal.add('X-WR-CALDESC').value = calendar_name
+    cal.add(VTIMEZONE.duplicate(VTIMEZONE))
+
+    for event in events:
+        add_event_to_ical(event, cal)
+    return cal.serialize()
+
+
+def add_event_to_ical(event, cal):
+    """Helper method used by build_ical for adding an event to an ICS
+    calendar object.
+
+    Takes in "event" and "cal", where "event" is the actual event object and
+    "cal" is the ical object.
+    """
+    ical_event = cal.add('vevent')
+    name = event.name
+    if event.restriction == Event.MEMBER:
+        name += " (Members Only)"
+    elif event.restriction == Event.OFFICER:
+        name += " (Officers Only)"
+    ical_event.add('summary').value = name
+    ical_event.add('location').value = event.location
+    event_url = 'https://{}{}'.format(settings.HOSTNAME,
+                                      event.get_absolute_url())
+    if event.description:
+        description = u'{}\n\n{}'.format(event.description,
+                                         event_url)
+    else:
+        description = event_url
+    ical_event.add('description').value = description
+    ical_event.add('dtstart').value = event.start_datetime
+    ical_event.add('dtend').value = event.end_datetime
+    ical_event.add('uid').value = str(event.id)
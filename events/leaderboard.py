@@ -0,0 +1,43 @@
+from django.db.models import Count
+
+from events.models import EVENT_LEADERBOARD_CACHE
+from events.models import EventAttendance
+
+
+# Maximum number of seconds a leaderboard is cached for. Leaderboards are
+# invalidated whenever attendance or events change, so this only bounds how
+# long bulk updates (which don't send signals) go unnoticed.
+EVENT_LEADERBOARD_CACHE_TIMEOUT = 60 * 60
+
+
+def get_term_leaderboard(term):
+    """Return the events leaderboard of the term, from the shared cache if
+    possible.
+
+    The leaderboard is a list of (user pk, score, rank) tuples, where the score
+    is the number of events (that weren't cancelled) the user attended in the
+    term, sorted by decreasing score. Users with the same score have the same
+    rank.
+    """
+    return EVENT_LEADERBOARD_CACHE.get_or_set(
+        str(term.pk), lambda: build_term_leaderboard(term),
+        timeout=EVENT_LEADERBOARD_CACHE_TIMEOUT)
+
+
+def build_term_leaderboard(term):
+    """Compute the events leaderboard of the term (see get_term_leaderboard)
+    with a single query.
+    """
+    scores = EventAttendance.objects.filter(
+        event__term=term, event__cancelled=False).order_by().values_list(
+        'user').annotate(score=Count('id')).order_by('-score', 'user')
+
+    leaderboard = []
+    prev_score = None
+    rank = 0
+    for i, (user_id, score) in enumerate(scores, start=1):
+        if score != prev_score:
+            rank = i
+        prev_score = score
+        leaderboard.append((user_id, score, rank))
+    return leaderboard
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:10
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_reserved_seats(apps, schema_editor):
+    """Set the reserved_seats of existing events, as update_reserved_seats
+    would (historical models don't send signals).
+    """
+    Event = apps.get_model('events', 'Event')
+    EventSignUp = apps.get_model('events', 'EventSignUp')
+    seats = EventSignUp.objects.filter(
+        event=models.OuterRef('pk'), unsignup=False).order_by().values(
+        'event').annotate(seats=models.ExpressionWrapper(
+            models.Count('pk') + models.Sum('num_guests'),
+            output_field=models.IntegerField())).values('seats')
+    Event.objects.update(reserved_seats=Coalesce(models.Subquery(seats), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='reserved_seats',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_reserved_seats,
+                             migrations.RunPython.noop),
+    ]
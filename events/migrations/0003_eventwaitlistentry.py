@@ -0,0 +1,42 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0002_event_reserved_seats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventWaitlistEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_guests', models.PositiveSmallIntegerField(default=0)),
+                ('driving', models.PositiveSmallIntegerField(default=0)),
+                ('comments', models.TextField(blank=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.Event')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'event waitlist entries',
+                'ordering': ('timestamp', 'pk'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='eventwaitlistentry',
+            index=models.Index(fields=['event', 'timestamp'], name='events_even_event_i_ee5738_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventwaitlistentry',
+            unique_together={('event', 'user')},
+        ),
+    ]
@@ -1,17 +1,29 @@
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.db import models
+from django.db import transaction
 from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
 from django.template import defaultfilters
 from django.utils import timezone
 from django.utils.http import urlencode
 
+from base.cache import CacheNamespace
+from base.models import Officer
 from base.models import OfficerPosition
 from base.models import Term
+from base.roster import TermRoster
+from events.signals import attendance_recorded
 from project_reports.models import ProjectReport
 
 
+# Cached event leaderboards (see events.leaderboard), which are invalidated
+# whenever attendance is recorded or removed, or events change
+EVENT_LEADERBOARD_CACHE = CacheNamespace('event_leaderboards')
+
+
 class EventTypeManager(models.Manager):
     def get_by_natural_key(self, name):
         try:
@@ -55,8 +67,12 @@ class EventQuerySet(QuerySet):
 
         Viewability is based on the "restriction" level for the events.
         """
-        user_level = Event.get_user_restriction_level(user)
+        return self.get_level_viewable(Event.get_user_restriction_level(user))
 
+    def get_level_viewable(self, user_level):
+        """Return events that users with the given restriction level (see
+        Event.get_user_restriction_level) can view.
+        """
         # Initialize visible_levels to those that are visible to everyone
         visible_levels = list(Event.VISIBLE_TO_EVERYONE)
         if user_level >= Event.MEMBER:
@@ -76,6 +92,9 @@ class EventManager(models.Manager):
     def get_user_viewable(self, current_term_only=True):
         return self.get_query_set().get_user_viewable(current_term_only)
 
+    def get_level_viewable(self, user_level):
+        return self.get_query_set().get_level_viewable(user_level)
+
 
 class Event(models.Model):
     # Restriction constants
@@ -127,6 +146,11 @@ class Event(models.Model):
     needs_drivers = models.BooleanField(default=False)
     cancelled = models.BooleanField(default=False)
 
+    # The number of signed-up users and their guests, which is kept up to date
+    # whenever signups change (see update_reserved_seats), so that the seats
+    # remaining don't have to be counted from the signups
+    reserved_seats = models.PositiveIntegerField(default=0, editable=False)
+
     # Some events can be worth more than 1 credit for candidates:
     requirements_credit = models.IntegerField(
         default=1,
@@ -154,6 +178,23 @@ class Event(models.Model):
     def __str__(self):
         return '{} - {}'.format(self.name, self.term)
 
+    def save(self, *args, **kwargs):
+        """Save the event without its reserved_seats, unless they are
+        explicitly in update_fields.
+
+        The reserved seats are only changed by update_reserved_seats, since
+        the event may have been loaded before signups changed them.
+        """
+        if (not args and not self._state.adding and
+                not kwargs.get('force_insert') and
+                kwargs.get('update_fields') is None):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved_seats' and
+                field.attname not in deferred_fields]
+        super(Event, self).save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('events:detail', args=(self.pk,))
 
@@ -191,6 +232,14 @@ class Event(models.Model):
             count += self.get_num_guests()
         return count
 
+    def get_seats_remaining(self):
+        """Return the number of seats left for signups and their guests, or
+        None if the number of signups is unlimited.
+        """
+        if self.signup_limit == 0:
+            return None
+        return max(self.signup_limit - self.reserved_seats, 0)
+
     def can_user_sign_up(self, user):
         """Return true if the given user is allowed to sign up for this event.
 
@@ -219,11 +268,7 @@ class Event(models.Model):
         An example is 'Sat, Nov 3'. For a multiday event, an example is
         'Mon, Mar 5 - Tue, Mar 6'.
         """
-        date = Event.__get_abbrev_date_string(self.start_datetime)
-        if self.is_multiday():
-            date = '{} - {}'.format(
-                date, Event.__get_abbrev_date_string(self.end_datetime))
-        return date
+        return self.get_list_strings()[0]
 
     def list_time(self):
         """Return a succinct string representation of the event time.
@@ -231,19 +276,30 @@ class Event(models.Model):
         An example is '5:30 PM - 7:00 PM'. For a multiday event, the dates are
         included, as well. For instance, '(6/13) 11:15 PM - (6/14) 5:00 AM'.
         """
-        start_time = Event.__get_time_string(self.start_datetime)
-        end_time = Event.__get_time_string(self.end_datetime)
-        if self.is_multiday():
-            start_datetime = timezone.localtime(self.start_datetime)
-            start_date = defaultfilters.date(start_datetime, 'n/j')
-            end_datetime = timezone.localtime(self.end_datetime)
-            end_date = defaultfilters.date(end_datetime, 'n/j')
-            return '({}) {} - ({}) {}'.format(
-                start_date, start_time, end_date, end_time)
+        return self.get_list_strings()[1]
+
+    def get_list_strings(self):
+        """Return the list_date and list_time strings of the event.
+
+        Both strings are computed together, so that the event's datetimes are
+        only converted to the current timezone once.
+        """
+        start_datetime = timezone.localtime(self.start_datetime)
+        end_datetime = timezone.localtime(self.end_datetime)
+        date = defaultfilters.date(start_datetime, 'D, M j')
+        start_time = defaultfilters.date(start_datetime, 'g:i A')
+        end_time = defaultfilters.date(end_datetime, 'g:i A')
+        if start_datetime.date() != end_datetime.date():
+            date = '{} - {}'.format(
+                date, defaultfilters.date(end_datetime, 'D, M j'))
+            time = '({}) {} - ({}) {}'.format(
+                defaultfilters.date(start_datetime, 'n/j'), start_time,
+                defaultfilters.date(end_datetime, 'n/j'), end_time)
         elif start_time == end_time:
-            return 'TBA'
+            time = 'TBA'
         else:
-            return '{} - {}'.format(start_time, end_time)
+            time = '{} - {}'.format(start_time, end_time)
+        return date, time
 
     def view_datetime(self):
         """Return a succinct string representation of the event date and time.
@@ -380,10 +436,115 @@ class EventSignUp(models.Model):
             event_name=self.event.name)
 
 
+class EventWaitlistEntry(models.Model):
+    """A signup for a full event, which waits for seats to free up.
+
+    Like EventSignUp, the name and email are necessary for anonymous entries
+    (when user is null).
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.CASCADE)
+    num_guests = models.PositiveSmallIntegerField(default=0)
+    driving = models.PositiveSmallIntegerField(default=0)
+    comments = models.TextField(blank=True)
+    name = models.CharField(max_length=255, blank=True)
+    email = models.EmailField(blank=True)
+
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta(object):
+        ordering = ('timestamp', 'pk')
+        unique_together = ('event', 'user')
+        indexes = [models.Index(fields=['event', 'timestamp'])]
+        verbose_name_plural = 'event waitlist entries'
+
+    def __str__(self):
+        name = self.name if self.user is None else self.user.get_full_name()
+        return '{} is waiting for {}'.format(name, self.event.name)
+
+    def get_position(self):
+        """Return the 1-indexed position of the entry in the event's waitlist.
+        """
+        return EventWaitlistEntry.objects.filter(
+            models.Q(timestamp__lt=self.timestamp) |
+            models.Q(timestamp=self.timestamp, pk__lte=self.pk),
+            event=self.event_id).count()
+
+
+class EventAttendanceManager(models.Manager):
+    def record_many(self, event, user_ids):
+        """Record attendance at the event for the users with the given pks,
+        and return the set of pks of the users whose attendance was recorded
+        (pks of users who had already attended or who don't exist are
+        ignored).
+
+        Attendance is inserted in bulk, so unlike saving EventAttendance
+        objects one at a time, this takes a fixed number of queries to update
+        the event's project report. Since no post_save signals are sent,
+        attendance_recorded is sent once for all of the users instead.
+        """
+        user_ids = get_user_model().objects.filter(
+            pk__in=set(int(user_id) for user_id in user_ids)).exclude(
+            eventattendance__event=event).values_list('pk', flat=True)
+        user_ids = set(user_ids)
+        if not user_ids:
+            return user_ids
+
+        with transaction.atomic():
+            # Attendance recorded concurrently is ignored rather than failing
+            self.bulk_create(
+                [EventAttendance(event=event, user_id=user_id)
+                 for user_id in sorted(user_ids)],
+                ignore_conflicts=True)
+            if event.project_report_id:
+                self._add_to_project_report(event.project_report, user_ids)
+        transaction.on_commit(EVENT_LEADERBOARD_CACHE.invalidate)
+        attendance_recorded.send(sender=EventAttendance, event=event,
+                                 user_ids=user_ids)
+        return user_ids
+
+    def _add_to_project_report(self, project_report, user_ids):
+        """Add the users with the given pks to the attendance lists of the
+        project report, classified like EventAttendance.save does with
+        UserProfile.is_officer(current=True), is_candidate() and is_member().
+        """
+        # Avoid circular dependency by importing here:
+        from user_profiles.models import StudentOrgUserProfile
+
+        initiation_terms = dict(StudentOrgUserProfile.objects.filter(
+            user__in=user_ids).values_list('user', 'initiation_term'))
+        past_officer_ids = set(Officer.objects.filter(
+            user__in=initiation_terms).values_list('user', flat=True))
+        current_term = Term.objects.get_current_term()
+        roster = TermRoster.for_term(current_term)
+        # Without a current term, officers of any term count as current
+        current_officer_ids = (roster.get_officer_ids() if current_term
+                               else past_officer_ids)
+
+        officer_ids = []
+        candidate_ids = []
+        member_ids = []
+        for user_id, initiation_term_id in initiation_terms.items():
+            if user_id in current_officer_ids:
+                officer_ids.append(user_id)
+            elif initiation_term_id is not None or user_id in past_officer_ids:
+                member_ids.append(user_id)
+            elif roster.is_candidate(user_id):
+                candidate_ids.append(user_id)
+        if officer_ids:
+            project_report.officer_list.add(*officer_ids)
+        if candidate_ids:
+            project_report.candidate_list.add(*candidate_ids)
+        if member_ids:
+            project_report.member_list.add(*member_ids)
+
+
 class EventAttendance(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    objects = EventAttendanceManager()
+
     # TODO(sjdemartini): Deal with the pre-noiro attendance importing? Note
     # that noiro added a separate field here to handle pre-noiro attendance
     # imports, as well as ImportedAttendance objects
@@ -420,3 +581,38 @@ class EventAttendance(models.Model):
 
     class Meta(object):
         unique_together = ('event', 'user')
+
+
+def event_leaderboard_changed(sender, instance, **kwargs):
+    """Ensure that event leaderboards are recomputed once attendance or events
+    (for instance, whether they are cancelled) change.
+
+    All terms are invalidated, since an event can be moved to another term.
+    """
+    transaction.on_commit(EVENT_LEADERBOARD_CACHE.invalidate)
+
+
+def update_reserved_seats(sender, instance, **kwargs):
+    """Recompute the number of seats reserved for the event of a signup that
+    changed, with a single query.
+
+    The seats are recomputed rather than adjusted, so that signups changed
+    outside of events.signups (e.g., in the admin site) are counted as well.
+    """
+    seats = EventSignUp.objects.filter(
+        event=models.OuterRef('pk'), unsignup=False).order_by().values(
+        'event').annotate(seats=models.ExpressionWrapper(
+            models.Count('pk') + Sum('num_guests'),
+            output_field=models.IntegerField())).values('seats')
+    Event.objects.filter(pk=instance.event_id).update(
+        reserved_seats=Coalesce(models.Subquery(seats), 0))
+
+
+models.signals.post_save.connect(update_reserved_seats, sender=EventSignUp)
+models.signals.post_delete.connect(update_reserved_seats, sender=EventSignUp)
+models.signals.post_save.connect(event_leaderboard_changed, sender=Event)
+models.signals.post_delete.connect(event_leaderboard_changed, sender=Event)
+models.signals.post_save.connect(
+    event_leaderboard_changed, sender=EventAttendance)
+models.signals.post_delete.connect(
+    event_leaderboard_changed, sender=EventAttendance)
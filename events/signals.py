@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# Sent by EventAttendance.objects.record_many once attendance has been recorded
+# in bulk, since bulk creation doesn't send post_save for each EventAttendance.
+# Receivers are given the event and the set of pks of the users whose
+# attendance was recorded.
+attendance_recorded = Signal(providing_args=['event', 'user_ids'])
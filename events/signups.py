@@ -0,0 +1,168 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.mail import send_mass_mail
+from django.db import transaction
+
+from events.models import Event
+from events.models import EventSignUp
+from events.models import EventWaitlistEntry
+from notifications.models import Notification
+
+
+# The outcome of sign_up: the saved signup and whether it was created, or the
+# position of the person in the event's waitlist if the event was full
+SignUpResult = namedtuple(
+    'SignUpResult', ['signup', 'created', 'waitlist_position'])
+
+
+def sign_up(signup):
+    """Save a new or updated signup, unless its event doesn't have enough
+    seats left for the person and their guests, and return a SignUpResult.
+
+    The event's row is locked until the end of the transaction, so concurrent
+    signups for the same event are checked one at a time and can't overbook
+    it. The seats are checked against Event.reserved_seats, rather than by
+    counting the signups.
+
+    If a new signup (or one that was unsigned up) doesn't fit, the person is
+    put on the event's waitlist instead. If the person was already signed up
+    and asked for more guests than fit, a ValidationError is raised and the
+    signup is left unchanged.
+    """
+    with transaction.atomic():
+        event = Event.objects.select_for_update().get(pk=signup.event_id)
+        seats = 1 + signup.num_guests
+        previous_guests = None
+        if signup.pk is not None:
+            previous_guests = EventSignUp.objects.filter(
+                pk=signup.pk, unsignup=False).values_list(
+                'num_guests', flat=True).first()
+            if previous_guests is not None:
+                seats -= 1 + previous_guests
+
+        seats_remaining = event.get_seats_remaining()
+        if seats_remaining is not None and seats > seats_remaining:
+            if previous_guests is not None:
+                raise ValidationError('There are not enough spots left.')
+            entry = join_waitlist(event, signup)
+            return SignUpResult(None, False, entry.get_position())
+
+        created = signup.pk is None
+        signup.unsignup = False
+        signup.save()
+        get_waitlist_entries(event, signup).delete()
+        if seats < 0:
+            # The person brings fewer guests than before
+            promote_waitlist(event)
+        return SignUpResult(signup, created, None)
+
+
+def cancel_signup(signup):
+    """Unsign up (or remove from the waitlist) the person of the signup, and
+    give the seats they free up to the people waiting for them.
+    """
+    with transaction.atomic():
+        # Lock the event like sign_up, so that concurrent unsignups promote
+        # people from the waitlist one at a time
+        event = Event.objects.select_for_update().get(pk=signup.event_id)
+        get_waitlist_entries(event, signup).delete()
+        if not signup.unsignup:
+            signup.unsignup = True
+            signup.save()
+            promote_waitlist(event)
+
+
+def promote_waitlist(event):
+    """Sign up the people at the head of the (locked) event's waitlist, in
+    order, as long as they and their guests fit in the seats left.
+
+    Each promotion only looks up the head of the waitlist, which is indexed.
+    The promoted people are notified once the transaction is committed (see
+    notify_promoted).
+    """
+    # The reserved seats were updated by the signup that freed them
+    event.refresh_from_db(fields=['reserved_seats'])
+    promoted = []
+    while True:
+        entry = EventWaitlistEntry.objects.filter(event=event).order_by(
+            'timestamp', 'pk').first()
+        seats_remaining = event.get_seats_remaining()
+        if entry is None or (seats_remaining is not None and
+                             1 + entry.num_guests > seats_remaining):
+            break
+        signup = get_signups(event, entry).first() or EventSignUp(
+            event=event, user=entry.user)
+        for field in ('num_guests', 'driving', 'comments', 'name', 'email'):
+            setattr(signup, field, getattr(entry, field))
+        signup.unsignup = False
+        signup.save()
+        entry.delete()
+        event.reserved_seats += 1 + entry.num_guests
+        promoted.append(signup)
+
+    if promoted:
+        transaction.on_commit(lambda: notify_promoted(event, promoted))
+    return promoted
+
+
+def notify_promoted(event, signups):
+    """Notify the people who were signed up from the event's waitlist, with
+    a notification for each user and an email for each anonymous signup.
+
+    A user who is promoted again after unsigning up keeps the notification
+    about their signup (see NotificationManager.fan_out).
+    """
+    for signup in signups:
+        if signup.user_id:
+            Notification.objects.fan_out(
+                [signup.user_id], signup,
+                status=Notification.POSITIVE,
+                title='Signed Up From Waitlist',
+                subtitle=event.name,
+                description='A spot opened up, so you are now signed up.',
+                url=event.get_absolute_url())
+
+    subject = '[TBP] You are signed up for {}'.format(event.name)
+    body = ('A spot opened up for {}, so you are now signed up from the '
+            'waitlist.\n\nhttps://{}{}').format(
+        event.name, settings.HOSTNAME, event.get_absolute_url())
+    send_mass_mail(
+        [(subject, body, settings.NO_REPLY_EMAIL, [signup.email])
+         for signup in signups if not signup.user_id and signup.email],
+        fail_silently=True)
+
+
+def join_waitlist(event, signup):
+    """Add the person of the (unsaved) signup to the event's waitlist, or
+    update their entry if they are already waiting, and return the entry.
+    """
+    entry = get_waitlist_entries(event, signup).first()
+    if entry is None:
+        entry = EventWaitlistEntry(event=event, user=signup.user)
+    for field in ('num_guests', 'driving', 'comments', 'name', 'email'):
+        setattr(entry, field, getattr(signup, field))
+    entry.save()
+    return entry
+
+
+def get_signups(event, entry):
+    """Return the signups of the event for the person of the waitlist entry
+    (see get_waitlist_entries).
+    """
+    if entry.user_id is not None:
+        return EventSignUp.objects.filter(event=event, user=entry.user_id)
+    return EventSignUp.objects.filter(
+        event=event, user=None, email=entry.email)
+
+
+def get_waitlist_entries(event, signup):
+    """Return the waitlist entries of the event for the person of the signup,
+    who is identified by their email address if they are not logged in.
+    """
+    if signup.user_id is not None:
+        return EventWaitlistEntry.objects.filter(
+            event=event, user=signup.user_id)
+    return EventWaitlistEntry.objects.filter(
+        event=event, user=None, email=signup.email)
@@ -1,23 +1,39 @@
 import datetime
+import json
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.contrib.auth.models import Permission
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.exceptions import ValidationError
 from django.urls import reverse
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.test.utils import override_settings
 from django.utils import timezone
 
+from base.cache import get_shared_cache
 from base.models import Officer
 from base.models import OfficerPosition
 from base.models import Term
 from candidates.models import Candidate
 from events.forms import EventForm
 from events.forms import EventCancelForm
+from events.leaderboard import get_term_leaderboard
 from events.models import Event
 from events.models import EventAttendance
 from events.models import EventSignUp
 from events.models import EventType
+from events.models import EventWaitlistEntry
+from events.signups import cancel_signup
+from events.signups import sign_up
+from events.views import AllTimeLeaderboardListView
+from events.views import EventDetailView
+from notifications.models import Notification
 from project_reports.models import ProjectReport
+from shortcuts import create_leaderboard_page
 from shortcuts import get_object_or_none
 from user_profiles.models import StudentOrgUserProfile
 
@@ -633,6 +649,143 @@ class EventTest(EventTesting):
         self.assertQuerysetEqual(project_report.member_list.all(), [])
 
 
+class AttendanceSearchTest(EventTesting):
+    def setUp(self):
+        super(AttendanceSearchTest, self).setUp()
+        self.user.user_permissions.add(Permission.objects.get(
+            codename='add_eventattendance'))
+        self.assertTrue(self.client.login(
+            username='bentleythebent', password='testofficerpw'))
+        start_time = timezone.now()
+        self.event = self.create_event(
+            start_time, start_time + datetime.timedelta(hours=2))
+        self.search_url = reverse('events:attendance-search')
+
+    def search(self, search_term, **kwargs):
+        response = self.client.get(
+            self.search_url,
+            {'searchTerm': search_term, 'eventPK': self.event.pk},
+            HTTP_REFERER='/', **kwargs)
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_search(self):
+        other_user = get_user_model().objects.create_user(
+            username='tbp', email='tbp@tbp.berkeley.edu', password='testpw',
+            first_name='Tau', last_name='Bent')
+        profile = other_user.userprofile
+        profile.preferred_name = 'Bentley'
+        profile.save()
+
+        # All parts of the search must match, in any order and case. Results
+        # are sorted by name.
+        self.assertEqual(self.search('BENT'),
+                         [{'label': 'Bentley (Tau) Bent',
+                           'value': other_user.pk,
+                           'picture': None},
+                          {'label': 'Bentley Bent', 'value': self.user.pk,
+                           'picture': None}])
+        self.assertEqual([entry['value'] for entry in self.search('tau bent')],
+                         [other_user.pk])
+        self.assertEqual(self.search('bent bentleys'), [])
+        # Search terms match the beginnings of words in the name
+        self.assertEqual(self.search('entley'), [])
+        self.assertEqual([entry['value'] for entry in self.search('(ta')],
+                         [other_user.pk])
+
+        # Users who already attended the event aren't included
+        EventAttendance(event=self.event, user=self.user).save()
+        self.assertEqual([entry['value'] for entry in self.search('bent')],
+                         [other_user.pk])
+
+    def test_search_max_results(self):
+        for i in range(25):
+            get_user_model().objects.create_user(
+                username='user{}'.format(i),
+                email='user{}@tbp.berkeley.edu'.format(i),
+                password='testpw',
+                first_name='Bentley',
+                last_name='Bent {:02d}'.format(i))
+        results = self.search('bentley')
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results[0]['label'], 'Bentley Bent')
+        self.assertEqual(results[1]['label'], 'Bentley Bent 00')
+
+
+class RecordAttendanceTest(EventTesting):
+    def setUp(self):
+        super(RecordAttendanceTest, self).setUp()
+        start_time = timezone.now()
+        self.event = self.create_event(
+            start_time, start_time + datetime.timedelta(hours=2))
+        self.project_report = ProjectReport.objects.create(
+            term=self.term, author=self.user, title='Test PR',
+            date=start_time.date(), committee=self.committee)
+        self.event.project_report = self.project_report
+        self.event.save()
+
+        self.officer = self.create_user('officer')
+        Officer(user=self.officer, position=self.committee,
+                term=self.term).save()
+        self.candidate = self.create_user('candidate')
+        Candidate(user=self.candidate, term=self.term).save()
+        self.member = self.create_user('member')
+        StudentOrgUserProfile.objects.create(user=self.member,
+                                             initiation_term=self.term)
+
+    def create_user(self, username):
+        return get_user_model().objects.create_user(
+            username=username, email='{}@tbp.berkeley.edu'.format(username),
+            password='testpw', first_name=username, last_name='Bent')
+
+    def test_record_many(self):
+        EventAttendance(event=self.event, user=self.member).save()
+        user_pks = [self.user.pk, self.officer.pk, self.candidate.pk,
+                    self.member.pk, 0]
+        self.assertEqual(
+            EventAttendance.objects.record_many(self.event, user_pks),
+            set([self.user.pk, self.officer.pk, self.candidate.pk]))
+        self.assertEqual(
+            set(EventAttendance.objects.filter(
+                event=self.event).values_list('user', flat=True)),
+            set([self.user.pk, self.officer.pk, self.candidate.pk,
+                 self.member.pk]))
+        self.assertEqual(
+            EventAttendance.objects.record_many(self.event, user_pks), set())
+
+        # Users are added to the project report lists like when saving
+        # attendance one at a time
+        self.assertEqual(list(self.project_report.officer_list.all()),
+                         [self.officer])
+        self.assertEqual(list(self.project_report.candidate_list.all()),
+                         [self.candidate])
+        self.assertEqual(list(self.project_report.member_list.all()),
+                         [self.member])
+
+    def test_submit_many(self):
+        self.user.user_permissions.add(Permission.objects.get(
+            codename='add_eventattendance'))
+        self.assertTrue(self.client.login(
+            username='bentleythebent', password='testofficerpw'))
+        response = self.client.post(
+            reverse('events:attendance-submit-many'),
+            {'eventPK': self.event.pk,
+             'userPKs': [self.officer.pk, self.candidate.pk]})
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         {'recorded': sorted([self.officer.pk,
+                                              self.candidate.pk])})
+        self.assertEqual(
+            EventAttendance.objects.filter(event=self.event).count(), 2)
+
+        # A missing or invalid event is a bad request
+        for data in ({}, {'eventPK': 'event'}, {'eventPK': 0}):
+            response = self.client.post(
+                reverse('events:attendance-submit-many'),
+                dict(data, userPKs=[self.member.pk]))
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(EventAttendance.objects.filter(
+            user=self.member).exists())
+
+
 class EventFormsTest(EventTesting):
     def setUp(self):
         # Call superclass setUp first:
@@ -925,3 +1078,417 @@ class EventFormsTest(EventTesting):
         self.assertTrue(c_form.is_valid())
         self.assertIsNotNone(event.project_report)
         self.assertTrue(event.cancelled)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+class EventLeaderboardTest(TransactionTestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        self.term = Term(term=Term.SPRING, year=2012, current=True)
+        self.term.save()
+        self.committee = OfficerPosition(
+            short_name='IT',
+            long_name='Information Technology',
+            rank=2,
+            mailing_list='IT')
+        self.committee.save()
+        self.event_type = EventType.objects.create(name='Test Event Type')
+        self.users = [
+            get_user_model().objects.create_user(
+                'user{}'.format(i), 'user{}@tbp.berkeley.edu'.format(i),
+                'testpw')
+            for i in range(3)]
+        start_time = timezone.now()
+        self.events = [
+            Event.objects.create(
+                name='Event {}'.format(i),
+                event_type=self.event_type,
+                start_datetime=start_time,
+                end_datetime=start_time + datetime.timedelta(hours=2),
+                term=self.term,
+                location='A test location',
+                contact=self.users[0],
+                committee=self.committee)
+            for i in range(3)]
+
+    def test_leaderboard(self):
+        self.assertEqual(get_term_leaderboard(self.term), [])
+
+        # Users with the same score have the same rank
+        for event in self.events:
+            EventAttendance(event=event, user=self.users[0]).save()
+        for event in self.events[:2]:
+            EventAttendance(event=event, user=self.users[1]).save()
+            EventAttendance(event=event, user=self.users[2]).save()
+        leaderboard = [(self.users[0].pk, 3, 1),
+                       (self.users[1].pk, 2, 2),
+                       (self.users[2].pk, 2, 2)]
+        self.assertEqual(get_term_leaderboard(self.term), leaderboard)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_term_leaderboard(self.term), leaderboard)
+
+        # Cancelled events don't count
+        self.events[0].cancelled = True
+        self.events[0].save()
+        self.assertEqual(get_term_leaderboard(self.term),
+                         [(self.users[0].pk, 2, 1),
+                          (self.users[1].pk, 1, 2),
+                          (self.users[2].pk, 1, 2)])
+
+        EventAttendance.objects.get(
+            event=self.events[1], user=self.users[1]).delete()
+        self.assertEqual(get_term_leaderboard(self.term),
+                         [(self.users[0].pk, 2, 1),
+                          (self.users[2].pk, 1, 2)])
+
+    def test_all_time_leaderboard(self):
+        for event in self.events:
+            EventAttendance(event=event, user=self.users[0]).save()
+        for event in self.events[:2]:
+            EventAttendance(event=event, user=self.users[1]).save()
+            EventAttendance(event=event, user=self.users[2]).save()
+        view = AllTimeLeaderboardListView()
+        leaders = view.get_queryset()
+        self.assertEqual(
+            [(leader.pk, leader.score, leader.rank) for leader in leaders],
+            [(self.users[0].pk, 3, 1),
+             (self.users[1].pk, 2, 2),
+             (self.users[2].pk, 2, 2)])
+
+        # Only the page shown and the maximum score are loaded, and ranks
+        # are still counted from the top of the leaderboard
+        with self.assertNumQueries(2):
+            leader_list = create_leaderboard_page(
+                view.get_leaders(), view.get_queryset()[2:], 70)
+        self.assertEqual(
+            [(entry['user'], entry['score'], entry['rank'], entry['factor'])
+             for entry in leader_list],
+            [(self.users[2], 2, 2, 47.5)])
+
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+class IcalTest(EventTesting):
+    def setUp(self):
+        super(IcalTest, self).setUp()
+        get_shared_cache().clear()
+        start_time = timezone.now()
+        end_time = start_time + datetime.timedelta(hours=2)
+        self.public_events = [
+            self.create_event(start_time, end_time,
+                              name='Public Event {}'.format(i),
+                              restriction=Event.PUBLIC)
+            for i in range(2)]
+        self.officer_event = self.create_event(
+            start_time, end_time, name='Officer Event')
+        self.ical_url = reverse('events:ical')
+
+    def test_ical(self):
+        response = self.client.get(self.ical_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Public Event 0')
+        self.assertContains(response, 'Public Event 1')
+        self.assertNotContains(response, 'Officer Event')
+        self.assertContains(response, 'BEGIN:VTIMEZONE')
+        etag = response['ETag']
+
+        # The ICS file is cached, so only the events' stamp is queried
+        with self.assertNumQueries(1):
+            cached_response = self.client.get(self.ical_url)
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response['ETag'], etag)
+
+        # Clients whose copy is current get an empty response
+        response = self.client.get(self.ical_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.ical_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # Changing or removing an event changes the ICS file
+        self.public_events[0].name = 'Renamed Event'
+        self.public_events[0].save()
+        response = self.client.get(self.ical_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Renamed Event')
+        etag = response['ETag']
+
+        self.public_events[1].delete()
+        response = self.client.get(self.ical_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Public Event 1')
+
+    def test_ical_selected(self):
+        response = self.client.get(self.ical_url, {
+            'selected': json.dumps([self.public_events[1].pk,
+                                    self.officer_event.pk])})
+        self.assertNotContains(response, 'Public Event 0')
+        self.assertContains(response, 'Public Event 1')
+        self.assertNotContains(response, 'Officer Event')
+
+    def test_event_ical(self):
+        event = self.public_events[0]
+        url = reverse('events:event-ical', kwargs={'event_pk': event.pk})
+        response = self.client.get(url)
+        self.assertContains(response, 'Public Event 0')
+        self.assertNotContains(response, 'Public Event 1')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class EventsJSONTest(EventTesting):
+    def setUp(self):
+        super(EventsJSONTest, self).setUp()
+        start_time = timezone.now()
+        # Two events start at the same time, so pages have to be ordered by
+        # primary key as well
+        self.events = [
+            self.create_event(
+                start_time + datetime.timedelta(days=i // 2),
+                start_time + datetime.timedelta(days=i // 2, hours=2),
+                name='Public Event {}'.format(i), restriction=Event.PUBLIC)
+            for i in range(5)]
+        self.officer_event = self.create_event(
+            start_time, start_time + datetime.timedelta(hours=2))
+        self.json_url = reverse('events:json')
+
+    def test_pages(self):
+        pks = []
+        after = ''
+        while True:
+            response = self.client.get(
+                self.json_url, {'limit': 2, 'after': after})
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content.decode('utf-8'))
+            self.assertLessEqual(len(data['events']), 2)
+            pks.extend(event['pk'] for event in data['events'])
+            after = data['next']
+            if after is None:
+                break
+        # The officer event is not visible to the public
+        self.assertEqual(pks, [event.pk for event in self.events])
+
+    def test_fields(self):
+        event = self.events[0]
+        response = self.client.get(self.json_url, {'fields': 'pk,name,time'})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['events'][0], {
+            'pk': event.pk, 'name': event.name, 'time': event.list_time()})
+
+        response = self.client.get(self.json_url, {'fields': 'pk,password'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.json_url, {'after': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_default_fields(self):
+        event = self.events[0]
+        response = self.client.get(self.json_url, {'limit': 1})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['events'], [{
+            'pk': event.pk, 'name': event.name, 'date': event.list_date(),
+            'time': event.list_time(), 'location': event.location,
+            'type': self.event_type.name}])
+
+
+class EventSignUpServiceTest(EventTesting):
+    def setUp(self):
+        super(EventSignUpServiceTest, self).setUp()
+        start_time = timezone.now()
+        self.event = self.create_event(
+            start_time, start_time + datetime.timedelta(hours=2),
+            restriction=Event.PUBLIC)
+        self.event.signup_limit = 3
+        self.event.save()
+        self.users = [
+            get_user_model().objects.create_user(
+                'user{}'.format(i), 'user{}@tbp.berkeley.edu'.format(i),
+                'testpw')
+            for i in range(3)]
+
+    def assert_reserved_seats(self, seats):
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.reserved_seats, seats)
+        self.assertEqual(self.event.get_num_rsvps(), seats)
+
+    def test_reserved_seats(self):
+        signup = EventSignUp(event=self.event, user=self.user, num_guests=1)
+        signup.save()
+        self.assert_reserved_seats(2)
+        EventSignUp(event=self.event, name='Edward', email='ed@example.com',
+                    unsignup=True).save()
+        self.assert_reserved_seats(2)
+        signup.num_guests = 0
+        signup.save()
+        self.assert_reserved_seats(1)
+        signup.delete()
+        self.assert_reserved_seats(0)
+
+    def test_event_save(self):
+        """Saving an event loaded before signups changed doesn't overwrite
+        its reserved seats.
+        """
+        event = Event.objects.get(pk=self.event.pk)
+        EventSignUp(event=self.event, user=self.user, num_guests=1).save()
+        event.name = 'Renamed'
+        event.save()
+        self.assert_reserved_seats(2)
+        self.assertEqual(self.event.name, 'Renamed')
+
+    def test_sign_up(self):
+        result = sign_up(
+            EventSignUp(event=self.event, user=self.user, num_guests=1))
+        self.assertTrue(result.created)
+        self.assertIsNone(result.waitlist_position)
+        self.assert_reserved_seats(2)
+        self.assertEqual(self.event.get_seats_remaining(), 1)
+
+        # Users who don't fit are put on the waitlist, in order
+        result = sign_up(
+            EventSignUp(event=self.event, user=self.users[0], num_guests=1))
+        self.assertIsNone(result.signup)
+        self.assertEqual(result.waitlist_position, 1)
+        result = sign_up(
+            EventSignUp(event=self.event, name='Edward',
+                        email='ed@example.com', num_guests=1))
+        self.assertEqual(result.waitlist_position, 2)
+        result = sign_up(EventSignUp(event=self.event, user=self.users[0]))
+        self.assertIsNotNone(result.signup)
+        self.assert_reserved_seats(3)
+        self.assertEqual(self.event.get_seats_remaining(), 0)
+        self.assertEqual(
+            list(EventWaitlistEntry.objects.values_list('email', flat=True)),
+            ['ed@example.com'])
+
+        # Signed-up users can't take more seats than are left
+        signup = EventSignUp.objects.get(event=self.event, user=self.user)
+        signup.num_guests = 2
+        with self.assertRaises(ValidationError):
+            sign_up(signup)
+        self.assert_reserved_seats(3)
+
+        signup.num_guests = 0
+        self.assertFalse(sign_up(signup).created)
+        self.assert_reserved_seats(2)
+        # Unsigning up gives the freed seats to the waitlist
+        cancel_signup(signup)
+        self.assert_reserved_seats(3)
+        self.assertFalse(EventWaitlistEntry.objects.exists())
+
+    def test_unlimited(self):
+        self.event.signup_limit = 0
+        self.event.save()
+        for user in self.users:
+            sign_up(EventSignUp(event=self.event, user=user, num_guests=5))
+        self.assert_reserved_seats(18)
+        self.assertIsNone(self.event.get_seats_remaining())
+
+
+class EventWaitlistTest(TransactionTestCase):
+    def setUp(self):
+        term = Term.objects.create(term=Term.SPRING, year=2012, current=True)
+        self.users = [
+            get_user_model().objects.create_user(
+                'user{}'.format(i), 'user{}@tbp.berkeley.edu'.format(i),
+                'testpw')
+            for i in range(4)]
+        start_time = timezone.now()
+        self.event = Event.objects.create(
+            name='Social',
+            event_type=EventType.objects.create(name='Social'),
+            start_datetime=start_time,
+            end_datetime=start_time + datetime.timedelta(hours=2),
+            term=term,
+            location='A test location',
+            contact=self.users[0],
+            restriction=Event.PUBLIC,
+            signup_limit=2)
+        self.signups = [
+            sign_up(EventSignUp(event=self.event, user=user)).signup
+            for user in self.users[:2]]
+        # The first user in line brings a guest, so two seats must free up
+        # before anyone is promoted
+        sign_up(EventSignUp(event=self.event, user=self.users[2],
+                            num_guests=1))
+        sign_up(EventSignUp(event=self.event, name='Edward',
+                            email='ed@example.com'))
+
+    def test_promotion(self):
+        cancel_signup(self.signups[0])
+        self.assertEqual(EventWaitlistEntry.objects.count(), 2)
+        self.assertFalse(Notification.objects.exists())
+
+        cancel_signup(self.signups[1])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.reserved_seats, 2)
+        signup = EventSignUp.objects.get(event=self.event, unsignup=False)
+        self.assertEqual((signup.user, signup.num_guests), (self.users[2], 1))
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.user, self.users[2])
+        self.assertEqual(notification.content_object, signup)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Anonymous people at the head of the waitlist are emailed
+        cancel_signup(signup)
+        self.assertEqual(EventSignUp.objects.get(
+            event=self.event, unsignup=False).email, 'ed@example.com')
+        self.assertFalse(EventWaitlistEntry.objects.exists())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ed@example.com'])
+
+    def test_waitlist_views(self):
+        """The event page shows users their waitlist position, and they can
+        leave the waitlist like they unsign up.
+        """
+        def get_waitlist_position(user):
+            request = RequestFactory().get(self.event.get_absolute_url())
+            request.user = user
+            response = EventDetailView.as_view()(
+                request, event_pk=self.event.pk)
+            return response.context_data['waitlist_position']
+
+        self.assertEqual(get_waitlist_position(self.users[2]), 1)
+        self.assertIsNone(get_waitlist_position(self.users[0]))
+
+        self.client.login(username='user2', password='testpw')
+        response = self.client.post(
+            reverse('events:unsignup', args=(self.event.pk,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(get_waitlist_position(self.users[2]))
+        self.assertEqual(
+            list(EventWaitlistEntry.objects.values_list('email', flat=True)),
+            ['ed@example.com'])
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ['You have left the waitlist.'])
+
+        # Users who are neither signed up nor waiting aren't told they left
+        # again (the message above is still stored, since it wasn't shown)
+        response = self.client.post(
+            reverse('events:unsignup', args=(self.event.pk,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ['You have left the waitlist.'])
+
+    def test_leave_waitlist(self):
+        cancel_signup(EventSignUp(
+            event=self.event, user=self.users[2], unsignup=True))
+        cancel_signup(self.signups[0])
+        self.assertEqual(EventSignUp.objects.get(
+            event=self.event, unsignup=False, user=None).email,
+            'ed@example.com')
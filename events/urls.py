@@ -5,6 +5,7 @@ from events.views import AllTimeLeaderboardListView
 from events.views import attendance_delete
 from events.views import attendance_search
 from events.views import attendance_submit
+from events.views import attendance_submit_many
 from events.views import AttendanceRecordView
 from events.views import EventBuilderView
 from events.views import EventCancelView
@@ -14,6 +15,7 @@ from events.views import EventListView
 from events.views import EventSignUpView
 from events.views import event_revive
 from events.views import event_unsignup
+from events.views import events_json
 from events.views import EventUpdateView
 from events.views import ical
 from events.views import IndividualAttendanceListView
@@ -41,6 +43,8 @@ urlpatterns = [
     re_path(r'^attendance/delete/$', attendance_delete, name='attendance-delete'),
     re_path(r'^attendance/search/$', attendance_search, name='attendance-search'),
     re_path(r'^attendance/submit/$', attendance_submit, name='attendance-submit'),
+    re_path(r'^attendance/submit-many/$', attendance_submit_many,
+        name='attendance-submit-many'),
     re_path(r'^user/(?P<username>[a-zA-Z0-9._-]+)/$',
         IndividualAttendanceListView.as_view(), name='individual-attendance'),
     re_path(r'^calendar/$', EventListView.as_view(show_all=True,
@@ -48,6 +52,7 @@ urlpatterns = [
     re_path(r'^leaderboard/$', LeaderboardListView.as_view(), name='leaderboard'),
     re_path(r'^leaderboard/all-time/$',
         AllTimeLeaderboardListView.as_view(), name='all-time-leaderboard'),
+    re_path(r'^events.json$', events_json, name='json'),
     re_path(r'^events.ics$', ical, name='ical'),
     re_path(r'^(?P<event_pk>\d+)/event.ics$', ical, name='event-ical'),
 ]
@@ -1,8 +1,6 @@
-from pytz import timezone as tz
 from datetime import datetime
 from datetime import timedelta
 import json
-import vobject
 
 from django.conf import settings
 from django.contrib import messages
@@ -11,26 +9,40 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.core.serializers.json import DjangoJSONEncoder
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count
 from django.http import HttpResponse, Http404
 from django.shortcuts import get_object_or_404, redirect
-from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
 from django.utils.html import format_html
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+from django.utils.timezone import utc
 from django.views.decorators.http import require_GET
 from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, DetailView, FormView, ListView, TemplateView, UpdateView
 from accounts.models import APIKey
 from base.models import Term
+from base.roster import TermRoster
 from base.views import TermParameterMixin
-from candidates.models import Candidate
 from events.forms import EventForm, EventSignUpAnonymousForm, EventSignUpForm, EventCancelForm
+from events.ical import get_ical
+from events.ical import get_ical_etag
+from events.ical import get_ical_stamp
+from events.leaderboard import get_term_leaderboard
 from events.models import Event, EventAttendance, EventSignUp
+from events.models import EventWaitlistEntry
+from events.signups import cancel_signup
+from events.signups import get_waitlist_entries
+from events.signups import sign_up
 from project_reports.models import ProjectReport
-from shortcuts import create_leaderboard
+from shortcuts import create_leaderboard_page
+from shortcuts import rank_leaders
+from user_profiles.models import get_search_tokens
+from user_profiles.models import UserProfile
+from user_profiles.models import UserProfileSearchToken
 from utils.ajax import AjaxFormResponseMixin, json_response
 
 
@@ -67,18 +79,11 @@ class EventBuilderView(TermParameterMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super(EventBuilderView, self).get_context_data(**kwargs)
         context['show_all'] = self.show_all
-        all_events = []
-        for event in self.get_queryset():
-            event_data = {
-                "name": event.name,
-                "time": event.list_time(),
-                "location": event.location,
-                "date": event.list_date(),
-                "type": event.event_type.name,
-                "pk": event.pk
-            }
-            all_events.append(event_data)
-        context['json_data'] = json.dumps(all_events, cls=DjangoJSONEncoder)
+        # The primary keys of the listed events, used by the page's script to
+        # find the selected events. The events themselves were already loaded
+        # for the list (see events_json for fetching event data separately).
+        context['json_data'] = json.dumps(
+            [event.pk for event in self.object_list])
         if not self.request.user.is_authenticated:
             login_message = format_html(u'Please <a href="{}">log in</a>! Some '
                                         'events may not be visible.',
@@ -217,6 +222,7 @@ class EventDetailView(DetailView):
             unsignup=False).select_related('user', 'user__userprofile')
 
         signup = None
+        waitlist_entry = None
 
         if (not self.object.is_upcoming()
                 or not self.object.can_user_sign_up(self.request.user)):
@@ -239,19 +245,27 @@ class EventDetailView(DetailView):
                     context['form'] = EventSignUpForm(
                         self.object,
                         initial={'name': self.request.user.get_full_name()})
+                waitlist_entry = EventWaitlistEntry.objects.filter(
+                    event=self.object, user=self.request.user).first()
             else:
                 context['form'] = EventSignUpAnonymousForm(self.object)
 
         context['user_signed_up'] = signup is not None and not signup.unsignup
+        context['waitlist_position'] = (
+            waitlist_entry.get_position() if waitlist_entry else None)
 
+        # The signups are loaded for the list anyway, so their guests and
+        # drivers' seats are counted from the list rather than aggregated
         context['num_signups'] = len(context['signup_list'])
-        context['num_guests'] = self.object.get_num_guests()
+        context['num_guests'] = sum(
+            signup.num_guests for signup in context['signup_list'])
         total_rsvps = context['num_signups'] + context['num_guests']
 
-        context['total_seats'] = context['signup_list'].aggregate(
-            Sum('driving'))['driving__sum'] or 0
+        context['total_seats'] = sum(
+            signup.driving for signup in context['signup_list'])
 
         context['available_seats'] = context['total_seats'] - total_rsvps
+        context['seats_remaining'] = self.object.get_seats_remaining()
 
         def signup_sort_key(signup):
             if signup.user:
@@ -296,12 +310,24 @@ class EventSignUpView(AjaxFormResponseMixin, FormView):
         return kwargs
 
     def form_valid(self, form):
-        """Check whether the signup was created or updated."""
-        self.object = form.save(commit=False)
-        created = self.object.pk is None
-        self.object.save()
-
-        if created:
+        """Save the signup if the event has enough seats left (see
+        events.signups.sign_up), and check whether the signup was created or
+        updated, or put on the waitlist.
+        """
+        try:
+            result = sign_up(form.save(commit=False))
+        except ValidationError as error:
+            form.add_error(None, error)
+            return self.form_invalid(form)
+
+        if result.waitlist_position is not None:
+            # The position is shown by the signup form's script, so no message
+            # is added for the next page
+            return self.render_to_json_response(
+                {'waitlist_position': result.waitlist_position})
+
+        self.object = result.signup
+        if result.created:
             msg = 'Signup successful!'
         else:
             msg = 'Signup updated!'
@@ -375,6 +401,7 @@ def event_unsignup(request, event_pk):
     except:
         return json_response(status=400)
     success_msg = 'Unsignup successful.'
+    waitlist_msg = 'You have left the waitlist.'
     if request.user.is_authenticated:
         try:
             # Try to get a signup object for this user
@@ -382,26 +409,33 @@ def event_unsignup(request, event_pk):
             signup.user = request.user
 
             # Set the signup as "unsigned up"
-            signup.unsignup = True
-            signup.save()
+            cancel_signup(signup)
 
             messages.success(request, success_msg)
         except EventSignUp.DoesNotExist:
-            # If a signup could not be found, ignore this, since the user
-            # is not signed up for the event
-            pass
+            # If a signup could not be found, the user is not signed up for
+            # the event, but they may be on its waitlist. Otherwise, ignore
+            # this like before
+            signup = EventSignUp(event=event, user=request.user, unsignup=True)
+            if get_waitlist_entries(event, signup).exists():
+                cancel_signup(signup)
+                messages.success(request, waitlist_msg)
     else:
         email = request.POST.get('email')
         if email:
             try:
                 signup = EventSignUp.objects.get(event=event, email=email)
-                signup.unsignup = True
-                signup.save()
-                messages.success(request, success_msg)
+                msg = success_msg
             except:
-                errors = {'email': ('The email address you entered was not '
-                                    'used to sign up.')}
-                return json_response(status=400, data=errors)
+                # The email address may only be on the event's waitlist
+                signup = EventSignUp(event=event, email=email, unsignup=True)
+                if not get_waitlist_entries(event, signup).exists():
+                    errors = {'email': ('The email address you entered was '
+                                        'not used to sign up.')}
+                    return json_response(status=400, data=errors)
+                msg = waitlist_msg
+            cancel_signup(signup)
+            messages.success(request, msg)
         else:
             errors = {
                 'email': 'Please enter the email address you used to sign up.'
@@ -425,24 +459,23 @@ class AttendanceRecordView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(AttendanceRecordView, self).get_context_data(**kwargs)
-        current_term = Term.objects.get_current_term()
+        roster = TermRoster.for_term(Term.objects.get_current_term())
+        officer_ids = roster.get_officer_ids()
 
-        officers = user_model.objects.filter(
-            officer__term=current_term).select_related(
-            'userprofile').order_by('userprofile').distinct()
-        context['officers'] = officers
+        context['officers'] = user_model.objects.filter(
+            pk__in=officer_ids).select_related(
+            'userprofile').order_by('userprofile')
 
-        candidates = user_model.objects.filter(
-            candidate__term=current_term).select_related(
-            'userprofile').order_by('userprofile').distinct()
-        context['candidates'] = candidates
+        context['candidates'] = user_model.objects.filter(
+            pk__in=roster.candidate_ids).select_related(
+            'userprofile').order_by('userprofile')
 
         # Get all other users (not including officers or candidates) who either
         # signed up or received attendance for this event:
         context['members'] = user_model.objects.filter(
             Q(eventsignup__event=self.object, eventsignup__unsignup=False) |
             Q(eventattendance__event=self.object)).distinct().exclude(
-            Q(pk__in=officers) | Q(pk__in=candidates)).select_related(
+            pk__in=officer_ids | roster.candidate_ids).select_related(
             'userprofile').order_by('userprofile')
 
         # Create a set of the pk's of attendees', useful for checking (in
@@ -475,6 +508,27 @@ def attendance_submit(request):
     return json_response()
 
 
+@require_POST
+@permission_required('events.add_eventattendance', raise_exception=True)
+def attendance_submit_many(request):
+    """Record attendance for many users at a given event at once.
+
+    The users are specified by (repeated) userPKs post parameters, and the
+    event is specified by an eventPK post parameter. The response includes the
+    pks of the users whose attendance was newly recorded.
+    """
+    try:
+        event = Event.objects.get(pk=request.POST.get('eventPK'))
+    except (Event.DoesNotExist, ValueError):
+        return json_response(status=400)
+    user_pks = request.POST.getlist('userPKs')
+    try:
+        recorded = EventAttendance.objects.record_many(event, user_pks)
+    except ValueError:
+        return json_response(status=400)
+    return json_response(data={'recorded': sorted(recorded)})
+
+
 @require_POST
 @permission_required('events.delete_eventattendance', raise_exception=True)
 def attendance_delete(request):
@@ -500,7 +554,9 @@ def attendance_search(request, max_results=20):
 
     The search uses the "searchTerm" post parameter. Return up to max_results
     number of results. The results only include people who have not attended
-    the event specified by the post parameter eventPK.
+    the event specified by the post parameter eventPK. The "picture" of each
+    result is the URL of the user's thumbnail, or null if they don't have a
+    picture.
     """
     if not (request.user.is_authenticated and request.user.has_perm('events.add_eventattendance') \
              and ('HTTP_REFERER' in request.META)):
@@ -521,31 +577,27 @@ def attendance_search(request, max_results=20):
     # TODO(sjdemartini): Properly filter for members, instead of just getting
     # all users who are not officers or candidates (as these other users may
     # include company users, etc.)
-    members = user_model.objects.exclude(
-        eventattendance__event=event).select_related(
-        'userprofile')
-
-    # A list of entries for each member that matches the search query:
+    profiles = UserProfile.objects.exclude(
+        user__eventattendance__event=event).select_related('user')
+
+    # Parse the search query into separate words, and match users whose names
+    # have a word starting with each of them (in any order). Each word is
+    # matched by a prefix lookup on the indexed search tokens.
+    for search_term in get_search_tokens(search_query):
+        profiles = profiles.filter(
+            pk__in=UserProfileSearchToken.objects.matching(
+                search_term).values('profile'))
+    profiles = profiles.order_by('search_name')[:max_results]
+
+    # A list of entries for each member that matches the search query, with
+    # the URL of their thumbnail (or None if they don't have a picture):
     member_matches = []
-
-    # Parse the search query into separate pieces if the query includes
-    # whitespace
-    search_terms = search_query.lower().split()
-    for member in members:
-        name = member.userprofile.get_verbose_full_name()
-        name_lower = name.lower()
-        if all(search_term in name_lower for search_term in search_terms):
-            pic_html = render_to_string(
-                '_user_thumbnail.html',
-                {'user_profile': member.userprofile})
-            entry = {
-                'label': name,
-                'value': member.pk,
-                'picture': pic_html
-            }
-            member_matches.append(entry)
-        if len(member_matches) >= max_results:
-            break
+    for profile in profiles:
+        member_matches.append({
+            'label': profile.get_verbose_full_name(),
+            'value': profile.user_id,
+            'picture': profile.get_avatar_url()
+        })
     return json_response(data=member_matches)
 
 
@@ -639,94 +691,72 @@ class LeaderboardListView(TermParameterMixin, ListView):
         return super(LeaderboardListView, self).dispatch(*args, **kwargs)
 
     def get_queryset(self):
-        leaders = get_user_model().objects.filter(
-            eventattendance__event__term=self.display_term,
-            eventattendance__event__cancelled=False).select_related(
-            'studentorguserprofile').annotate(
-            score=Count('eventattendance')).order_by('-score')
-
-        backup = get_user_model().objects.filter(
-            eventattendance__event__term=self.display_term,
-            eventattendance__event__cancelled=False).select_related(
-            'userprofile').annotate(
-            score=Count('eventattendance')).order_by('-score')
-
-        if len(leaders) > 0:
-            max_events = leaders[0].score or 0
-        else:
-            max_events = 0
+        # The leaderboard is cached, and only the users on the displayed page
+        # are loaded (in get_context_data)
+        leaderboard = get_term_leaderboard(self.display_term)
+        roster = TermRoster.for_term(self.display_term)
+        max_events = leaderboard[0][1] if leaderboard else 0
 
         # Create a list of "leader" entries, where each entry is a dictionary
-        # that includes the user, their rank on the leaderboard (1st, 2nd,
-        # etc.), and their leaderboard width "factor" (see below for details).
+        # that includes the user's pk and score, their rank on the leaderboard
+        # (1st, 2nd, etc.), and their leaderboard width "factor" (see below for
+        # details).
         leader_list = []
-        if max_events > 0:  # make sure there's no divide by zero
-            prev_value = -1
-            prev_rank = 1
-
-            for i, leader in enumerate(leaders, start=prev_rank):
-                # factor used for CSS width property (percentage). Use 70 as
-                # the max width (i.e. the user who attended the most events has
-                # width 70%), including adding 2.5 to every factor to make sure
-                # that there is enough room for text to be displayed.
-                factor = 2.5 + leader.score * 67.5 / max_events
-
-                # Determine the position of the leader for use in CSS styling
-                # as well as updating the position aggregates and checking if
-                # this user is at the top of their position group
-                try:
-                    profile = leader.studentorguserprofile
-                except:
-                    temp_profile = backup[i].userprofile
-                    profile = temp_profile.get_student_org_user_profile()
-                officer_positions = profile.get_officer_positions(
-                    term=self.display_term).exclude(auxiliary=True)
-                is_term_officer = officer_positions.exists()
-
-                is_term_candidate = Candidate.objects.filter(
-                    user=leader, term=self.display_term).exists()
-
-                if is_term_officer:
-                    position = 'officer'
-                    self.officer_aggregate['attendees'] += 1
-                    self.officer_aggregate['attendance'] += leader.score
-
-                    if self.officer_aggregate['attendees'] == 1:
-                        self.top_officer = leader
-
-                elif is_term_candidate:
-                    position = 'candidate'
-                    self.candidate_aggregate['attendees'] += 1
-                    self.candidate_aggregate['attendance'] += leader.score
-
-                    if self.candidate_aggregate['attendees'] == 1:
-                        self.top_candidate = leader
-
-                else:
-                    position = 'member'
-                    self.member_aggregate['attendees'] += 1
-                    self.member_aggregate['attendance'] += leader.score
-
-                    if self.member_aggregate['attendees'] == 1:
-                        self.top_member = leader
-
-                if leader.score == prev_value:
-                    rank = prev_rank
-                else:
-                    rank = i
-                prev_rank = rank
-                prev_value = leader.score
-
-                # Add the leader entry to the list
-                leader_list.append({'user': leader,
-                                    'position': position,
-                                    'factor': factor,
-                                    'rank': rank})
+        for user_id, score, rank in leaderboard:
+            # factor used for CSS width property (percentage). Use 70 as
+            # the max width (i.e. the user who attended the most events has
+            # width 70%), including adding 2.5 to every factor to make sure
+            # that there is enough room for text to be displayed.
+            factor = 2.5 + score * 67.5 / max_events
+
+            # Determine the position of the leader for use in CSS styling
+            # as well as updating the position aggregates and checking if
+            # this user is at the top of their position group
+            position = roster.get_position(user_id)
+            entry = {'user_id': user_id,
+                     'score': score,
+                     'position': position,
+                     'factor': factor,
+                     'rank': rank}
+            if position == 'officer':
+                self.officer_aggregate['attendees'] += 1
+                self.officer_aggregate['attendance'] += score
+
+                if self.officer_aggregate['attendees'] == 1:
+                    self.top_officer = entry
+
+            elif position == 'candidate':
+                self.candidate_aggregate['attendees'] += 1
+                self.candidate_aggregate['attendance'] += score
+
+                if self.candidate_aggregate['attendees'] == 1:
+                    self.top_candidate = entry
+
+            else:
+                self.member_aggregate['attendees'] += 1
+                self.member_aggregate['attendance'] += score
+
+                if self.member_aggregate['attendees'] == 1:
+                    self.top_member = entry
+
+            # Add the leader entry to the list
+            leader_list.append(entry)
         return leader_list
 
     def get_context_data(self, **kwargs):
         context = super(LeaderboardListView, self).get_context_data(**kwargs)
 
+        # Load the users on this page and the top users of each position group
+        # in one query, with their scores
+        top_entries = [entry for entry in (
+            self.top_officer, self.top_candidate, self.top_member) if entry]
+        entries = list(context['leader_list']) + top_entries
+        users = get_user_model().objects.select_related(
+            'userprofile').in_bulk(set(entry['user_id'] for entry in entries))
+        for entry in entries:
+            entry['user'] = users[entry['user_id']]
+            entry['user'].score = entry['score']
+
         # Obtain the number of events per user in each position category
         self.candidate_aggregate['ratio'] = (
             self.get_average_attendance(self.candidate_aggregate['attendees'],
@@ -741,9 +771,12 @@ class LeaderboardListView(TermParameterMixin, ListView):
         context['candidate_aggregate'] = self.candidate_aggregate
         context['member_aggregate'] = self.member_aggregate
         context['officer_aggregate'] = self.officer_aggregate
-        context['top_candidate'] = self.top_candidate
-        context['top_member'] = self.top_member
-        context['top_officer'] = self.top_officer
+        context['top_candidate'] = (
+            self.top_candidate['user'] if self.top_candidate else None)
+        context['top_member'] = (
+            self.top_member['user'] if self.top_member else None)
+        context['top_officer'] = (
+            self.top_officer['user'] if self.top_officer else None)
 
         return context
 
@@ -765,124 +798,225 @@ class AllTimeLeaderboardListView(TermParameterMixin, ListView):
     def dispatch(self, *args, **kwargs):
         return super(AllTimeLeaderboardListView, self).dispatch(*args, **kwargs)
 
-    def get_queryset(self):
-        leaders = get_user_model().objects.filter(
+    def get_leaders(self):
+        return get_user_model().objects.filter(
             eventattendance__event__cancelled=False).select_related(
-            'userprofile').annotate(score=Count('eventattendance')).order_by(
-            '-score')
+            'userprofile').annotate(score=Count('eventattendance'))
 
-        return create_leaderboard(leaders, 70)
+    def get_queryset(self):
+        return rank_leaders(self.get_leaders())
 
     def get_context_data(self, **kwargs):
         context = super(AllTimeLeaderboardListView, self).get_context_data(
             **kwargs)
+        context['leader_list'] = create_leaderboard_page(
+            self.get_leaders(), context['object_list'], 70)
         context['is_all_time'] = True
 
         return context
 
 
+def get_api_key_user(request):
+    """Return the user identified by the "user" and "key" URL parameters
+    (which correspond to the user's PK and API key, respectively), or None if
+    they are not provided or don't match an API key.
+    """
+    user_pk = request.GET.get('user', None)
+    key = request.GET.get('key', None)
+    if user_pk and key:
+        try:
+            return APIKey.objects.get(user__pk=user_pk, key=key).user
+        except APIKey.DoesNotExist:
+            pass
+        except ValidationError:
+            # Bad or Wrong User PK or API key (key)
+            raise Http404
+    return None
+
+
+# The default number of events in each page of events_json, and the maximum
+# number of events clients can ask for
+EVENTS_JSON_PAGE_SIZE = 100
+EVENTS_JSON_MAX_PAGE_SIZE = 500
+
+# Map of the fields clients can ask events_json for to the Event fields they
+# need (in addition to the primary key and start time, which are always
+# loaded for paginating)
+EVENTS_JSON_FIELDS = {
+    'pk': (),
+    'name': ('name',),
+    'tagline': ('tagline',),
+    'date': ('end_datetime',),
+    'time': ('end_datetime',),
+    'start': (),
+    'end': ('end_datetime',),
+    'location': ('location',),
+    'type': ('event_type__name',),
+    'restriction': ('restriction',),
+    'cancelled': ('cancelled',),
+    'url': (),
+}
+
+# The fields events_json returns if the client doesn't ask for any
+EVENTS_JSON_DEFAULT_FIELDS = ('pk', 'name', 'date', 'time', 'location', 'type')
+
+# The cursors of events_json pages store start times as the number of
+# microseconds since the epoch
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
+
+@require_GET
+def events_json(request):
+    """Return a JSON response of a page of the events the user can view, in
+    the order they start.
+
+    The events are those of the term given by the "term" URL parameter (the
+    current term by default). If the "upcoming" URL parameter is "true", only
+    events that haven't been cancelled and haven't yet ended are included.
+    Like the ical view, the user is taken from the "user" and "key" URL
+    parameters if they are given.
+
+    The "fields" URL parameter is a comma-separated list of the fields to
+    return for each event (see EVENTS_JSON_FIELDS), and "limit" is the number
+    of events in the page. The response includes a "next" cursor, to be passed
+    as the "after" URL parameter for the next page, or null if there are no
+    more events. Pages are found with an index on the events' start times
+    rather than an offset, so every page is as fast to fetch as the first.
+    """
+    user = get_api_key_user(request) or request.user
+    fields = request.GET.get('fields', '')
+    fields = fields.split(',') if fields else EVENTS_JSON_DEFAULT_FIELDS
+    if any(field not in EVENTS_JSON_FIELDS for field in fields):
+        return json_response(status=400, message='Invalid fields.')
+    try:
+        limit = int(request.GET.get('limit', EVENTS_JSON_PAGE_SIZE))
+        after = request.GET.get('after', '')
+        if after:
+            after_start, after_pk = (int(value) for value in after.split('_'))
+            after_start = EPOCH + timedelta(microseconds=after_start)
+    except ValueError:
+        return json_response(status=400, message='Invalid page.')
+    if not 0 < limit <= EVENTS_JSON_MAX_PAGE_SIZE:
+        return json_response(status=400, message='Invalid page size.')
+
+    term = request.GET.get('term', '')
+    term = (Term.objects.get_by_url_name(term) if term
+            else Term.objects.get_current_term())
+    events = Event.objects.get_user_viewable(user).filter(term=term)
+    if request.GET.get('upcoming', '').lower() == 'true':
+        events = events.get_upcoming(current_term_only=False)
+    if after:
+        events = events.filter(
+            Q(start_datetime__gt=after_start) |
+            Q(start_datetime=after_start, pk__gt=after_pk))
+
+    # Only load the columns needed for the requested fields
+    columns = set(['start_datetime'])
+    for field in fields:
+        columns.update(EVENTS_JSON_FIELDS[field])
+    if 'event_type__name' in columns:
+        events = events.select_related('event_type')
+    events = list(events.only(*columns).order_by('start_datetime', 'pk')[
+        :limit + 1])
+
+    data = []
+    for event in events[:limit]:
+        data.append(serialize_event(event, fields))
+    if len(events) > limit:
+        last_event = events[limit - 1]
+        next_cursor = '{}_{}'.format(
+            (last_event.start_datetime - EPOCH) // timedelta(microseconds=1),
+            last_event.pk)
+    else:
+        next_cursor = None
+    return json_response(data={'events': data, 'next': next_cursor})
+
+
+def serialize_event(event, fields):
+    """Return a dictionary of the given fields of the event (see
+    EVENTS_JSON_FIELDS).
+    """
+    values = {}
+    if 'date' in fields or 'time' in fields:
+        values['date'], values['time'] = event.get_list_strings()
+    for field in fields:
+        if field == 'pk':
+            values[field] = event.pk
+        elif field == 'start':
+            values[field] = event.start_datetime.isoformat()
+        elif field == 'end':
+            values[field] = event.end_datetime.isoformat()
+        elif field == 'type':
+            values[field] = event.event_type.name
+        elif field == 'url':
+            values[field] = event.get_absolute_url()
+        elif field not in values:
+            values[field] = getattr(event, field)
+    return dict((field, values[field]) for field in fields)
+
+
 def ical(request, event_pk=None):
     """Return an ICS file for the given event, or for all events if no event
     primary key is provided.
 
     If a "term" URL parameter is given and no event pk is given, the view
-    returns all events for that term.
+    returns all events for that term. A "selected" URL parameter (a JSON list
+    of event primary keys) limits the file to the selected events.
 
     The view only shows events that the user is allowed to see, based on the
     "user" and "key" URL parameters (which correspond to the user's PK and API
     key, respectively). If the "user" and "key" parameters are not valid or are
     not provided, only publicly visible events are included.
+
+    Calendar clients poll this view, so ICS files are cached (see
+    events.ical), and a 304 response is returned if the events haven't
+    changed since the client's copy (based on the ETag and Last-Modified
+    headers).
     """
-    cal = vobject.iCalendar()
-
-    cal.add('calscale').value = 'Gregorian'
-    cal.add('X-WR-TIMEZONE').value = 'America/Los_Angeles'
-    calendar_name = '{} Events'.format(settings.SITE_TAG)
-    cal.add('X-WR-CALNAME').value = calendar_name
-    cal.add('X-WR-CALDESC').value = calendar_name
-
-    vtimezone = cal.add('vtimezone')
-    vtimezone.add('tzid').value = 'America/Los_Angeles'
-    vtimezone.add('X-LIC-LOCATION').value = 'America/Los_Angeles'
-    dst = vtimezone.add('daylight')
-    dst.add('tzoffsetfrom').value = '-0800'
-    dst.add('tzoffsetto').value = '-0700'
-    dst.add('tzname').value = 'PDT'
-    dst.add('dtstart').value = datetime(
-        1970, 3, 8, 2, 0, 0, 0, tz('US/Pacific'))  # '19700308T020000'
-    dst.add('rrule').value = 'FREQ=YEARLY;BYMONTH=3;BYDAY=2SU'
-    std = vtimezone.add('standard')
-    std.add('tzoffsetfrom').value = '-0700'
-    std.add('tzoffsetto').value = '-0800'
-    std.add('tzname').value = 'PST'
-    std.add('dtstart').value = datetime(
-        1970, 11, 1, 2, 0, 0, 0, tz('US/Pacific'))  # '19701101T020000'
-    std.add('rrule').value = 'FREQ=YEARLY;BYMONTH=11;BYDAY=1SU'
-
-    user = None
-    user_pk = request.GET.get('user', None)
-    key = request.GET.get('key', None)
-    if user_pk and key:
-        try:
-            api_key = APIKey.objects.get(user__pk=user_pk, key=key)
-            user = api_key.user
-        except APIKey.DoesNotExist:
-            pass
-        except ValidationError:
-            # Bad or Wrong User PK or API key (key)
-            raise Http404
+    user = get_api_key_user(request)
 
     if event_pk is None:
         # We want multiple events
         filename = 'events.ics'
         term = request.GET.get('term', '')
-        selected_events = request.GET.get('selected', '[]')
-        selected_events = json.loads(selected_events)
-        events = Event.objects.get_user_viewable(user).filter(cancelled=False)
+        try:
+            selected_events = sorted(set(
+                int(pk) for pk in json.loads(request.GET.get('selected', '[]'))))
+        except (TypeError, ValueError):
+            raise Http404
+        user_level = Event.get_user_restriction_level(user)
+        events = Event.objects.get_level_viewable(user_level).filter(
+            cancelled=False)
         if term:
             # Filter by the given term
             term_obj = Term.objects.get_by_url_name(term)
             events = events.filter(term=term_obj)
-        for event in events:
-            if len(selected_events) == 0 or event.pk in selected_events:
-                add_event_to_ical(event, cal)
+        if selected_events:
+            events = events.filter(pk__in=selected_events)
+        cache_key = 'events:{}:{}:{}'.format(
+            user_level, term, ','.join(str(pk) for pk in selected_events))
+        stamp = get_ical_stamp(events)
     else:
         # We want a specific event
         event = get_object_or_404(Event, pk=event_pk)
         if not event.can_user_view(user):
             raise PermissionDenied
         filename = 'event.ics'
-        add_event_to_ical(event, cal)
-
-    response = HttpResponse(cal.serialize(), content_type='text/calendar')
-    response['Filename'] = filename  # IE needs this
-    response['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+        events = [event]
+        cache_key = 'event:{}'.format(event.pk)
+        stamp = (event.updated, 1)
+
+    etag = get_ical_etag(cache_key, stamp)
+    last_modified = stamp[0] and int(stamp[0].timestamp())
+    response = get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(
+            get_ical(etag, events), content_type='text/calendar')
+        response['Filename'] = filename  # IE needs this
+        response['Content-Disposition'] = 'attachment; filename={}'.format(
+            filename)
+    response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
     return response
-
-
-def add_event_to_ical(event, cal):
-    """Helper method used by the ical view for adding an event to an ICS
-    calendar object.
-
-    Takes in "event" and "cal", where "event" is the actual event object and
-    "cal" is the ical object.
-    """
-    ical_event = cal.add('vevent')
-    name = event.name
-    if event.restriction == Event.MEMBER:
-        name += " (Members Only)"
-    elif event.restriction == Event.OFFICER:
-        name += " (Officers Only)"
-    ical_event.add('summary').value = name
-    ical_event.add('location').value = event.location
-    event_url = 'https://{}{}'.format(settings.HOSTNAME,
-                                      event.get_absolute_url())
-    if event.description:
-        description = u'{}\n\n{}'.format(event.description,
-                                         event_url)
-    else:
-        description = event_url
-    ical_event.add('description').value = description
-    ical_event.add('dtstart').value = event.start_datetime
-    ical_event.add('dtend').value = event.end_datetime
-    ical_event.add('uid').value = str(event.id)
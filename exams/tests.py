@@ -74,6 +74,7 @@ class ExamTest(TestCase):
         os.remove('test.txt')
         shutil.rmtree(os.path.join(settings.WORKSPACE_DJANGO_ROOT, 'media', 'tests'),
                       ignore_errors=True)
+        super(ExamTest, cls).tearDownClass()
 
     def test_exam_manager(self):
         # All of the 3 test exams have approval (verified, no flags, not
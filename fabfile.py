@@ -124,6 +124,22 @@ def systemd_restart(c: Connection):
     c.run("systemctl --user restart tbpweb.service", echo=True)
 
 
+def systemd_timers(c: Connection):
+    print("-- Installing systemd timers")
+    timers = (
+        "tbpweb-pr-notifications",
+        "tbpweb-candidate-progress",
+    )
+    c.run("mkdir -p ~/.config/systemd/user", echo=True)
+    for timer in timers:
+        c.run("cp {}/config/systemd/{}.* ~/.config/systemd/user/".format(
+            c.current_path, timer), echo=True)
+    c.run("systemctl --user daemon-reload", echo=True)
+    for timer in timers:
+        c.run("systemctl --user enable --now {}.timer".format(timer),
+              echo=True)
+
+
 def setup(c: Connection, commit=None, release=None):
     print("== Setup ==")
     if release is None:
@@ -190,6 +206,7 @@ def publish(c: Connection):
     symlink_release(c)
     run_permission(c)
     systemd_restart(c)
+    systemd_timers(c)
 
 
 def finish(c):
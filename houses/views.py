@@ -9,6 +9,7 @@ from django.views.generic import ListView
 from base.models import Officer
 from base.models import OfficerPosition
 from base.models import Term
+from base.roster import TermRoster
 from base.views import TermParameterMixin
 from houses.models import House
 from houses.models import HouseMember
@@ -49,12 +50,12 @@ class HouseMembersEditView(TermParameterMixin, ListView):
         house_leader = get_object_or_none(OfficerPosition,
                                           short_name='house-leaders')
 
-        context['house_leaders'] = get_user_model().objects.filter(
-            officer__term=self.display_term,
-            officer__position=house_leader)
+        context['house_leader_ids'] = set(Officer.objects.filter(
+            term=self.display_term, position=house_leader).values_list(
+            'user', flat=True))
 
-        context['candidates'] = get_user_model().objects.filter(
-            candidate__term=self.display_term)
+        context['candidate_ids'] = TermRoster.for_term(
+            self.display_term).candidate_ids
 
         # Create a dict with user ids as keys mapping to house names to identify
         # users who are already members of a house.
@@ -91,8 +92,8 @@ class HouseMembersListView(TermParameterMixin, ListView):
         context = super(HouseMembersListView, self).get_context_data(**kwargs)
 
         # Find candidates in this term to check groups without querying the DB
-        context['candidates'] = get_user_model().objects.filter(
-            candidate__term=self.display_term)
+        context['candidate_ids'] = TermRoster.for_term(
+            self.display_term).candidate_ids
 
         return context
 
@@ -1,39 +1,22 @@
-from django.contrib.contenttypes.models import ContentType
-from django.urls import reverse
-from django.utils import timesince
-from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
-from project_reports.models import ProjectReport
-from notifications.models import Notification
+from notifications.models import get_notification_summary
 
 
 def notifications(request):
-    """Get all notifications for a user that have not been cleared."""
-    if request.user.is_authenticated:
-        # Create notifications for project reports that are late from all terms
-        project_reports = ProjectReport.objects.filter(
-            author=request.user,
-            complete=False,
-            date__lt=timezone.localtime(timezone.now()).date())
-        content_type = ContentType.objects.get_for_model(ProjectReport)
-        for project_report in project_reports:
-            notification, _ = Notification.objects.get_or_create(
-                user=request.user,
-                status=Notification.NEGATIVE,
-                content_type=content_type,
-                object_pk=project_report.pk,
-                title='Missing Project Report',
-                subtitle=project_report.title,
-                url=reverse('project-reports:edit', args=(project_report.pk,)))
-            # Description must be unicode because timesince generates a unicode
-            # string
-            notification.description = u'{} overdue'.format(
-                timesince.timesince(project_report.date))
-            notification.cleared = False
-            notification.save()
+    """Get the most recent notifications for a user that have not been
+    cleared.
 
-        user_notifications = Notification.objects.filter(
-            user=request.user, cleared=False)
-        if user_notifications.exists():
-            return {'notifications': user_notifications}
+    The notifications are only loaded (from the shared cache if possible) if
+    the page shows them. Notifications for overdue project reports are
+    created by the sync_pr_notifications command.
+    """
+    if request.user.is_authenticated:
+        summary = SimpleLazyObject(
+            lambda: get_notification_summary(request.user)[0])
+        return {
+            'notifications': SimpleLazyObject(
+                lambda: summary['notifications']),
+            'notification_count': SimpleLazyObject(lambda: summary['count']),
+        }
     return {}
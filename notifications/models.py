@@ -2,6 +2,74 @@ from django.conf import settings
 from django.contrib.contenttypes import fields
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db import transaction
+
+from base.cache import CacheNamespace
+from base.cache import invalidate_namespaces
+
+
+# Maximum number of seconds the summary of a user's uncleared notifications
+# is cached for. The summary is invalidated whenever the user's notifications
+# change, so this only bounds how long bulk updates (which don't send signals
+# unless they invalidate the summary themselves) go unnoticed.
+NOTIFICATION_CACHE_TIMEOUT = 60 * 60
+
+# The number of (most recent) uncleared notifications shown to a user
+NOTIFICATIONS_SHOWN = 10
+
+# The fields of the notifications in the summary
+NOTIFICATION_SUMMARY_FIELDS = (
+    'pk', 'status', 'title', 'subtitle', 'description', 'image_url', 'url')
+
+
+def get_notification_cache(user_pk):
+    return CacheNamespace('notifications:{}'.format(user_pk))
+
+
+class NotificationManager(models.Manager):
+    def for_object(self, content_object):
+        """Return the notifications about the given object."""
+        return self.filter(
+            content_type=ContentType.objects.get_for_model(content_object),
+            object_pk=content_object.pk)
+
+    def fan_out(self, users, content_object, batch_size=500, **fields):
+        """Notify each of the given users (or user primary keys) about the
+        given object, with notifications that have the given field values
+        (status, title, subtitle, etc.).
+
+        The notifications are created in batches of batch_size, so notifying
+        thousands of users only takes a few queries. Users who already have a
+        notification about the object (even a cleared one) keep it unchanged.
+        The ContentType of the object is cached by ContentType.objects.
+        """
+        content_type = ContentType.objects.get_for_model(content_object)
+        user_pks = set(getattr(user, 'pk', user) for user in users)
+        self.bulk_create(
+            [Notification(user_id=user_pk, content_type=content_type,
+                          object_pk=content_object.pk, **fields)
+             for user_pk in user_pks],
+            batch_size=batch_size, ignore_conflicts=True)
+        invalidate_notifications(user_pks)
+
+    def clear(self, content_object, users=None):
+        """Clear the notifications about the given object, of the given users
+        (or user primary keys) or of all users, with a single update, and
+        return the number of notifications cleared.
+        """
+        notifications = self.for_object(content_object).filter(cleared=False)
+        if users is not None:
+            notifications = notifications.filter(user__in=set(
+                getattr(user, 'pk', user) for user in users))
+        user_pks = set(notifications.values_list('user', flat=True))
+        if not user_pks:
+            return 0
+        # Only clear the notifications of the users whose cached summaries
+        # are invalidated
+        cleared = self.for_object(content_object).filter(
+            cleared=False, user__in=user_pks).update(cleared=True)
+        invalidate_notifications(user_pks)
+        return cleared
 
 
 class Notification(models.Model):
@@ -52,9 +120,58 @@ class Notification(models.Model):
         default=False, db_index=True,
         help_text='Whether the user has closed this notification.')
 
+    objects = NotificationManager()
+
     class Meta(object):
         unique_together = ('user', 'content_type', 'object_pk')
 
     def __str__(self):
         return 'Notification for {}: {} ({})'.format(
             self.user.get_username(), self.title, self.subtitle)
+
+
+def get_notification_summary(user):
+    """Return the summary of the notifications of the user that haven't been
+    cleared, from the shared cache if possible, and the version of the cached
+    summary (which changes whenever the user's notifications change).
+
+    The summary is a dictionary with the number of uncleared notifications
+    ("count") and a list of the most recent ones ("notifications"), as
+    dictionaries of NOTIFICATION_SUMMARY_FIELDS.
+    """
+    return get_notification_cache(user.pk).get_or_set_with_version(
+        'summary', lambda: build_notification_summary(user),
+        timeout=NOTIFICATION_CACHE_TIMEOUT)
+
+
+def build_notification_summary(user):
+    """Return the summary of the user's uncleared notifications (see
+    get_notification_summary).
+    """
+    notifications = Notification.objects.filter(user=user, cleared=False)
+    count = notifications.count()
+    recent_notifications = []
+    if count:
+        recent_notifications = list(notifications.order_by('-pk').values(
+            *NOTIFICATION_SUMMARY_FIELDS)[:NOTIFICATIONS_SHOWN])
+    return {'count': count, 'notifications': recent_notifications}
+
+
+def invalidate_notifications(user_pks):
+    """Invalidate the cached notification summaries of the given users once
+    the current transaction is committed.
+
+    Code that creates or changes notifications in bulk (without sending
+    signals) must call this for the users whose notifications changed.
+    """
+    namespaces = [get_notification_cache(user_pk) for user_pk in user_pks]
+    if namespaces:
+        transaction.on_commit(lambda: invalidate_namespaces(namespaces))
+
+
+def notification_changed(sender, instance, **kwargs):
+    invalidate_notifications([instance.user_id])
+
+
+models.signals.post_save.connect(notification_changed, sender=Notification)
+models.signals.post_delete.connect(notification_changed, sender=Notification)
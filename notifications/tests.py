@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from base.cache import get_shared_cache
+from notifications.models import Notification
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+class NotificationPollTest(TransactionTestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'user', 'user@tbp.berkeley.edu', 'testpw')
+        self.content_type = ContentType.objects.get_for_model(
+            get_user_model())
+        self.poll_url = reverse('notifications:poll')
+
+    def create_notification(self, object_pk):
+        return Notification.objects.create(
+            user=self.user, status=Notification.NEUTRAL,
+            content_type=self.content_type, object_pk=object_pk,
+            title='Title {}'.format(object_pk), subtitle='', description='')
+
+    def test_poll(self):
+        self.assertEqual(self.client.get(self.poll_url).status_code, 403)
+
+        self.assertTrue(self.client.login(
+            username='user', password='testpw'))
+        self.create_notification(1)
+        response = self.client.get(self.poll_url)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(
+            [notification['title']
+             for notification in response.json()['notifications']],
+            ['Title 1'])
+        etag = response['ETag']
+
+        # Polls with the current ETag only load the session and the user
+        with self.assertNumQueries(2):
+            response = self.client.get(self.poll_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # New or cleared notifications change the ETag
+        notification = self.create_notification(2)
+        response = self.client.get(self.poll_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [notification['title']
+             for notification in response.json()['notifications']],
+            ['Title 2', 'Title 1'])
+        etag = response['ETag']
+
+        self.client.post(
+            reverse('notifications:clear', args=(notification.pk,)))
+        response = self.client.get(self.poll_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_badge(self):
+        """The navbar shows the number of uncleared notifications, which the
+        notifications script refreshes by polling.
+        """
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertInHTML(
+            '<sup id="notification-count" class="notification-count" '
+            'style="display: none">0</sup>',
+            render_to_string('_user_login.html', request=request))
+
+        self.create_notification(1)
+        self.create_notification(2)
+        self.assertInHTML(
+            '<sup id="notification-count" class="notification-count">2</sup>',
+            render_to_string('_user_login.html', request=request))
+        self.assertIn(
+            'data-poll-url="{}"'.format(self.poll_url),
+            render_to_string('_notifications.html', request=request))
+
+
+class NotificationFanOutTest(TestCase):
+    def setUp(self):
+        get_user_model().objects.bulk_create([
+            get_user_model()(username='user{}'.format(i))
+            for i in range(1200)])
+        self.users = list(get_user_model().objects.all())
+        self.group = Group.objects.create(name='Announcement')
+
+    def fan_out(self, users):
+        Notification.objects.fan_out(
+            users, self.group, status=Notification.NEUTRAL,
+            title='Announcement', subtitle='', description='')
+
+    def test_fan_out(self):
+        # The ContentType is cached after the first lookup
+        ContentType.objects.get_for_model(self.group)
+        with self.assertNumQueries(3):
+            self.fan_out(self.users)
+        self.assertEqual(Notification.objects.filter(
+            content_type=ContentType.objects.get_for_model(self.group),
+            object_pk=self.group.pk).count(), 1200)
+
+        # Users who already have a notification keep it
+        notification = Notification.objects.get(user=self.users[0])
+        notification.cleared = True
+        notification.save()
+        self.fan_out([self.users[0].pk, self.users[1].pk])
+        self.assertEqual(Notification.objects.count(), 1200)
+        self.assertTrue(Notification.objects.get(user=self.users[0]).cleared)
+
+    def test_clear(self):
+        self.fan_out(self.users)
+        with self.assertNumQueries(2):
+            cleared = Notification.objects.clear(
+                self.group, users=self.users[:2])
+        self.assertEqual(cleared, 2)
+        self.assertEqual(Notification.objects.clear(self.group), 1198)
+        self.assertEqual(Notification.objects.clear(self.group), 0)
+        self.assertFalse(Notification.objects.filter(cleared=False).exists())
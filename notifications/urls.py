@@ -1,8 +1,10 @@
 from django.urls import re_path
 
 from notifications.views import clear_notification
+from notifications.views import poll_notifications
 
 
 urlpatterns = [
     re_path(r'^clear/(?P<notification_pk>\d+)/$', clear_notification, name='clear'),
+    re_path(r'^poll/$', poll_notifications, name='poll'),
 ]
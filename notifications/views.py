@@ -1,5 +1,12 @@
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
 from django.views.decorators.http import require_POST
 
+from notifications.models import get_notification_cache
+from notifications.models import get_notification_summary
 from notifications.models import Notification
 from utils.ajax import json_response
 
@@ -14,3 +21,38 @@ def clear_notification(request, notification_pk):
         return json_response()
     except Notification.DoesNotExist:
         return json_response(status=400)
+
+
+@require_GET
+def poll_notifications(request):
+    """Return a JSON response of the number of uncleared notifications of the
+    user and the most recent ones, for refreshing them without reloading the
+    page.
+
+    The ETag of the response is the version of the user's cached notification
+    summary, so polls with an up-to-date If-None-Match header get a 304
+    response after a single cache lookup.
+    """
+    if not request.user.is_authenticated:
+        return json_response(status=403)
+
+    version = get_notification_cache(request.user.pk).get_version()
+    if version is not None:
+        response = get_conditional_response(request, etag=quote_etag(version))
+        if response is not None:
+            response['ETag'] = quote_etag(version)
+            return response
+
+    summary, version = get_notification_summary(request.user)
+    notifications = []
+    for notification in summary['notifications']:
+        notification = dict(notification)
+        if notification['image_url']:
+            notification['image_url'] = static(notification['image_url'])
+        notification['clear_url'] = reverse(
+            'notifications:clear', args=(notification['pk'],))
+        notifications.append(notification)
+    response = json_response(data={
+        'count': summary['count'], 'notifications': notifications})
+    response['ETag'] = quote_etag(version)
+    return response
@@ -3,7 +3,7 @@ from django.core.management import BaseCommand
 from django.template.loader import render_to_string
 
 from base.models import Officer
-from candidates.models import Candidate
+from base.roster import TermRoster
 from project_reports.exceptions import DelayedException
 from project_reports.models import ProjectReport
 from project_reports.models import ProjectReportBook
@@ -165,12 +165,7 @@ class Command(BaseCommand):
         member_counts = collections.Counter()
         candidate_counts = collections.Counter()
 
-        # Many participants are misclassified (e.g. candidates as members),
-        # so they must be checked again
-        officer_users = Officer.objects.filter(term=term).values_list(
-            'user', flat=True)
-        candidate_users = Candidate.objects.filter(term=term).values_list(
-            'user', flat=True)
+        roster = TermRoster.for_term(term)
 
         for report in reports:
             participants = itertools.chain(report.officer_list.all(),
@@ -179,9 +174,9 @@ class Command(BaseCommand):
             for participant in participants:
                 # Many participants are misclassified (e.g. candidates as
                 # members), so they must be checked again
-                if participant.id in officer_users:
+                if roster.is_officer(participant.id):
                     officer_counts[participant] += 1
-                elif participant.id in candidate_users:
+                elif roster.is_candidate(participant.id):
                     candidate_counts[participant] += 1
                 else:
                     member_counts[participant] += 1
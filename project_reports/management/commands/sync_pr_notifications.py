@@ -0,0 +1,99 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timesince
+from django.utils import timezone
+
+from notifications.models import invalidate_notifications
+from notifications.models import Notification
+from project_reports.models import ProjectReport
+
+
+class Command(BaseCommand):
+    help = ('Create or update the notifications of authors of overdue project '
+            'reports, and clear the notifications of reports that are no '
+            'longer overdue. Meant to be run periodically (hourly in '
+            'production, see config/systemd); running it again without '
+            'changes doesn\'t change anything.')
+
+    def handle(self, *args, **options):
+        created, updated, cleared = sync_pr_notifications()
+        if int(options['verbosity']) > 0:
+            self.stdout.write(
+                'Created {} notifications, updated {} and cleared {}'.format(
+                    created, updated, cleared))
+
+
+def sync_pr_notifications():
+    """Make the notifications for project reports match the overdue project
+    reports from all terms, in a fixed number of queries, and return the
+    numbers of notifications created, updated and cleared.
+
+    Each overdue report has an uncleared notification for its author, which
+    says how long the report has been overdue. Users can clear the
+    notification, but it reappears the next time this runs until the report
+    is complete.
+    """
+    content_type = ContentType.objects.get_for_model(ProjectReport)
+    today = timezone.localtime(timezone.now()).date()
+    project_reports = ProjectReport.objects.filter(
+        complete=False, date__lt=today).values_list(
+        'pk', 'author', 'title', 'date')
+
+    with transaction.atomic():
+        project_reports = list(project_reports)
+        # Cleared notifications only matter for reports that are overdue
+        existing = dict(
+            ((notification.user_id, notification.object_pk), notification)
+            for notification in Notification.objects.select_for_update(
+                ).filter(
+                Q(cleared=False) |
+                Q(object_pk__in=[report[0] for report in project_reports]),
+                content_type=content_type))
+
+        new_notifications = []
+        changed_notifications = []
+        for pk, author_pk, title, date in project_reports:
+            values = {
+                'status': Notification.NEGATIVE,
+                'title': 'Missing Project Report',
+                'subtitle': title,
+                # Measured in days, so that the description (and the
+                # notification) only changes once a day
+                'description': u'{} overdue'.format(
+                    timesince.timesince(date, today)),
+                'url': reverse('project-reports:edit', args=(pk,)),
+                'cleared': False,
+            }
+            notification = existing.pop((author_pk, pk), None)
+            if notification is None:
+                new_notifications.append(Notification(
+                    user_id=author_pk, content_type=content_type,
+                    object_pk=pk, **values))
+            elif any(getattr(notification, field) != value
+                     for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(notification, field, value)
+                changed_notifications.append(notification)
+
+        # The remaining notifications are for reports that are no longer
+        # overdue (or whose author changed)
+        stale_notifications = [notification
+                               for notification in existing.values()
+                               if not notification.cleared]
+        for notification in stale_notifications:
+            notification.cleared = True
+
+        Notification.objects.bulk_create(new_notifications, batch_size=500)
+        Notification.objects.bulk_update(
+            changed_notifications + stale_notifications,
+            ['status', 'title', 'subtitle', 'description', 'url', 'cleared'],
+            batch_size=500)
+        invalidate_notifications(set(
+            notification.user_id for notification in
+            new_notifications + changed_notifications + stale_notifications))
+
+    return (len(new_notifications), len(changed_notifications),
+            len(stale_notifications))
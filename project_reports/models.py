@@ -2,7 +2,6 @@ import re
 from datetime import date
 
 from django.conf import settings
-from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 from django.db import models
 from django.utils import timezone
@@ -10,7 +9,6 @@ from django.utils import timezone
 from base.models import OfficerPosition
 from base.models import Term
 from notifications.models import Notification
-from shortcuts import get_object_or_none
 
 from private_storage.fields import PrivateFileField
 
@@ -132,43 +130,22 @@ def project_report_notification(sender, instance, created, **kwargs):
     completed.
     """
     if instance.complete:
-        notification = get_object_or_none(
-            Notification,
-            user=instance.author,
-            content_type=ContentType.objects.get_for_model(ProjectReport),
-            object_pk=instance.pk)
-        if notification:
-            notification.cleared = True
-            notification.save()
+        Notification.objects.clear(instance, users=[instance.author_id])
 
 
 def project_report_notification_delete(sender, instance, **kwargs):
     """Delete the notification if it exists for the project report when it is
     deleted.
     """
-    notification = get_object_or_none(
-        Notification,
-        user=instance.author,
-        content_type=ContentType.objects.get_for_model(ProjectReport),
-        object_pk=instance.pk)
-    if notification:
-        notification.delete()
+    Notification.objects.for_object(instance).filter(
+        user=instance.author_id).delete()
 
 
 def project_report_book_notification(sender, instance, created, **kwargs):
     if not created:
-        notification = get_object_or_none(
-            Notification,
-            user=instance.user,
-            content_type=ContentType.objects.get_for_model(ProjectReportBook),
-            object_pk=instance.pk)
-        if notification:
-            return
-        Notification.objects.create(
-            user=instance.user,
+        Notification.objects.fan_out(
+            [instance.user_id], instance,
             status=Notification.POSITIVE,
-            content_type=ContentType.objects.get_for_model(ProjectReportBook),
-            object_pk=instance.pk,
             title='Project Report Book Generated',
             subtitle='click to download',
             description='',
@@ -1,12 +1,18 @@
 import datetime
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import RequestFactory
 from django.test import TestCase
 from django.utils import timezone
-import mox
+from mock import patch
 
 from base.models import OfficerPosition
 from base.models import Term
+from notifications.context_processors import notifications
+from notifications.models import Notification
+from project_reports.management.commands.sync_pr_notifications import (
+    sync_pr_notifications)
 from project_reports.models import ProjectReport
 
 
@@ -34,20 +40,13 @@ class ProjectReportTest(TestCase):
             date=timezone.now().date())
         self.project_report.save()
 
-        self.mox = mox.Mox()
         self.tz = timezone.get_current_timezone()
 
-    def tearDown(self):
-        self.mox.UnsetStubs()
-
-    def test_completed_time(self):
-        self.mox.StubOutWithMock(timezone, 'now')
-
+    @patch('django.utils.timezone.now')
+    def test_completed_time(self, mock_now):
         mock_time = timezone.make_aware(
-            datetime.datetime(2012, 01, 01, 01, 01, 01), self.tz)
-        timezone.now().MultipleTimes().AndReturn(mock_time)
-
-        self.mox.ReplayAll()
+            datetime.datetime(2012, 1, 1, 1, 1, 1), self.tz)
+        mock_now.return_value = mock_time
 
         self.assertFalse(self.project_report.complete)
         self.assertIsNone(self.project_report.first_completed_at)
@@ -65,11 +64,9 @@ class ProjectReportTest(TestCase):
         self.assertFalse(self.project_report.complete)
         self.assertIsNone(self.project_report.first_completed_at)
 
-        self.mox.VerifyAll()
-
     def test_complete_time_no_overwrite(self):
         original_time = timezone.make_aware(
-            datetime.datetime(2012, 01, 01, 01, 01, 01), self.tz)
+            datetime.datetime(2012, 1, 1, 1, 1, 1), self.tz)
 
         self.project_report.complete = True
         self.project_report.first_completed_at = original_time
@@ -90,3 +87,60 @@ class ProjectReportTest(TestCase):
         self.project_report.results = 'ten'
 
         self.assertEquals(self.project_report.word_count(), 10)
+
+
+class SyncProjectReportNotificationsTest(TestCase):
+    fixtures = ['officer_position.yaml']
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='user',
+            email='user@tbp.berkeley.edu',
+            password='pwpwpwpwpw',
+            first_name='Bentley',
+            last_name='Bent')
+        self.term = Term.objects.create(
+            term=Term.SPRING, year=2012, current=True)
+        committee = OfficerPosition.objects.get(short_name='it')
+        today = timezone.localtime(timezone.now()).date()
+        self.project_reports = [
+            ProjectReport.objects.create(
+                term=self.term, author=self.user, committee=committee,
+                title='Report {}'.format(days), date=today - datetime.timedelta(
+                    days=days))
+            for days in (0, 3)]
+
+    def test_sync(self):
+        self.assertEqual(sync_pr_notifications(), (1, 0, 0))
+        notification = Notification.objects.get()
+        self.assertEqual(notification.content_object, self.project_reports[1])
+        self.assertEqual(notification.description, '3\xa0days overdue')
+
+        # Syncing again doesn't change anything, but cleared notifications
+        # reappear while the report is overdue
+        self.assertEqual(sync_pr_notifications(), (0, 0, 0))
+        notification.cleared = True
+        notification.save()
+        self.assertEqual(sync_pr_notifications(), (0, 1, 0))
+
+        # Notifications of reports that are no longer overdue are cleared
+        ProjectReport.objects.filter(pk=self.project_reports[1].pk).update(
+            date=timezone.localtime(timezone.now()).date())
+        self.assertEqual(sync_pr_notifications(), (0, 0, 1))
+        self.assertTrue(Notification.objects.get().cleared)
+
+    def test_context_processor(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        # The notifications are only loaded if they are used
+        with self.assertNumQueries(0):
+            context = notifications(request)
+        with self.assertNumQueries(1):
+            self.assertFalse(context['notifications'])
+
+        call_command('sync_pr_notifications', verbosity=0)
+        context = notifications(request)
+        self.assertEqual(len(context['notifications']), 1)
+        self.assertEqual(context['notification_count'], 1)
+        self.assertFalse(ProjectReport.objects.get(
+            pk=self.project_reports[1].pk).complete)
@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
+from django.db.models import Count
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
@@ -10,7 +14,8 @@ from django.views.generic import ListView
 
 from quote_board.forms import QuoteForm
 from quote_board.models import Quote
-from shortcuts import create_leaderboard
+from shortcuts import create_leaderboard_page
+from shortcuts import rank_leaders
 
 
 class QuoteCreateView(CreateView):
@@ -57,20 +62,28 @@ class QuoteLeaderboardListView(ListView):
     def dispatch(self, *args, **kwargs):
         return super(QuoteLeaderboardListView, self).dispatch(*args, **kwargs)
 
-    def get_queryset(self):
-        # Get list of users who have been quoted
-        speakers = Quote.objects.values_list('speakers')
+    def get_leaders(self):
+        # Because quotes map to multiple users (speaker and submitter), count
+        # the times each user was quoted from the speakers table
+        times_quoted = Quote.speakers.through.objects.filter(
+            user=OuterRef('pk')).order_by().values('user').annotate(
+            count=Count('pk')).values('count')
 
-        # Because quotes map to multiple users (speaker and submitter), use
-        # extra to obtain the leaders ordered by number of times quoted
-        querystring = 'SELECT COUNT(*) FROM quote_board_quote_speakers WHERE ' \
-            'quote_board_quote_speakers.user_id = auth_user.id'
+        return get_user_model().objects.filter(
+            id__in=Quote.speakers.through.objects.values('user')).annotate(
+            score=Subquery(times_quoted,
+                           output_field=IntegerField())).select_related(
+            'userprofile')
 
-        leaders = get_user_model().objects.filter(id__in=speakers).extra(
-            select={'score': querystring}).extra(
-            order_by=['-score']).select_related('userprofile')
+    def get_queryset(self):
+        return rank_leaders(self.get_leaders())
 
-        return create_leaderboard(leaders, 70)
+    def get_context_data(self, **kwargs):
+        context = super(QuoteLeaderboardListView, self).get_context_data(
+            **kwargs)
+        context['leader_list'] = create_leaderboard_page(
+            self.get_leaders(), context['object_list'], 70)
+        return context
 
 
 class QuoteListView(ListView):
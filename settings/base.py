@@ -59,11 +59,24 @@ DATABASES = {
     }
 }
 
-# Use a default local memory cache
+# Use a default local memory cache. The "shared" cache is shared by every
+# worker process, for values that have to be consistent across the site, like
+# the current term (see base/cache.py). It is stored in files by default, but
+# any backend reachable by all workers can be used instead, such as memcached:
+#     CACHES['shared'] = {
+#         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+#         'LOCATION': '127.0.0.1:11211',
+#         'KEY_PREFIX': 'tbpweb',
+#     }
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(WORKSPACE_DJANGO_ROOT, 'cache'),
+        'KEY_PREFIX': 'tbpweb',
+    },
 }
 
 # Use 'app_label.model_name'
@@ -173,6 +186,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'user_profiles.middleware.UserRolesMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.contrib.admindocs.middleware.XViewMiddleware',
@@ -87,3 +87,9 @@ STATIC_ROOT = "/home/t/tb/tbp/public_html/tbpweb/static/"
 # https://docs.djangoproject.com/en/2.1/topics/files/
 MEDIA_URL = 'https://www.ocf.berkeley.edu/~tbp/tbpweb/media/'
 MEDIA_ROOT = "/home/t/tb/tbp/public_html/tbpweb/media/"
+
+# Achievements can be evaluated by the process_achievements worker, so that
+# saving attendance and officers doesn't wait for them. Keep this off until
+# the deploy also runs "manage.py process_achievements --loop", since nothing
+# evaluates the enqueued jobs otherwise.
+ACHIEVEMENTS_DEFERRED = False
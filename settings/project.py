@@ -46,3 +46,9 @@ USERNAME_HELPTEXT = ('Username must be 3-30 characters, start with a letter, '
 
 # Valid types are 'semester' and 'quarter'.
 TERM_TYPE = 'semester'
+
+# Whether achievements are evaluated by the process_achievements management
+# command, rather than while saving the objects they depend on (such as event
+# attendance). Deferred evaluation needs the command to be running, e.g.
+# "python manage.py process_achievements --loop".
+ACHIEVEMENTS_DEFERRED = False
@@ -12,10 +12,13 @@ DATABASES = {
     },
 }
 
-# Use a dummy cache for the default cache during testing
+# Use dummy caches for the default and shared caches during testing
 CACHES['default'] = {
     'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
 }
+CACHES['shared'] = {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+}
 
 # TODO(sjdemartini): Don't "blacklist" any third party apps and get tests to
 # pass (since we ought to be testing under the same circumstances and with the
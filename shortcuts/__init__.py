@@ -1,6 +1,10 @@
 from functools import wraps
 import magic
 
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import Window
+from django.db.models.functions import Rank
 from django.shortcuts import _get_queryset
 
 
@@ -55,42 +59,49 @@ def disable_for_loaddata(signal_handler):
     return wrapper
 
 
-def create_leaderboard(leaders, max_width):
+def rank_leaders(leaders):
+    """Annotate a queryset of leaders with their rank on a leaderboard.
+
+    The leaders must have some annotated score, for example a count of
+    attended events or points from achievements. Each leader is annotated with
+    a rank (1st, 2nd, etc., where leaders with the same score share a rank)
+    that is computed by the database with a window function (RANK() OVER
+    (ORDER BY score DESC)), so the returned queryset can be sliced (e.g.
+    paginated) without loading the leaders before the slice.
+    """
+    return leaders.annotate(rank=Window(
+        expression=Rank(), order_by=F('score').desc())).order_by(
+        F('score').desc(), 'pk')
+
+
+def create_leaderboard_page(leaders, page_leaders, max_width):
     """Function that generates a leader_list for use in leaderboard views.
 
-    This method takes in a queryset of leaders which have some annotated score,
-    for example a count of attended events or points from achievements, and
-    the maximum width a bar on the leaderboard can be. It returns a leader_list
-    where each entry is a dictionary that includes the user, their rank on the
-    leaderboard (1st, 2nd, etc.), and their leaderboard width factor, which is
-    the width that user's bar takes given their score.
+    This method takes in the queryset of all leaders, which have an annotated
+    score and rank (see rank_leaders), the leaders of the page being shown and
+    the maximum width a bar on the leaderboard can be. It returns a
+    leader_list where each entry is a dictionary that includes the user,
+    their score, their rank on the leaderboard, and their leaderboard width
+    factor, which is the width that user's bar takes given their score.
+
+    Only the maximum score is looked up among all of the leaders (with a
+    single aggregate query), so a page deep into the leaderboard is as cheap
+    to show as the first one.
     """
-    if len(leaders) > 0:
-        max_score = leaders[0].score or 0
-    else:
-        max_score = 0
+    max_score = leaders.aggregate(max_score=Max('score'))['max_score'] or 0
 
     leader_list = []
     if max_score > 0:  # Ensure there is no dividing by zero
-        prev_value = -1
-        prev_rank = 1
-
-        for i, leader in enumerate(leaders, start=prev_rank):
+        for leader in page_leaders:
             # factor is used for CSS width property (percentage).  2.5 is added
             # to every factor to make sure that there is enough room for text
             # to be displayed.
             factor = 2.5 + leader.score * (max_width - 2.5) / max_score
 
-            if leader.score == prev_value:
-                rank = prev_rank
-            else:
-                rank = i
-            prev_rank = rank
-            prev_value = leader.score
-
             # Add the leader entry to the list
             leader_list.append({'user': leader,
+                                'score': leader.score,
                                 'factor': factor,
-                                'rank': rank})
+                                'rank': leader.rank})
 
-        return leader_list
+    return leader_list
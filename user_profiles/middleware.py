@@ -0,0 +1,20 @@
+from django.contrib.auth.middleware import get_user
+from django.utils.functional import SimpleLazyObject
+
+from user_profiles.roles import attach_user_roles
+
+
+class UserRolesMiddleware(object):
+    """Attach a UserRoles to request.user, so that officer, member and
+    candidate checks are computed at most once per request.
+
+    Like request.user itself, the user (and its roles) are only loaded when
+    first used. Must come after AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(
+            lambda: attach_user_roles(get_user(request)))
+        return self.get_response(request)
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.8 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+def populate_search_names(apps, schema_editor):
+    """Set the search_name of existing profiles, as UserProfile.save would
+    (historical models don't have the model's methods).
+    """
+    UserProfile = apps.get_model('user_profiles', 'UserProfile')
+    profiles = []
+    for profile in UserProfile.objects.select_related('user').iterator():
+        first_name = profile.user.first_name
+        if profile.preferred_name != first_name:
+            first_name = '{} ({})'.format(profile.preferred_name, first_name)
+        if profile.middle_name:
+            name = '{} {} {}'.format(
+                first_name, profile.middle_name, profile.user.last_name)
+        else:
+            name = '{} {}'.format(first_name, profile.user.last_name)
+        profile.search_name = name.lower()[:255]
+        profiles.append(profile)
+    UserProfile.objects.bulk_update(profiles, ['search_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profiles', '0003_auto_20231130_1716'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_search_names,
+                             migrations.RunPython.noop),
+    ]
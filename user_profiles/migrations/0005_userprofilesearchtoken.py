@@ -0,0 +1,44 @@
+# Generated by Django 2.2.8 on 2026-10-18 03:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def populate_search_tokens(apps, schema_editor):
+    """Create the search tokens of existing profiles from their search_name,
+    as UserProfileSearchToken.objects.update_tokens would (historical models
+    don't have custom managers).
+    """
+    UserProfile = apps.get_model('user_profiles', 'UserProfile')
+    UserProfileSearchToken = apps.get_model(
+        'user_profiles', 'UserProfileSearchToken')
+    UserProfileSearchToken.objects.bulk_create(
+        [UserProfileSearchToken(profile_id=profile_id, token=token)
+         for profile_id, search_name in UserProfile.objects.values_list(
+             'pk', 'search_name').iterator()
+         for token in set(re.findall(r'\w+', search_name.lower()))],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profiles', '0004_userprofile_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfileSearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=255)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='user_profiles.UserProfile')),
+            ],
+            options={
+                'unique_together': {('profile', 'token')},
+            },
+        ),
+        migrations.RunPython(populate_search_tokens,
+                             migrations.RunPython.noop),
+    ]
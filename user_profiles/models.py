@@ -1,13 +1,17 @@
 import os
+import re
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db import transaction
+from easy_thumbnails.files import get_thumbnailer
 from localflavor.us.models import PhoneNumberField
 from localflavor.us.models import USStateField
 
 from alumni.models import Alumnus
 from base.models import IDCodeMixin, Major, Officer, OfficerPosition, Term
+from base.roster import invalidate_initiation_rosters
 from candidates.models import Candidate
 from shortcuts import disable_for_loaddata
 
@@ -100,6 +104,11 @@ class UserProfile(models.Model):
                     'domain name (".edu" or ".com") if obvious (to mitigate email scrapers). '
                     'Leave blank to keep default tbp email (for officers only).'))
 
+    # The lowercase verbose full name of the user, kept up to date on save so
+    # that users can be searched by name in the database
+    search_name = models.CharField(max_length=255, db_index=True,
+                                   blank=True, editable=False)
+
     class Meta(object):
         ordering = ('preferred_name', 'user__last_name')
 
@@ -110,10 +119,19 @@ class UserProfile(models.Model):
         name is not specified. This helps to ensure that we can sort users
         by their preferred_names, and also simplifies logic for displaying a
         user's "common" name.
+
+        The search name is also updated, since any of the names may have
+        changed.
         """
         if not self.preferred_name:
             self.preferred_name = self.user.first_name
+        search_name = self.get_search_name()
+        search_name_changed = (self._state.adding or
+                               search_name != self.search_name)
+        self.search_name = search_name
         super(UserProfile, self).save(*args, **kwargs)
+        if search_name_changed:
+            UserProfileSearchToken.objects.update_tokens(self)
 
     def __str__(self):
         return self.get_common_name()
@@ -164,10 +182,29 @@ class UserProfile(models.Model):
         """
         return self.get_full_name(verbose=True)
 
+    def get_search_name(self):
+        """Return the normalized name that the user is searched by (see
+        search_name).
+        """
+        return self.get_verbose_full_name().lower()[:255]
+
     def get_common_name(self):
         """Return the common representation of the person's name."""
         return '{} {}'.format(self.preferred_name, self.user.last_name)
 
+    def get_avatar_url(self):
+        """Return the URL of the thumbnail of the user's picture shown in
+        _user_thumbnail.html, or None if the user has no picture.
+        """
+        if not self.picture:
+            return None
+        # Like the thumbnail_url template filter, return nothing if the
+        # thumbnail can't be generated
+        try:
+            return get_thumbnailer(self.picture)['avatar'].url
+        except Exception:  # pylint: disable=broad-except
+            return None
+
     def get_public_name(self):
         """Return a version of a person's name to be visible publicly, with
         short name followed by last name initial.
@@ -181,6 +218,11 @@ class UserProfile(models.Model):
             return None
 
     def get_student_org_user_profile(self):
+        # Use the roles attached to the user for the request, if any (see
+        # user_profiles.roles.UserRoles)
+        roles = getattr(self.user, 'roles', None)
+        if roles is not None:
+            return roles.get_student_org_user_profile()
         try:
             return self.user.studentorguserprofile
         except StudentOrgUserProfile.DoesNotExist:
@@ -275,6 +317,16 @@ class StudentOrgUserProfile(models.Model):
         ordering = ('user',)
         verbose_name = 'Student Organization User Profile'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        profile = super(StudentOrgUserProfile, cls).from_db(
+            db, field_names, values)
+        # The stored initiation term, for invalidating only the rosters of
+        # the terms whose members change when it does
+        profile._saved_initiation_term_id = profile.__dict__.get(
+            'initiation_term_id')
+        return profile
+
     def __str__(self):
         return self.user.get_full_name()
 
@@ -290,7 +342,11 @@ class StudentOrgUserProfile(models.Model):
         the past. If they they have been a candidate before and they have not
         initiated, then the method returns True.
         """
-        current_term = Term.objects.get_current_term()
+        roles = getattr(self.user, 'roles', None)
+        if roles is not None:
+            current_term = roles.get_current_term()
+        else:
+            current_term = Term.objects.get_current_term()
         if self.initiation_term and self.initiation_term <= current_term:
             return False
 
@@ -299,6 +355,12 @@ class StudentOrgUserProfile(models.Model):
         # candidates app, so if they are not recorded as initiated in their
         # profile (i.e., initiation_term not None) and a Candidate object
         # exists, they are considered a candidate:
+        if roles is not None:
+            candidate_term_ids = roles.get_candidate_term_ids()
+            if current:
+                return (current_term is not None and
+                        current_term.pk in candidate_term_ids)
+            return bool(candidate_term_ids)
         if current:
             return Candidate.objects.filter(
                 user=self.user, term=current_term).exists()
@@ -325,6 +387,9 @@ class StudentOrgUserProfile(models.Model):
         If exclude_aux is True, then auxiliary positions (positions with
         auxiliary=True) are not counted as officer positions.
         """
+        roles = getattr(self.user, 'roles', None)
+        if roles is not None:
+            return roles.is_officer(current=current, exclude_aux=exclude_aux)
         if current:
             term = Term.objects.get_current_term()
         else:
@@ -376,6 +441,58 @@ class StudentOrgUserProfile(models.Model):
         return self.initiation_term
 
 
+def get_search_tokens(text):
+    """Return the lowercase words in the given text, which is a name or a
+    search for one, in order and without duplicates.
+    """
+    tokens = []
+    for token in re.findall(r'\w+', text.lower()):
+        if token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+class UserProfileSearchTokenManager(models.Manager):
+    def update_tokens(self, profile):
+        """Make the search tokens of the profile match the words in its
+        search_name.
+        """
+        tokens = set(get_search_tokens(profile.search_name))
+        existing = set(self.filter(profile=profile).values_list(
+            'token', flat=True))
+        if existing - tokens:
+            self.filter(profile=profile, token__in=existing - tokens).delete()
+        self.bulk_create([
+            UserProfileSearchToken(profile=profile, token=token)
+            for token in tokens - existing])
+
+    def matching(self, search_term):
+        """Return the search tokens that start with the given (lowercase)
+        search term.
+
+        This is a prefix match on the indexed token column, so unlike a match
+        anywhere in the name, the database doesn't have to scan every row.
+        """
+        return self.filter(token__startswith=search_term)
+
+
+class UserProfileSearchToken(models.Model):
+    """A word in the search_name of a user profile, so that users can be
+    searched by the beginnings of the words in their names.
+    """
+    profile = models.ForeignKey(
+        UserProfile, related_name='search_tokens', on_delete=models.CASCADE)
+    token = models.CharField(max_length=255, db_index=True)
+
+    objects = UserProfileSearchTokenManager()
+
+    class Meta(object):
+        unique_together = ('profile', 'token')
+
+    def __str__(self):
+        return '{}: {}'.format(self.profile, self.token)
+
+
 @disable_for_loaddata
 def user_profile_creation_post_save(sender, instance, created, **kwargs):
     """Ensures that a UserProfile object exists for every user.
@@ -390,7 +507,12 @@ def user_profile_creation_post_save(sender, instance, created, **kwargs):
     # the preferred_name field. This is necessary in case the profile was
     # originally created on post_save when the user's first_name was not
     # specified.
-    if instance.first_name and not profile.preferred_name:
+    #
+    # Similarly, save the profile if the user's name changed, so that its
+    # search_name stays up to date.
+    profile.user = instance
+    if ((instance.first_name and not profile.preferred_name) or
+            profile.search_name != profile.get_search_name()):
         profile.save()
 
 
@@ -415,6 +537,28 @@ def student_org_user_profile_post_save(sender, instance, created, **kwargs):
         CollegeStudentInfo.objects.get_or_create(user=instance.user)
 
 
+def student_org_user_profile_post_save_roster(sender, instance, **kwargs):
+    """Ensure that the rosters of the terms whose members change are rebuilt
+    when the initiation term changes.
+    """
+    old_term_id = getattr(instance, '_saved_initiation_term_id', None)
+    new_term_id = instance.initiation_term_id
+    instance._saved_initiation_term_id = new_term_id
+    if old_term_id != new_term_id:
+        transaction.on_commit(
+            lambda: invalidate_initiation_rosters(old_term_id, new_term_id))
+
+
+def student_org_user_profile_post_delete_roster(sender, instance, **kwargs):
+    """Ensure that the rosters of the terms the user was a member of are
+    rebuilt without them.
+    """
+    old_term_id = instance.initiation_term_id
+    if old_term_id is not None:
+        transaction.on_commit(
+            lambda: invalidate_initiation_rosters(old_term_id, None))
+
+
 models.signals.post_save.connect(
     user_profile_creation_post_save, sender=get_user_model())
 
@@ -423,3 +567,9 @@ models.signals.post_save.connect(
 
 models.signals.post_save.connect(
     student_org_user_profile_post_save, sender=StudentOrgUserProfile)
+
+models.signals.post_save.connect(
+    student_org_user_profile_post_save_roster, sender=StudentOrgUserProfile)
+
+models.signals.post_delete.connect(
+    student_org_user_profile_post_delete_roster, sender=StudentOrgUserProfile)
@@ -0,0 +1,112 @@
+from django.db.models import NullBooleanField
+from django.db.models import Value
+
+from base.models import Officer
+from base.models import Term
+from candidates.models import Candidate
+from user_profiles.models import StudentOrgUserProfile
+
+
+class UserRoles(object):
+    """Memoized officer, member and candidate status of a user.
+
+    The user's StudentOrgUserProfile and the terms in which the user was an
+    officer or a candidate are each loaded with one query the first time they
+    are needed. UserProfile and StudentOrgUserProfile consult the UserRoles
+    attached to their user (as user.roles) when there is one, so repeated role
+    checks don't query the database again.
+
+    Since nothing is refreshed, a UserRoles should only live as long as a
+    request (see UserRolesMiddleware).
+    """
+    def __init__(self, user):
+        self.user = user
+        self._student_org_user_profile = None
+        self._student_org_user_profile_loaded = False
+        self._officer_terms = None
+        self._candidate_term_ids = None
+        self._current_term = None
+        self._current_term_loaded = False
+
+    def get_current_term(self):
+        """Return the current term, fetched at most once."""
+        if not self._current_term_loaded:
+            self._current_term_loaded = True
+            self._current_term = Term.objects.get_current_term()
+        return self._current_term
+
+    def get_student_org_user_profile(self):
+        """Return the user's StudentOrgUserProfile, or None if the user
+        doesn't have one.
+        """
+        if not self._student_org_user_profile_loaded:
+            self._student_org_user_profile_loaded = True
+            if self.user.is_authenticated:
+                profile = StudentOrgUserProfile.objects.select_related(
+                    'initiation_term').filter(user=self.user).first()
+                if profile:
+                    # Share the user (and its roles) with the profile
+                    profile.user = self.user
+                self._student_org_user_profile = profile
+        return self._student_org_user_profile
+
+    def get_officer_terms(self):
+        """Return a list of (term pk, auxiliary) pairs for the officer
+        positions the user has held.
+        """
+        self._load_terms()
+        return self._officer_terms
+
+    def get_candidate_term_ids(self):
+        """Return the set of pks of the terms the user was a candidate in."""
+        self._load_terms()
+        return self._candidate_term_ids
+
+    def _load_terms(self):
+        """Load the terms the user was an officer or a candidate in.
+
+        Both are loaded in a single query, as the union of the user's officer
+        positions and candidate terms. Candidate rows have no value for
+        "auxiliary".
+        """
+        if self._officer_terms is not None:
+            return
+        self._officer_terms = []
+        self._candidate_term_ids = set()
+        if not self.user.is_authenticated:
+            return
+
+        officer_terms = Officer.objects.filter(user=self.user).order_by(
+            ).values_list('term', 'position__auxiliary')
+        candidate_terms = Candidate.objects.filter(user=self.user).order_by(
+            ).annotate(auxiliary=Value(
+                None, output_field=NullBooleanField())).values_list(
+            'term', 'auxiliary')
+        for term_id, auxiliary in officer_terms.union(
+                candidate_terms, all=True):
+            if auxiliary is None:
+                self._candidate_term_ids.add(term_id)
+            else:
+                self._officer_terms.append((term_id, auxiliary))
+
+    def is_officer(self, current=False, exclude_aux=False):
+        """Return True if the user is an officer, with the same arguments as
+        StudentOrgUserProfile.is_officer.
+        """
+        term = self.get_current_term() if current else None
+        for term_id, auxiliary in self.get_officer_terms():
+            if term and term_id != term.pk:
+                continue
+            if exclude_aux and auxiliary:
+                continue
+            return True
+        return False
+
+
+def attach_user_roles(user):
+    """Attach a UserRoles to the user, unless it already has one, and return
+    the user.
+    """
+    if not hasattr(user, 'roles'):
+        user.roles = UserRoles(user)
+    return user
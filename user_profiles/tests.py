@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.test import RequestFactory
 from django.test import TestCase
 from django.test.utils import override_settings
 
@@ -10,9 +11,11 @@ from candidates.models import Candidate
 from shortcuts import get_object_or_none
 from user_profiles.fields import UserCommonNameChoiceField
 from user_profiles.fields import UserCommonNameMultipleChoiceField
+from user_profiles.middleware import UserRolesMiddleware
 from user_profiles.models import CollegeStudentInfo
 from user_profiles.models import StudentOrgUserProfile
 from user_profiles.models import UserProfile
+from user_profiles.roles import attach_user_roles
 
 class UserInfoTestCase(TestCase):
     """A TestCase which provides a useful setUp method for creating common
@@ -97,6 +100,43 @@ class UserProfilesTest(UserInfoTestCase):
         self.profile.save()
         self.assertEqual(self.profile.preferred_name, preferred_name)
 
+    def test_search_name(self):
+        self.assertEqual(self.profile.search_name, 'edward williams')
+
+        # Updated when the profile's names change
+        self.profile.preferred_name = 'Ed'
+        self.profile.middle_name = 'Tau'
+        self.profile.save()
+        self.assertEqual(
+            UserProfile.objects.get(user=self.user).search_name,
+            'ed (edward) tau williams')
+
+        # Updated when the user's names change
+        self.user.last_name = 'Bent'
+        self.user.save()
+        self.assertEqual(
+            UserProfile.objects.get(user=self.user).search_name,
+            'ed (edward) tau bent')
+
+    def test_search_tokens(self):
+        self.profile.preferred_name = 'Ed'
+        self.profile.save()
+        self.assertEqual(
+            sorted(self.profile.search_tokens.values_list('token', flat=True)),
+            ['ed', 'edward', 'williams'])
+
+        # Words that are no longer in the name are removed
+        self.user.last_name = 'Bent-Williams'
+        self.user.save()
+        self.assertEqual(
+            sorted(self.profile.search_tokens.values_list('token', flat=True)),
+            ['bent', 'ed', 'edward', 'williams'])
+        self.profile.preferred_name = 'Edward'
+        self.profile.save()
+        self.assertEqual(
+            sorted(self.profile.search_tokens.values_list('token', flat=True)),
+            ['bent', 'edward', 'williams'])
+
     def test_name_methods(self):
         # Name methods with only first and last name
         full_name = '%s %s' % (self.first_name, self.last_name)
@@ -497,6 +537,94 @@ class StudentOrgUserProfilesTest(UserInfoTestCase):
                                                 user=self.user))
 
 
+class UserRolesTest(UserInfoTestCase):
+    def setUp(self):
+        super(UserRolesTest, self).setUp()
+        StudentOrgUserProfile(user=self.user).save()
+        self.advisor_pos = OfficerPosition(
+            short_name='advisor',
+            long_name='Advisor (test)',
+            rank=4,
+            mailing_list='IT',
+            auxiliary=True)
+        self.advisor_pos.save()
+        Officer(user=self.user, position=self.advisor_pos,
+                term=self.term).save()
+        Officer(user=self.user, position=self.committee,
+                term=self.term_old).save()
+        Candidate(user=self.user, term=self.term_old).save()
+
+    def get_roles_user(self):
+        return attach_user_roles(self.user_model.objects.get(pk=self.user.pk))
+
+    def assert_same_roles(self):
+        """Assert that the memoized role checks give the same results as the
+        checks without roles attached to the user.
+        """
+        profile = self.user_model.objects.get(pk=self.user.pk).userprofile
+        roles_profile = self.get_roles_user().userprofile
+        for current in (True, False):
+            self.assertEqual(roles_profile.is_candidate(current),
+                             profile.is_candidate(current))
+            for exclude_aux in (True, False):
+                self.assertEqual(
+                    roles_profile.is_officer(current, exclude_aux),
+                    profile.is_officer(current, exclude_aux))
+        self.assertEqual(roles_profile.is_member(), profile.is_member())
+
+    def test_roles(self):
+        self.assert_same_roles()
+        profile = self.get_roles_user().userprofile
+        self.assertTrue(profile.is_officer())
+        self.assertTrue(profile.is_officer(current=True))
+        self.assertFalse(profile.is_officer(current=True, exclude_aux=True))
+        self.assertTrue(profile.is_member())
+        self.assertFalse(profile.is_candidate(current=False))
+
+        # Without officer positions, the user is a past candidate
+        Officer.objects.filter(user=self.user).delete()
+        self.assert_same_roles()
+        profile = self.get_roles_user().userprofile
+        self.assertFalse(profile.is_officer())
+        self.assertFalse(profile.is_member())
+        self.assertTrue(profile.is_candidate(current=False))
+        self.assertFalse(profile.is_candidate(current=True))
+
+        Candidate(user=self.user, term=self.term).save()
+        self.assert_same_roles()
+        self.assertTrue(self.get_roles_user().userprofile.is_candidate())
+
+    def test_roles_num_queries(self):
+        profile = self.get_roles_user().userprofile
+        # One query each for the StudentOrgUserProfile, the officer and
+        # candidate terms, and the current term
+        with self.assertNumQueries(3):
+            for _ in range(3):
+                profile.is_officer()
+                profile.is_officer(current=True, exclude_aux=True)
+                profile.is_member()
+                profile.is_candidate()
+                profile.is_candidate(current=False)
+
+    def test_roles_without_student_org_user_profile(self):
+        StudentOrgUserProfile.objects.filter(user=self.user).delete()
+        profile = self.get_roles_user().userprofile
+        with self.assertNumQueries(1):
+            self.assertFalse(profile.is_officer())
+            self.assertFalse(profile.is_member())
+            self.assertFalse(profile.is_candidate())
+
+    def test_middleware(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request._cached_user = self.user
+        response = UserRolesMiddleware(lambda request: request.user)(request)
+        self.assertEqual(response.pk, self.user.pk)
+        self.assertIsNotNone(response.roles)
+        self.assertIs(
+            response.roles.get_student_org_user_profile().user, self.user)
+
+
 class FieldsTest(TestCase):
     def setUp(self):
         self.user_model = get_user_model()
@@ -8,6 +8,7 @@ from django.views.generic import DetailView
 from django.views.generic import UpdateView
 
 from achievements.models import Achievement
+from achievements.models import UserAchievementScore
 from base.models import Officer, Term
 from events.models import Event
 from quote_board.models import Quote
@@ -60,11 +61,13 @@ class UserProfileDetailView(DetailView):
         user_achievements = self.profile.user.userachievement_set.exclude(
             acquired=False).filter(
             achievement__privacy=Achievement.PRIVACY_PUBLIC).order_by('-term')
-        user_points = 0
-        for userachievement in user_achievements:
-            user_points += userachievement.achievement.points
-        context['user_points'] = user_points
-        context['num_achievements'] = user_achievements.count()
+        # The points and number of achievements match the user's achievements
+        # page and the leaderboard
+        score = UserAchievementScore.objects.filter(
+            user=self.profile.user).first()
+        context['user_points'] = score.points if score else 0
+        context['num_achievements'] = score.acquired_count if score else 0
+        context['user_rank'] = score.get_rank() if score else None
         # displaying up to 5 most recent achievements
         context['achievements'] = user_achievements[:5]
 
@@ -0,0 +1,78 @@
+import csv
+import io
+import itertools
+
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+
+
+# Number of rows fetched from the database at a time by exports
+EXPORT_CHUNK_SIZE = 500
+
+XLSX_CONTENT_TYPE = (
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+class Echo(object):
+    """File-like object that returns what is written to it instead of
+    buffering it, so that csv.writer can produce the lines of a streaming
+    response one at a time.
+    """
+    def write(self, value):
+        return value
+
+
+class TableExportMixin(object):
+    """Mixin for views that export a table of rows as a CSV file, or as an
+    Excel workbook if the "format" GET parameter is "xlsx".
+
+    CSV exports are streamed, so views should implement get_rows() as a
+    generator over queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE), with any
+    related data loaded up front, so that neither memory use nor the number of
+    queries grows with the number of rows.
+    """
+    # Name of the downloaded file, without an extension
+    filename = 'export'
+
+    def get_header(self):
+        """Return the list of column names."""
+        raise NotImplementedError
+
+    def get_rows(self):
+        """Return an iterable of rows, each of which is a list of values."""
+        raise NotImplementedError
+
+    # pylint: disable=W0613
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('format') == 'xlsx':
+            return self.render_to_xlsx()
+        return self.render_to_csv()
+
+    def render_to_csv(self):
+        writer = csv.writer(Echo())
+        rows = itertools.chain([self.get_header()], self.get_rows())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in rows), content_type='text/csv')
+        response['Content-Disposition'] = \
+            'attachment; filename="{}.csv"'.format(self.filename)
+        return response
+
+    def render_to_xlsx(self):
+        # openpyxl is only needed for Excel exports, so import it here
+        import openpyxl
+
+        # Write-only workbooks don't keep the rows in memory, but the file
+        # (a zip archive) can only be sent once it has been completely written
+        workbook = openpyxl.Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        worksheet.append(self.get_header())
+        for row in self.get_rows():
+            worksheet.append(list(row))
+        xlsx_file = io.BytesIO()
+        workbook.save(xlsx_file)
+
+        response = HttpResponse(xlsx_file.getvalue(),
+                                content_type=XLSX_CONTENT_TYPE)
+        response['Content-Disposition'] = \
+            'attachment; filename="{}.xlsx"'.format(self.filename)
+        return response